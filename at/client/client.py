@@ -5,6 +5,9 @@ RemoteConnection.set_pyro_log_path_for_client()
 from Pyro4 import Proxy
 import time
 from .exceptions import *
+from ..server.records import (ActivityStatus, AttachState, Functionality, Operator, OperatorSelection,
+                              PdpContext, Registration, SignalQuality, SimStatus, typed)
+from ..server.sampler import import_samples
 import logging
 
 logger = logging.getLogger(__name__)
@@ -65,8 +68,8 @@ class Client(object):
 
     def terminate(self):
         if self._remote_prepared:
-            self.ue_ready = self.p.release_ue()
-            if not isinstance(self.ue_ready, bool):
+            self.ue_ready = typed('release_ue', self.p.release_ue())
+            if not isinstance(self.ue_ready, Functionality):
                 raise RemoteException(' exception while releasing ue : {}'.format(
                     self.ue_ready
                 ))
@@ -82,46 +85,145 @@ class Client(object):
         return self._connected
 
     def read_pin_status(self):
-        sim_sate = self.p.read_pin_status()
-        if isinstance(sim_sate, tuple):
+        sim_sate = typed('read_pin_status', self.p.read_pin_status())
+        if isinstance(sim_sate, SimStatus):
             return sim_sate
         raise RemoteException('sim status not properly retrieved, due to {}'.format(sim_sate))
 
     def report_phone_activity_status(self):
-        phone_status = self.p.report_phone_activity_status()
-        if isinstance(phone_status, tuple):
+        phone_status = typed('report_phone_activity_status', self.p.report_phone_activity_status())
+        if isinstance(phone_status, ActivityStatus):
             return phone_status
         raise RemoteException('Phone activity status not properly retrived, due to {}'.format(phone_status))
 
     def get_signal_quality(self):
-        signal_quality = self.p.get_signal_quality()
-        if isinstance(signal_quality, list):
+        signal_quality = typed('get_signal_quality', self.p.get_signal_quality())
+        if isinstance(signal_quality, SignalQuality):
             return signal_quality
         raise RemoteException('Signal Quality not properly retrieved, due to {}'.format(signal_quality))
 
+    def start_sampling(self, interval=0.1, capacity=36000):
+        started = self.p.start_sampling(interval, capacity)
+        if started is True:
+            return started
+        raise RemoteException('signal sampling not started, due to {}'.format(started))
+
+    def stop_sampling(self):
+        return self.p.stop_sampling()
+
+    def get_signal_statistics(self, last=None):
+        return self.p.signal_statistics(last)
+
+    def get_signal_samples(self, last=None):
+        """
+        :return: numpy array of the samples taken on the server, a row of sampler.COLUMNS per sample
+        """
+        return import_samples(self.p.signal_samples(last))
+
+    def get_telemetry(self, metric, start=None, end=None):
+        """
+        :return: numpy array of the (time, value) rows of metric stored by the server, and the strings of the
+                 values of a text metric by code
+        """
+        exported = self.p.telemetry_series(metric, start, end)
+        return import_samples(exported), exported.get('strings', {})
+
     def set_rat_mode(self, rat='auto', mcc=0, mnc=0):
         if rat.upper() not in {'AUTO', 'LTE', 'NR_LTE', 'NR'}:
             return ValueError(' rat value should be one of AUTO, LTE, NR_LTE or NR')
-        rat_mode = self.p.set_rat_mode(rat.lower(), mcc, mnc)
-        if isinstance(rat_mode, tuple):
+        rat_mode = typed('set_rat_mode', self.p.set_rat_mode(rat.lower(), mcc, mnc))
+        if isinstance(rat_mode, OperatorSelection):
             return rat_mode
         raise RemoteException('something gone wrong while setting the rat mode, due to {}'.format(rat_mode))
 
+    def start_network_scan(self, refresh=False):
+        job_id = self.p.start_network_scan(refresh)
+        if not isinstance(job_id, int):
+            raise RemoteException('Something gone wrong while starting a network scan, due to {}'.format(job_id))
+        return job_id
+
+    def get_network_scan(self, job_id, since=0):
+        """
+        :param since: number of operators already received, to only get the ones found since
+        :return: dict state, cached, error, elapsed_s, count and operators (Operator), see ScanJob.describe
+        """
+        scan = self.p.network_scan(job_id, since)
+        scan['operators'] = [Operator._make(operator) for operator in scan['operators']]
+        return scan
+
+    def scan_networks(self, refresh=False, interval=1.0):
+        """
+        start a network scan and yield the operators as the server finds them
+        """
+        job_id, received = self.start_network_scan(refresh), 0
+        while True:
+            scan = self.get_network_scan(job_id, received)
+            received = scan['count']
+            for operator in scan['operators']:
+                yield operator
+            if scan['state'] in ('done', 'failed', 'cancelled'):
+                if scan['error'] is not None:
+                    raise RemoteException('network scan failed, due to {}'.format(scan['error']))
+                return
+            time.sleep(interval)
+
+    def run_cycles(self, cycles=100, kind='attach', confirm_timeout=30):
+        """
+        :param kind: 'attach', 'cfun' or 'both'
+        :return: dict cycles, elapsed_s and phases, see CycleBenchmark.run
+        """
+        result = self.p.run_cycles(cycles, kind, confirm_timeout)
+        if not isinstance(result, dict):
+            raise RemoteException('Something gone wrong while running {} cycles, due to {}'.format(kind, result))
+        return result
+
     def get_network_registration_params(self):
-        registration_params = self.p.get_network_registration_params()
-        if isinstance(registration_params, tuple):
+        registration_params = typed('get_network_registration_params', self.p.get_network_registration_params())
+        if isinstance(registration_params, Registration):
             return registration_params
         raise RemoteException(
             'Something gone wrong while geeting the registration params, due to {}'.format(registration_params))
 
-    def get_pdp_address(self):
-        return self.p.get_pdp_address()
+    def wait_for_registration(self, states=(1, 5), deadline=180):
+        """
+        :return: dict registered, elapsed_ms, command, registration and transitions, see
+                 RegistrationWaiter.wait; the registrations come as Registration
+        """
+        result = self.p.wait_for_registration(list(states), deadline)
+        if not isinstance(result, dict):
+            raise RemoteException('Something gone wrong while waiting for registration, due to {}'.format(result))
+        if result['registration'] is not None:
+            result['registration'] = Registration._make(result['registration'])
+        result['transitions'] = [(elapsed_ms, command, Registration._make(registration))
+                                 for elapsed_ms, command, registration in result['transitions']]
+        return result
+
+    def get_pdp_address(self, cid=None):
+        return self.p.get_pdp_address(cid)
+
+    def get_pdp_contexts(self):
+        return self._pdp_contexts(self.p.get_pdp_contexts())
+
+    def define_pdp_contexts(self, contexts):
+        """
+        :param contexts: (cid, pdp_type, apn) of each context
+        """
+        return self._pdp_contexts(self.p.define_pdp_contexts([list(context) for context in contexts]))
+
+    def set_pdp_context_states(self, activate=(), deactivate=()):
+        return self._pdp_contexts(self.p.set_pdp_context_states(list(activate), list(deactivate)))
+
+    @staticmethod
+    def _pdp_contexts(contexts):
+        if not isinstance(contexts, list):
+            raise RemoteException('Something gone wrong with the PDP contexts, due to {}'.format(contexts))
+        return [PdpContext._make(context) for context in contexts]
 
     def get_ue(self):
         if self._remote_prepared:
             self.connect()
-            self.ue_ready = self.p.get_ue(self._com_id)
-            if self.ue_ready is True:
+            self.ue_ready = typed('get_ue', self.p.get_ue())
+            if isinstance(self.ue_ready, Functionality) and self.ue_ready.full:
                 logger.info('ue ready value:{}'.format(self.ue_ready))
                 return self.ue_ready
             raise RemoteException(
@@ -129,18 +231,19 @@ class Client(object):
             )
 
     def attach(self):
-        attach_state = self.p.attach()
-        if 'Attached' in attach_state:
+        attach_state = typed('attach', self.p.attach())
+        if isinstance(attach_state, AttachState) and attach_state.attached:
             return True
         raise RemoteAttachException('attach gone wrong, due to :  {}'.format(attach_state))
 
 
     def detach(self):
-        self._attached = self.p.detach()
-        if not self._attached:
+        detach_state = typed('detach', self.p.detach())
+        if isinstance(detach_state, AttachState) and not detach_state.attached:
+            self._attached = False
             logger.info('ue detach successful')
             return self._attached
-        raise RemoteDetachException('detach exception: {}'.format(self._attached))
+        raise RemoteDetachException('detach exception: {}'.format(detach_state))
 
 
     def connect(self):
@@ -0,0 +1,50 @@
+"""
+descriptions of the codes held by the result records, looked up on the client instead of being sent by the server
+"""
+from ..server.commands.common.at_mobile_controller import CFUN, CPAS, CPIN, CSQ, WS46
+from ..server.commands.common.at_network_handler import CGACT, CGATT, COPS, CREG
+from ..server.records import (ActivityStatus, AttachState, ExtendedSignalQuality, Functionality, Operator,
+                              OperatorSelection, PdpContext, Registration, SignalQuality, SimStatus,
+                              SystemSelection)
+
+NOT_EXPECTED = 'Not in expected values'
+
+# record -> (field, table of the descriptions of its codes)
+TABLES = {
+    SimStatus: (('code', CPIN.expected_values),),
+    ActivityStatus: (('pas', CPAS.expected_values),),
+    Functionality: (('fun', CFUN.expected_values),),
+    SignalQuality: (('ber', CSQ.bit_error_rates),),
+    ExtendedSignalQuality: (('ber', CSQ.bit_error_rates),),
+    Registration: (('n', CREG.expected_values[0]), ('stat', CREG.expected_values[1]),
+                   ('act', CREG.expected_values[2])),
+    OperatorSelection: (('mode', COPS.expected_values[0]), ('format', COPS.expected_values[1]),
+                        ('act', COPS.expected_values[2])),
+    Operator: (('stat', COPS.operator_status), ('act', COPS.expected_values[2])),
+    AttachState: (('state', CGATT.expected_values),),
+    SystemSelection: (('n', WS46.expected_values),),
+    PdpContext: (('state', CGACT.expected_values),),
+}
+
+
+def describe(record):
+    """
+    :param record: result record returned by the server
+    :return: dict field -> description of its code, for the fields having one
+    """
+    descriptions = {}
+    for field, table in TABLES[type(record)]:
+        value = getattr(record, field)
+        if value is not None:
+            descriptions[field] = table.get(value, NOT_EXPECTED)
+    if getattr(record, 'ber', None) == 99:
+        descriptions['ber'] = 'not known or not detectable'
+    if isinstance(record, ExtendedSignalQuality):
+        if record.rsrq_db is not None:
+            descriptions['rsrq'] = '{} dB'.format(record.rsrq_db)
+        if record.rsrp_dbm is not None:
+            descriptions['rsrp'] = '{} dBm'.format(record.rsrp_dbm)
+    if isinstance(record, SignalQuality):
+        descriptions['rssi'] = '{} ({} dBm)'.format(CSQ.get_signal_condition(record.rssi), record.dbm) \
+            if record.dbm is not None else CSQ.get_signal_condition(record.rssi)
+    return descriptions
@@ -0,0 +1,194 @@
+"""
+asyncio counterpart of Connector, letting one event loop drive dozens of modems (POSIX only)
+"""
+import asyncio
+import logging
+import os
+import time
+
+import serial
+
+from .response import LineSplitter, Response, encode_command, final_result, ERROR
+from .serial_connector import port_name
+from .timeouts import TimeoutPolicy
+from .transcript import Transcript
+from .urc import UrcDispatcher, RAW_URC_PREFIXES, is_unsolicited, raw_urc_prefix, response_prefixes
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class AsyncConnector(object):
+    """
+    same run/execute contract as Connector, as coroutines; the port stays open between commands
+    and is read through loop.add_reader on its non-blocking file descriptor
+    """
+
+    def __init__(self, com_id, history_size=1000, transcript_path=None, timeouts=None):
+        self._history = Transcript(maxlen=history_size, path=transcript_path)
+        self._lines = LineSplitter()
+        self._solicited = None
+        self._expected = None
+        # serializes the commands on the port, created once so that every caller waits on the same lock
+        self._lock = asyncio.Lock()
+        self._loop = None
+        self.urc = UrcDispatcher()
+        self._ser = None
+        self._com_id = com_id
+        self.timeouts = timeouts if timeouts is not None else TimeoutPolicy()
+
+    @property
+    def history(self):
+        return self._history
+
+    def open_port(self, b=115200):
+        return serial.Serial(
+            port=port_name(self._com_id), baudrate=b, stopbits=serial.STOPBITS_ONE, parity=serial.PARITY_NONE,
+            timeout=0, write_timeout=0, xonxoff=1)
+
+    async def connect(self, b=115200):
+        if self._ser:
+            await self.disconnect()
+        self._loop = asyncio.get_running_loop()
+        self._solicited = asyncio.Queue()
+        self._lines.reset()
+        self._ser = self.open_port(b)
+        self._loop.add_reader(self._ser.fileno(), self._on_readable)
+        logger.info('ASYNC CONNECTION ESTABLISHED TO COM PORT {}'.format(self._com_id))
+        return self._ser
+
+    async def disconnect(self):
+        if self._ser is None:
+            return
+        self._loop.remove_reader(self._ser.fileno())
+        self._ser.close()
+        self._ser = None
+        logger.info('ASYNC SERIAL DISCONNECTION COMPLETE')
+
+    def _on_readable(self):
+        try:
+            chunk = os.read(self._ser.fileno(), 4096)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logger.info('COM port {} lost : {}'.format(self._com_id, e))
+            self._loop.remove_reader(self._ser.fileno())
+            self._ser.close()
+            self._ser = None
+            return
+        for raw in self._lines.feed(chunk):
+            self._history.received(raw)
+            self._route(raw)
+
+    def _route(self, raw):
+        line = None
+        if raw_urc_prefix(raw) in RAW_URC_PREFIXES:
+            line = raw.decode(errors='replace')
+        if line is not None and is_unsolicited(line, self._expected or frozenset()):
+            self.urc.dispatch(line)
+        elif self._expected is not None:
+            self._solicited.put_nowait(raw)
+        else:
+            logger.debug('discarding unexpected line on COM port {} : {}'.format(self._com_id, raw))
+
+    async def send_command(self, command):
+        """
+        send a command to com
+        :param command:
+        :return:
+        """
+        raw, wire = encode_command(command)
+        self._history.sent(raw)
+        self._expected = response_prefixes(command)
+        while not self._solicited.empty():
+            self._solicited.get_nowait()
+        data = memoryview(wire)
+        fd = self._ser.fileno()
+        while data:
+            try:
+                data = data[os.write(fd, data):]
+            except BlockingIOError:
+                writable = self._loop.create_future()
+                self._loop.add_writer(fd, writable.set_result, None)
+                try:
+                    await writable
+                finally:
+                    self._loop.remove_writer(fd)
+
+    async def read_command(self, timeout):
+        """
+        Read Serial Communication output
+        :param timeout:
+        :return:
+        """
+        output = Response()
+        wait_until = time.monotonic() + timeout
+        while True:
+            remaining = wait_until - time.monotonic()
+            if remaining <= 0:
+                return output
+            try:
+                raw = await asyncio.wait_for(self._solicited.get(), remaining)
+            except asyncio.TimeoutError:
+                return output
+            output.append(raw)
+            code = final_result(raw)
+            if code is ERROR:
+                return {'error': output}
+            if code is not None:
+                return output
+
+    async def execute(self, command, timeout=0.2):
+        """
+        execute command on COM port
+        :param command:
+        :param timeout:
+        :return: a list of command lines output
+        """
+        modem = port_name(self._com_id)
+        deadline = self.timeouts.deadline(modem, command, timeout)
+        started = time.perf_counter()
+        await self.send_command(command)
+        logger.debug('executing command {} on COM Port{} with a deadline of {:.3f} sec'.format(
+            command, self._com_id, deadline))
+        try:
+            output = await self.read_command(timeout=deadline)
+        finally:
+            self._expected = None
+        if not isinstance(output, dict):
+            answered = output and final_result(output.raw(-1)) is not None
+            self.timeouts.record(modem, command, time.perf_counter() - started if answered else deadline)
+        logger.debug('{} output:: {}'.format(command, output))
+        return output
+
+    @staticmethod
+    def cut_short(result):
+        """
+        True for a response cut by the deadline before its final result code
+        """
+        return final_result(result.raw(-1)) is None
+
+    def error_occurred(self, result):
+        if isinstance(result, dict) or len(result) == 0:
+            return True
+        return False
+
+    async def run(self, command, timeout, exception, message):
+        async with self._lock:
+            if self._ser is None:
+                await self.connect()
+            output = await self.execute(command=command, timeout=timeout)
+        if self.error_occurred(output):
+            logger.debug(
+                message + ' {} output : {}'.format(command, output) + "exception encountered : {}".format(exception))
+            raise exception(message + ' {} output : {}'.format(command, output))
+        if self.cut_short(output):
+            logger.debug('{} got no final result code within the deadline, partial output : {}'.format(
+                command, output))
+            raise exception(message + ' {} : no final result code within the deadline, partial output : {}'.format(
+                command, output))
+        return output
+
+    async def close(self):
+        await self.disconnect()
+        self._history.close()
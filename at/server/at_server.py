@@ -2,11 +2,24 @@ from __future__ import print_function
 import Pyro4
 import logging
 import sys
-from .serial_connector import Connector
+from .serial_connector import Connector, PortSettings
+from .baudrate import BaudRateNegotiator
+from .timeouts import TimeoutPolicy
+from .batch import BatchExecutor
+from .capabilities import CapabilityIndex, capability_set, firmware_key
+from .cycles import CycleBenchmark
+from .pdp import PdpContexts
+from .sampler import SignalSampler, sample_row
+from .scan import NetworkScans
+from .worker import ModemWorker, INTERACTIVE, LONG_RUNNING
+from .commands.catalog import CommandCatalog
+from .commands.common.exceptions import CommandQueueFull
 from .commands.common.at_mobile_controller import *
 from .commands.common.at_network_handler import *
 import os
 import functools
+import threading
+from concurrent.futures import CancelledError
 
 current_dir = os.getcwd()
 logging.basicConfig(filename=current_dir + '/server.log',
@@ -19,27 +32,88 @@ logger.addHandler(logging.NullHandler())
 AT_VERSION = '0.1'
 
 
+def current_caller():
+    """
+    address of the Pyro client making the current call, the thread name outside of a Pyro call
+    """
+    address = getattr(Pyro4.current_context, 'client_sock_addr', None)
+    if address is None:
+        return threading.current_thread().name
+    return address
+
+
+def scheduled(priority):
+    """
+    run the call on the worker thread of the modem, queued by priority and served round-robin between callers
+    :param priority: INTERACTIVE for quick reads, LONG_RUNNING for sets and reads the modem may hold for minutes
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            return self.worker.run(func, (self,) + args, kwargs, priority=priority, caller=current_caller(),
+                                   name=func.__name__)
+
+        return wrapper
+
+    return decorator
+
+
+def recorded(func):
+    """
+    append the result records of the call (or of the dict it returns) to the telemetry store of the server
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        result = func(self, *args, **kwargs)
+        if self.telemetry is not None:
+            self.telemetry.append_records(str(self.com_id), result.values() if isinstance(result, dict) else [result])
+        return result
+
+    return wrapper
+
+
 class ATServer(object):
     PYRO_SEREVR_NAME = 'ATServer'
 
-    def __init__(self, hostname, com_id):
+    def __init__(self, hostname, com_id, persistent=True, transcript_path=None, port=9093, high_speed=False,
+                 settings_path=None, timeouts_path=None, capabilities_path=None, telemetry=None):
         self._hostname = hostname
-        self.connector = Connector(com_id=com_id)
+        self._port = port
+        self.com_id = com_id
+        self.high_speed = high_speed
+        self.worker = ModemWorker(name=com_id)
+        self.connector = Connector(com_id=com_id, persistent=persistent, transcript_path=transcript_path,
+                                   settings=PortSettings(settings_path), timeouts=TimeoutPolicy(timeouts_path))
+        self.batch = BatchExecutor(self.connector)
+        self.commands = CommandCatalog(self.connector)
         self._prepared = False
         self.enabled = False
-        self.supported_commands = self.get_supported_commands()
         self.exceptions = []
+        self.capabilities = CapabilityIndex(capabilities_path)
+        self.firmware = None
+        self.sampler = None
+        # telemetry.TelemetryStore the results are appended to, may be shared by the servers of a farm
+        self.telemetry = telemetry
+        # set when the supported commands come from the capability index, refreshed once the worker runs
+        self._stale_capabilities = False
+        self.supported_commands = frozenset()
+        self.supported_commands = self.get_supported_commands()
+        self.scans = NetworkScans(self.worker, self.commands.get(COPS, 360))
+        self.pdp = PdpContexts(self.batch, self.commands)
 
     def checker(command, require_cfun_activation=True):
         def decorator_checker(func):
             @functools.wraps(func)
             def wrapper(*args, **kwargs):
                 value = ''
-                if command in args[0].supported_commands():
+                if command in args[0].supported_commands:
                     if require_cfun_activation:
                         if args[0].enabled:
                             try:
                                 value = func(*args, **kwargs)
+                            except (CommandQueueFull, CancelledError):
+                                # the call never reached the modem, the caller retries or gives up
+                                raise
                             except Exception as e:
                                 args[0].exceptions.append({command: e})
                                 logger.debug('exception encountered {} while running command {}'.format(
@@ -57,63 +131,366 @@ class ATServer(object):
 
         return decorator_checker
 
+    def identify(self):
+        """
+        :return: key of the modem firmware in the capability index, from its IMEI and ATI revision
+        """
+        return firmware_key(self.commands.get(GSN, 20).get(), self.commands.get(ATI, 60).get())
+
     def get_supported_commands(self):
+        """
+        supported commands of the modem firmware from the capability index, AT+CLAC for a firmware never seen
+        """
+        try:
+            self.firmware = self.identify()
+        except Exception as e:
+            self.exceptions.append({ATI.COMMAND: e})
+        known = self.capabilities.get(self.firmware) if self.firmware is not None else None
+        if known is None:
+            return self.refresh_capabilities()
+        self._stale_capabilities = True
+        self.supported_commands = known
+        return self.supported_commands
+
+    def refresh_capabilities(self):
+        """
+        list the supported commands with AT+CLAC and store them in the capability index
+        """
         try:
-            self.supported_commands = CLAC(self.connector).read()
+            commands = capability_set(self.commands.get(CLAC).get())
         except Exception as e:
             self.exceptions.append({CLAC.COMMAND: e})
-            pass
+            return self.supported_commands
+        self._stale_capabilities = False
+        self.supported_commands = commands
+        if self.firmware is not None:
+            self.capabilities.put(self.firmware, commands)
         return self.supported_commands
 
     @Pyro4.expose
     @checker(CPIN.COMMAND)
+    @scheduled(LONG_RUNNING)
+    @recorded
     def read_pin_status(self):
-        return CPIN(self.connector, timeout=180).read()
+        return self.commands.get(CPIN, 180).read()
 
     @Pyro4.expose
     @checker(CPAS.COMMAND)
+    @scheduled(INTERACTIVE)
+    @recorded
     def report_phone_activity_status(self):
-        return CPAS(self.connector, timeout=180).get()
+        return self.commands.get(CPAS, 180).get()
 
     @Pyro4.expose
     @checker(CSQ.COMMAND)
+    @scheduled(INTERACTIVE)
+    @recorded
     def get_signal_quality(self):
-        return CSQ(self.connector, timeout=50).get()
+        return self.commands.get(CSQ, 50).get()
+
+    @Pyro4.expose
+    @checker(CESQ.COMMAND)
+    @scheduled(INTERACTIVE)
+    @recorded
+    def get_extended_signal_quality(self):
+        return self.commands.get(CESQ, 20).get()
 
     @Pyro4.expose
     @checker(ATI.COMMAND)
+    @scheduled(INTERACTIVE)
     def get_product_informations(self):
-        return ATI(self.connector, timeout=60).get()
+        return self.commands.get(ATI, 60).get()
+
+    @Pyro4.expose
+    @checker(GSN.COMMAND)
+    @scheduled(INTERACTIVE)
+    def get_imei(self):
+        return self.commands.get(GSN, 20).get()
+
+    @Pyro4.expose
+    @checker(CIMI.COMMAND)
+    @scheduled(INTERACTIVE)
+    def get_imsi(self):
+        return self.commands.get(CIMI, 20).get()[0]
+
+    @Pyro4.expose
+    @checker(CGMM.COMMAND)
+    @scheduled(INTERACTIVE)
+    def get_model(self):
+        return self.commands.get(CGMM, 20).get()
 
     @Pyro4.expose
     @checker(CREG.COMMAND)
+    @scheduled(INTERACTIVE)
+    @recorded
     def get_network_registration_params(self):
-        return CREG(self.connector, timeout=180).read()
+        return self.commands.get(CREG, 180).read()
+
+    @Pyro4.expose
+    @checker(CREG.COMMAND)
+    def wait_for_registration(self, states=REGISTERED, deadline=180):
+        """
+        wait for one of the registration states (registered, home network or roaming by default) on CREG, and
+        on CEREG and C5GREG when supported, see RegistrationWaiter; the commands are scheduled on the worker,
+        not the wait itself
+        """
+        commands = [self.commands.get(command, 20) for command in (CREG, CEREG, C5GREG)
+                    if command.COMMAND in self.supported_commands]
+        waiter = RegistrationWaiter(self.connector, commands, run=functools.partial(
+            self.worker.run, priority=LONG_RUNNING, caller=current_caller(), name='wait_for_registration'))
+        result = waiter.wait(tuple(states), deadline)
+        if self.telemetry is not None and result['registered']:
+            self.telemetry.append(str(self.com_id), 'time_to_register_ms', result['elapsed_ms'])
+        return result
+
+    @Pyro4.expose
+    @checker(CSQ.COMMAND)
+    @scheduled(INTERACTIVE)
+    @recorded
+    def poll_status(self):
+        """
+        pin status, phone activity, signal quality and registration in a single serial transaction
+        :return: dict method name -> result of that method
+        """
+        names = ['read_pin_status', 'report_phone_activity_status', 'get_signal_quality',
+                 'get_network_registration_params']
+        commands = [self.commands.get(CPIN, 180), self.commands.get(CPAS, 180),
+                    self.commands.get(CSQ, 50), self.commands.get(CREG, 180)]
+        return dict(zip(names, self.batch.run(commands)))
+
+    def read_signal(self):
+        """
+        one signal sample: AT+CSQ, with AT+CESQ on the same line when the modem supports it
+        :return: rssi, ber, rsrq, rsrp codes (sample_row)
+        """
+        commands = [self.commands.get(CSQ, 50)]
+        if CESQ.COMMAND in self.supported_commands:
+            commands.append(self.commands.get(CESQ, 20))
+        records = self.batch.run(commands)
+        if self.telemetry is not None:
+            self.telemetry.append_records(str(self.com_id), records)
+        return sample_row(*records)
+
+    @Pyro4.expose
+    @checker(CSQ.COMMAND)
+    def start_sampling(self, interval=0.1, capacity=36000):
+        """
+        sample the signal quality every interval seconds on the server, keeping the last capacity samples
+        (one hour at 10 samples per second by default); replaces the samples of a previous sampling
+        """
+        self.stop_sampling()
+        self.sampler = SignalSampler(self.worker, self.read_signal, interval=interval, capacity=capacity).start()
+        return True
+
+    @Pyro4.expose
+    def stop_sampling(self):
+        """
+        stop sampling, the samples taken stay available
+        """
+        if self.sampler is not None:
+            self.sampler.stop()
+        return True
+
+    @Pyro4.expose
+    def signal_statistics(self, last=None):
+        """
+        :param last: number of most recent samples to compute the statistics on, all the samples held when None
+        :return: dict of the statistics of the samples (sampler.statistics), with the sampling errors and missed ticks
+        """
+        return self._sampling().statistics(last)
+
+    @Pyro4.expose
+    def signal_samples(self, last=None):
+        """
+        :return: the last samples as a single array, rebuilt by sampler.import_samples
+        """
+        return self._sampling().export(last)
+
+    @Pyro4.expose
+    def telemetry_series(self, metric, start=None, end=None, modem=None):
+        """
+        :param metric: e.g. 'SignalQuality.rssi', 'Registration.stat', 'SimStatus.code'
+        :param start: epoch seconds of the first value, end excluded; all the values stored when None
+        :param modem: modem of the values, this one when None
+        :return: times and values of metric as a single array (sampler.import_samples), with the strings
+                 of the codes of a text metric
+        """
+        if self.telemetry is None:
+            raise ValueError('the server has no telemetry store')
+        return self.telemetry.export(metric, modem=modem or str(self.com_id), start=start, end=end)
+
+    def _sampling(self):
+        if self.sampler is None:
+            raise ValueError('signal sampling never started, call start_sampling first')
+        return self.sampler
 
     @checker(COPS.COMMAND)
     @Pyro4.expose
+    @scheduled(LONG_RUNNING)
     def set_rat_mode(self, rat='AUTO', mcc=0, mnc=0):
         if rat.upper() not in {'AUTO', 'LTE', 'NR_LTE', 'NR'}:
             raise ValueError(' rat value should be one of AUTO, LTE, NR_LTE or NR')
-        return COPS(self.connector).set(rat=COPS.rat, mcc=mcc, mnc=mnc)
+        return self.commands.get(COPS).set(rat=getattr(COPS, rat.upper()), mcc=mcc, mnc=mnc)
+
+    @Pyro4.expose
+    @checker(COPS.COMMAND)
+    def start_network_scan(self, refresh=False):
+        """
+        start an AT+COPS=? network scan on the modem worker, served from the last scan when cached
+        :param refresh: scan even when a scan is cached
+        :return: id of the scan job, to pass to network_scan
+        """
+        return self.scans.start(refresh, caller=current_caller())
+
+    @Pyro4.expose
+    def network_scan(self, job_id, since=0):
+        """
+        :param since: number of operators already received
+        :return: dict state, cached, error, elapsed_s, count and the operators (Operator) found after since
+        """
+        return self.scans.get(job_id, since)
+
+    @Pyro4.expose
+    def cancel_network_scan(self, job_id):
+        return self.scans.cancel(job_id)
+
+    @Pyro4.expose
+    @checker(CGDCONT.COMMAND)
+    @scheduled(INTERACTIVE)
+    def get_pdp_contexts(self):
+        """
+        :return: PdpContext of every defined context: definition, state and addresses, in one serial transaction
+        """
+        return self.pdp.read()
+
+    @Pyro4.expose
+    @checker(CGPADDR.COMMAND)
+    @scheduled(INTERACTIVE)
+    def get_pdp_address(self, cid=None):
+        """
+        :param cid: context, the first active one when None
+        """
+        return self.pdp.address(cid)
+
+    @Pyro4.expose
+    @checker(CGDCONT.COMMAND)
+    @scheduled(LONG_RUNNING)
+    def define_pdp_contexts(self, contexts):
+        """
+        :param contexts: (cid, pdp_type, apn) of each context, defined with one command line
+        """
+        return self.pdp.define(contexts)
+
+    @Pyro4.expose
+    @checker(CGACT.COMMAND)
+    @scheduled(LONG_RUNNING)
+    def set_pdp_context_states(self, activate=(), deactivate=()):
+        """
+        :param activate: cids of the contexts to activate
+        :param deactivate: cids of the contexts to deactivate, with the activations in one command line
+        """
+        return self.pdp.change(activate, deactivate)
 
     @Pyro4.expose
     @checker(CGATT.COMMAND)
+    @scheduled(LONG_RUNNING)
+    @recorded
     def attach(self):
-        return CGATT(self.connector).set(CGATT.ATTACH)
+        return self.commands.get(CGATT).set(CGATT.ATTACH)
 
     @Pyro4.expose
+    @scheduled(LONG_RUNNING)
+    @recorded
     def detach(self):
-        return CGATT(self.connector).set(CGATT.DETACH)
+        return self.commands.get(CGATT).set(CGATT.DETACH)
 
     @Pyro4.expose
+    @scheduled(LONG_RUNNING)
+    @recorded
     def get_ue(self):
         self.enabled = True
-        return CFUN(self.connector, timeout=20).set(level=CFUN.ACTIVATE)
+        return self.commands.get(CFUN, 20).set(level=CFUN.ACTIVATE)
 
     @Pyro4.expose
+    @scheduled(LONG_RUNNING)
+    @recorded
     def release_ue(self):
-        return CFUN(self.connector, timeout=20).set(level=CFUN.DEACTIVATE)
+        return self.commands.get(CFUN, 20).set(level=CFUN.DEACTIVATE)
+
+    @Pyro4.expose
+    @checker(CGATT.COMMAND)
+    @scheduled(LONG_RUNNING)
+    def run_cycles(self, cycles=100, kind='attach', confirm_timeout=30):
+        """
+        attach/detach ('attach'), radio off/on ('cfun') or both cycles back to back, see CycleBenchmark.run;
+        the worker runs nothing else meanwhile, so the cycles are not interleaved with other calls
+        :return: dict cycles, elapsed_s, and per phase the latency distributions and the failures
+        """
+        commands = {CGATT.COMMAND: self.commands.get(CGATT, 180), CFUN.COMMAND: self.commands.get(CFUN, 180)}
+        return CycleBenchmark(self.connector, commands, confirm_timeout=confirm_timeout).run(cycles, kind)
+
+    @Pyro4.expose
+    def subscribe_urc(self, prefixes=None):
+        """
+        :param prefixes: URC prefixes to receive, e.g. ['+CREG:', '+CGEV:', 'RING'], all URCs when None
+        :return: subscription id to pass to get_urc
+        """
+        return self.connector.urc.subscribe(prefixes).id
+
+    @Pyro4.expose
+    def get_urc(self, subscription_id, timeout=0, max_items=100):
+        """
+        :return: list of (timestamp, line) received since the previous call
+        """
+        return self.connector.urc.get(subscription_id).get(timeout=timeout, max_items=max_items)
+
+    @Pyro4.expose
+    def unsubscribe_urc(self, subscription_id):
+        return self.connector.urc.unsubscribe(subscription_id)
+
+    @Pyro4.expose
+    def queued_commands(self):
+        """
+        :return: the call running on the modem and the queued ones, as dicts id, name, priority, caller, waiting_s
+        """
+        return self.worker.queued()
+
+    @Pyro4.expose
+    def cancel_command(self, ticket_id):
+        """
+        cancel a queued call, its caller gets a CancelledError
+        :param ticket_id: id listed by queued_commands
+        :return: False when the call already started or finished
+        """
+        return self.worker.cancel(ticket_id)
+
+    @Pyro4.expose
+    def scheduler_stats(self):
+        """
+        :return: dict method name -> count, queue_wait_ms and execution_ms (p50, p95, max)
+        """
+        return self.worker.stats()
+
+    @Pyro4.expose
+    def cache_stats(self):
+        """
+        :return: dict hits, misses, hit_ratio, invalidations and entries of the identity answers cache
+        """
+        return self.connector.cache.stats()
+
+    @Pyro4.expose
+    def invalidate_cache(self):
+        """
+        drop the cached identity answers, e.g. after a SIM swap the modem did not report
+        """
+        self.connector.cache.invalidate()
+
+    @Pyro4.expose
+    def timeout_report(self):
+        """
+        :return: dict 'port|command' -> count, p50_ms, p99_ms of the latency the deadlines are learned from
+        """
+        return self.connector.timeouts.report(self.connector.port_name)
 
     @staticmethod
     @Pyro4.expose
@@ -125,23 +502,55 @@ class ATServer(object):
 
     @Pyro4.expose
     def shutdown(self):
+        self.running = False
         self.daemon.shutdown()
         logger.info("server shutdown complete")
 
+    def open(self):
+        """
+        start the modem worker, negotiate the line speed when high_speed is set and not yet known for
+        the port, in persistent mode open the port session and its background reader, and queue the
+        refresh of supported commands loaded from the capability index
+        """
+        self.worker.start()
+        if self.high_speed and self.connector.settings.get(self.connector.port_name) is None:
+            BaudRateNegotiator(self.connector).negotiate()
+        if self.connector.persistent:
+            self.connector.start_reader()
+        if self._stale_capabilities:
+            self.worker.schedule(self.refresh_capabilities, priority=LONG_RUNNING, caller='capabilities',
+                                 name='refresh_capabilities')
+
+    def close(self):
+        self.stop_sampling()
+        self.worker.stop()
+        if self.telemetry is not None:
+            self.telemetry.flush()
+        self.connector.close_session()
+        self.connector.history.close()
+        self.connector.timeouts.save()
+
     def start(self):
         Pyro4.config.SOCK_REUSE = True
         Pyro4.config.REQUIRE_EXPOSE = True
-        with Pyro4.Daemon(
-                host=self._hostname,
-                port=9093
-        ) as self.daemon:
-            self.daemon.register(self, objectId=self.PYRO_SEREVR_NAME)
-            self.running = True
-            self.daemon.requestLoop(loopCondition=self._isrunning)
-            logger.info('server up and running')
+        self.open()
+        try:
+            with Pyro4.Daemon(
+                    host=self._hostname,
+                    port=self._port
+            ) as self.daemon:
+                self.daemon.register(self, objectId=self.PYRO_SEREVR_NAME)
+                self.running = True
+                self.daemon.requestLoop(loopCondition=self._isrunning)
+                logger.info('server up and running')
+        finally:
+            self.close()
 
 
 if __name__ == '__main__':
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 3:
+        from .farm import ModemFarm
+        ModemFarm(hostname=sys.argv[1], com_ids=sys.argv[2:]).start()
+    elif len(sys.argv) > 1:
         ATServer(hostname=sys.argv[1], com_id=sys.argv[2]).start()
     logger.info('server is running')
\ No newline at end of file
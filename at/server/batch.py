@@ -0,0 +1,93 @@
+"""
+several AtCommand queries sent in one serial transaction, e.g. AT+CPIN?;+CPAS;+CSQ;+CREG?
+"""
+import logging
+
+from .commands.common.exceptions import ATCommandException
+from .commands.grammar import parse_batch
+from .urc import urc_prefix
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class BatchExecutor(object):
+    # V.250 only guarantees a 40 characters command line, most modems accept far more
+    MAX_LINE_LENGTH = 80
+
+    def __init__(self, connector, max_line_length=MAX_LINE_LENGTH):
+        self.connector = connector
+        self.max_line_length = max_line_length
+        # None until the modem answered a compound line, False once it was found to reject them
+        self.chaining = None
+
+    def group(self, commands):
+        """
+        split commands into compound lines: chainable commands with distinct prefixes, within max_line_length
+        :return: list of lists of commands
+        """
+        groups = []
+        current, prefixes, length = [], set(), 2
+        for command in commands:
+            if not command.CHAINABLE or self.chaining is False:
+                if current:
+                    groups.append(current)
+                    current, prefixes, length = [], set(), 2
+                groups.append([command])
+                continue
+            part = len(command.query()) - 1
+            if current and (command.response_prefix() in prefixes or length + part > self.max_line_length):
+                groups.append(current)
+                current, prefixes, length = [], set(), 2
+            current.append(command)
+            prefixes.add(command.response_prefix())
+            length += part
+        if current:
+            groups.append(current)
+        return groups
+
+    @staticmethod
+    def compound_line(commands):
+        return 'AT' + ';'.join(command.query()[2:] for command in commands)
+
+    def run(self, commands, exception=ATCommandException, message='Error while running batch'):
+        """
+        :param commands: AtCommand instances
+        :return: list with the parse_query result of each command, in the same order
+        """
+        results = []
+        for group in self.group(commands):
+            if len(group) == 1:
+                results.append(self._run_one(group[0], exception, message))
+            else:
+                results += self._run_group(group, exception, message)
+        return results
+
+    def _run_one(self, command, exception, message):
+        output = self.connector.run(command=command.query(), timeout=command.timeout,
+                                    exception=exception, message=message)
+        return command.parse_query(output)
+
+    def _run_group(self, group, exception, message):
+        try:
+            output = self.connector.run(command=self.compound_line(group),
+                                        timeout=max(command.timeout for command in group),
+                                        exception=exception, message=message)
+        except exception as e:
+            logger.debug('compound line {} failed ({}), running its commands one by one'.format(
+                self.compound_line(group), e))
+            results = [self._run_one(command, exception, message) for command in group]
+            # every command succeeded alone: the modem does not accept compound lines
+            self.chaining = False
+            return results
+        self.chaining = True
+        schemas = [command.RESPONSE for command in group]
+        if all(schema is not None and schema.prefix is not None for schema in schemas):
+            records = parse_batch(schemas, output)
+            return [command.from_record(record) for command, record in zip(group, records)]
+        slices = dict((command.response_prefix(), []) for command in group)
+        for line in output[:-1]:
+            prefix = urc_prefix(line)
+            if prefix in slices:
+                slices[prefix].append(line)
+        return [command.parse_query(slices[command.response_prefix()] + output[-1:]) for command in group]
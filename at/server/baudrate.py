@@ -0,0 +1,68 @@
+"""
+switch a modem to the fastest baud rate it handles reliably, with RTS/CTS flow control
+"""
+import logging
+import time
+
+from .commands.common.at_mobile_controller import IPR
+from .response import OK, final_result
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class BaudRateNegotiator(object):
+
+    def __init__(self, connector, max_baudrate=3000000, pings=3, settle=0.1):
+        """
+        :param connector: Connector, its settings remember the outcome per port
+        :param max_baudrate: fastest rate tried, e.g. what the USB bridge supports
+        :param pings: successive AT probes required at the new rate
+        :param settle: seconds given to the modem to switch rate after answering AT+IPR
+        """
+        self.connector = connector
+        self.max_baudrate = max_baudrate
+        self.pings = pings
+        self.settle = settle
+
+    def ping(self, count=1):
+        for _ in range(count):
+            output = self.connector.execute('AT', timeout=1)
+            if not output or isinstance(output, dict) or final_result(output.raw(-1)) is not OK:
+                return False
+        return True
+
+    def negotiate(self):
+        """
+        :return: the baud rate the port is left at
+        """
+        with self.connector.exclusive() as port:
+            current, current_rtscts = port.baudrate, port.rtscts
+            output = self.connector.execute('AT+IPR=?', timeout=3)
+            if isinstance(output, dict):
+                logger.info('{} does not list baud rates, staying at {}'.format(self.connector.port_name, current))
+                return current
+            for rate in reversed(IPR.parse_supported(output)):
+                if rate <= current or rate > self.max_baudrate:
+                    continue
+                if self.switch(rate, rtscts=True, fallback=(current, current_rtscts)):
+                    self.connector.settings.put(self.connector.port_name, rate, True)
+                    logger.info('{} switched to {} baud with RTS/CTS'.format(self.connector.port_name, rate))
+                    return rate
+            return current
+
+    def switch(self, rate, rtscts, fallback):
+        output = self.connector.execute('AT+IPR={}'.format(rate), timeout=3)
+        if isinstance(output, dict) or not output:
+            return False
+        time.sleep(self.settle)
+        self.connector.reconfigure(rate, rtscts)
+        if self.ping(self.pings):
+            return True
+        logger.info('{} unstable at {} baud, reverting to {}'.format(self.connector.port_name, rate, fallback[0]))
+        # the modem may already run at the new rate: ask it back from there, then from the old rate
+        self.connector.execute('AT+IPR={}'.format(fallback[0]), timeout=3)
+        time.sleep(self.settle)
+        self.connector.reconfigure(*fallback)
+        self.ping()
+        return False
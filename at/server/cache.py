@@ -0,0 +1,135 @@
+"""
+answers of identity commands (ATI, AT+CGMM, AT+GSN, AT+CIMI, AT+CLAC) kept for a per-command TTL,
+so they are served without a serial round trip
+"""
+import logging
+import threading
+import time
+
+from .response import OK, final_result
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# cached answers that depend on the SIM, dropped on a functionality change or a SIM state change
+# (the forbidden operators of a network scan come from the SIM)
+SIM_DEPENDENT = ('AT+CIMI', 'AT+COPS=?')
+
+# PDP contexts read in one transaction (pdp.PdpContexts), dropped on a +CGEV event or a command changing them
+PDP_QUERY = 'AT+CGDCONT?;+CGACT?;+CGPADDR'
+PDP_DEPENDENT = (PDP_QUERY,)
+PDP_CHANGES = ('+CGDCONT=', '+CGACT=', '+CGATT=', '+CFUN=')
+
+
+def command_parts(command):
+    """
+    'AT+CFUN=1;+CPIN?' -> ['+CFUN=1', '+CPIN?']
+    """
+    return [part.strip().upper() for part in command[2:].split(';')]
+
+
+def complete(output):
+    """
+    True for a response ending with the OK final result code, the only answers worth caching
+    """
+    lines = getattr(output, 'raw_lines', None)
+    lines = lines() if lines is not None else output
+    return bool(lines) and final_result(lines[-1]) is OK
+
+
+class ResultCache(object):
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._sim_state = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, command):
+        """
+        :return: the cached output of command, None when missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(command)
+            if entry is not None and entry[0] > self._clock():
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, command, output, ttl):
+        with self._lock:
+            self._entries[command] = (self._clock() + ttl, output)
+
+    def get_or_run(self, command, ttl, run):
+        """
+        :param run: callable executing command, its output is cached for ttl seconds when complete (see complete)
+        """
+        output = self.get(command)
+        if output is None:
+            output = run()
+            if complete(output):
+                self.put(command, output, ttl)
+        return output
+
+    def invalidate(self, commands=None):
+        """
+        :param commands: commands to drop, every cached answer when None
+        """
+        with self._lock:
+            if commands is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                dropped = sum(self._entries.pop(command, None) is not None for command in commands)
+            self.invalidations += dropped
+        if dropped:
+            logger.debug('dropped {} cached answers ({})'.format(dropped, commands or 'all'))
+
+    def observe(self, command, output):
+        """
+        watch the commands run on the modem for invalidation events: a functionality change (AT+CFUN=) may
+        power the SIM down, a reset (AT+CFUN=<fun>,1) may bring another firmware, a changed +CPIN state a new SIM;
+        attach, activation and definition commands change the PDP contexts
+        """
+        parts = command_parts(command)
+        for part in parts:
+            if part.startswith('+CFUN='):
+                self.invalidate(None if ',' in part else SIM_DEPENDENT)
+            if part.startswith(PDP_CHANGES):
+                self.invalidate(PDP_DEPENDENT)
+        if '+CPIN?' in parts:
+            for line in output:
+                if line.startswith('+CPIN:'):
+                    self.sim_state(line)
+
+    def on_urc(self, prefix, line):
+        # the modem only reports +CPIN unsolicited on a SIM state transition
+        if prefix == '+CPIN:':
+            with self._lock:
+                self._sim_state = line
+            self.invalidate(SIM_DEPENDENT)
+        elif prefix == '+CGEV:':
+            self.invalidate(PDP_DEPENDENT)
+
+    def sim_state(self, line):
+        with self._lock:
+            changed = self._sim_state is not None and self._sim_state != line
+            self._sim_state = line
+        if changed:
+            logger.info('SIM state changed to {}'.format(line))
+            self.invalidate(SIM_DEPENDENT)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(float(self.hits) / lookups, 3) if lookups else 0,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+            }
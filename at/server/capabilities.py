@@ -0,0 +1,75 @@
+"""
+commands supported by a modem, as listed by AT+CLAC, remembered per IMEI and firmware revision
+so a server starts without the CLAC round trip
+"""
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def normalize(command):
+    """
+    '+cpas' / 'AT+CPAS' -> 'AT+CPAS', the form of AtCommand.COMMAND
+    """
+    command = command.strip().upper()
+    return command if command.startswith('AT') else 'AT' + command
+
+
+def capability_set(commands):
+    """
+    :param commands: lines listed by AT+CLAC
+    :return: frozenset of the normalized commands, for O(1) support checks
+    """
+    return frozenset(normalize(command) for command in commands if command.strip())
+
+
+def firmware_key(imei, product_informations):
+    """
+    :param product_informations: ATI lines, their 'Revision:' line identifies the firmware when there is one
+    :return: key of the modem in the CapabilityIndex
+    """
+    revisions = [line.split(':', 1)[1].strip() for line in product_informations
+                 if line.upper().startswith('REVISION:')]
+    revision = revisions[0] if revisions else ' '.join(line.strip() for line in product_informations)
+    return '{}|{}'.format(imei, revision)
+
+
+class CapabilityIndex(object):
+    """
+    JSON file of firmware key -> supported commands, kept in memory only when path is None
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._index = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self._index = dict((key, capability_set(commands)) for key, commands in json.load(f).items())
+
+    def get(self, key):
+        """
+        :return: frozenset of the commands known for key, None when the modem firmware was never seen
+        """
+        return self._index.get(key)
+
+    def put(self, key, commands):
+        """
+        :return: True when the stored commands changed
+        """
+        commands = capability_set(commands)
+        with self._lock:
+            if self._index.get(key) == commands:
+                return False
+            self._index[key] = commands
+            if self.path:
+                temporary = self.path + '.tmp'
+                with open(temporary, 'w') as f:
+                    json.dump(dict((key, sorted(value)) for key, value in self._index.items()), f, indent=2)
+                os.replace(temporary, self.path)
+        logger.info('{} supported commands stored for {}'.format(len(commands), key))
+        return True
@@ -7,26 +7,100 @@ logger.addHandler(logging.NullHandler())
 
 
 class AtCommand(metaclass=abc.ABCMeta):
+    """
+    a command bound to a connector; instances only hold the connector and timeout, descriptive tables are
+    class level, so instances are cheap and reused per connector
+    """
+    __slots__ = ('serial_target', 'timeout')
     COMMAND = 'command'
+    # suffix of the status query used when the command is part of a batch
+    READ_CHAR = '?'
+    # extended commands answering with a '+NAME:' prefix can share a compound command line
+    CHAINABLE = True
+    # grammar.ResponseSchema of the information lines answering query()
+    RESPONSE = None
+    # seconds the answer stays in the cache of the connector, None for commands answered from the modem every time
+    CACHE_TTL = None
 
     def __init__(self, serial_target, timeout):
         self.serial_target = serial_target
         self.timeout = timeout
 
+    def run(self, command, exception=ATCommandException, message='Error while running command'):
+        """
+        run command on the connector, answered from the connector cache when CACHE_TTL is set
+        """
+        cache = getattr(self.serial_target, 'cache', None)
+        if self.CACHE_TTL is None or cache is None:
+            return self.serial_target.run(command=command, timeout=self.timeout, exception=exception,
+                                          message=message)
+        return cache.get_or_run(command, self.CACHE_TTL, lambda: self.serial_target.run(
+            command=command, timeout=self.timeout, exception=exception, message=message))
+
     def read(self, read_char='?', message='Error while running command'):
-        state = self.serial_target.run(command=self.COMMAND + read_char,
-                                       timeout=self.timeout,
-                                       exception=ATCommandException,
-                                       message=message)
+        state = self.run(self.COMMAND + read_char, message=message)
+        return self.parse_output(state)
+
+    def stream(self, command=None, exception=ATCommandException, message='Error while running command'):
+        """
+        run command (query() when None), yielding the records of its response as its lines are received instead
+        of parsing the whole response, see Connector.stream; never answered from the cache
+        """
+        for line in self.serial_target.stream(command=command or self.query(), timeout=self.timeout,
+                                              exception=exception, message=message):
+            yield from self.stream_records(line)
+
+    def stream_records(self, line):
+        """
+        records of a raw line of a streamed response, the RESPONSE record of the line by default
+        """
+        record = self.RESPONSE.match(line)
+        if record is not None:
+            yield record
+
+    async def read_async(self, read_char='?', message='Error while running command'):
+        """
+        read() for commands driven by an AsyncConnector
+        """
+        state = await self.serial_target.run(command=self.COMMAND + read_char,
+                                             timeout=self.timeout,
+                                             exception=ATCommandException,
+                                             message=message)
         return self.parse_output(state)
 
-    @abc.abstractmethod
+    async def query_async(self, message='Error while running command'):
+        output = await self.serial_target.run(command=self.query(),
+                                              timeout=self.timeout,
+                                              exception=ATCommandException,
+                                              message=message)
+        return self.parse_query(output)
+
+    def query(self):
+        return self.COMMAND + self.READ_CHAR
+
+    def response_prefix(self):
+        return self.COMMAND[2:] + ':'
+
+    def parse_query(self, result):
+        """
+        parse the output of query(), defaults to parse_output
+        """
+        return self.parse_output(result)
+
     def parse_error(self):
         raise NotImplementedError
 
-    @abc.abstractmethod
     def parse_output(self, result):
+        if self.RESPONSE is not None:
+            return self.from_record(self.RESPONSE.parse(result))
         match = self.COMMAND[2:] + ':'
         for value in result:
             if match in value:
-                return value.split(':')[-1]
\ No newline at end of file
+                return value.split(':')[-1]
+
+    def from_record(self, record):
+        """
+        turn what RESPONSE parsed (a record, a list of records when RESPONSE.many is set, or None when the
+        response held no information line) into the result of the command
+        """
+        return record
\ No newline at end of file
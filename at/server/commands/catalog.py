@@ -0,0 +1,33 @@
+"""
+command instances of one connector, built once and reused by every call made on it
+"""
+import threading
+
+
+class CommandCatalog(object):
+
+    def __init__(self, connector):
+        self.connector = connector
+        self._commands = {}
+        self._lock = threading.Lock()
+
+    def get(self, command_class, timeout=None):
+        """
+        :param timeout: timeout of the command, the default of command_class when None
+        :return: the command_class instance bound to the connector with that timeout
+        """
+        key = (command_class, timeout)
+        command = self._commands.get(key)
+        if command is None:
+            with self._lock:
+                command = self._commands.get(key)
+                if command is None:
+                    if timeout is None:
+                        command = command_class(self.connector)
+                    else:
+                        command = command_class(self.connector, timeout)
+                    self._commands[key] = command
+        return command
+
+    def __len__(self):
+        return len(self._commands)
@@ -2,113 +2,185 @@
 :author: Elagheb Carr
 :contact: celagheb@gmail.com
 """
+import re
+from types import MappingProxyType
+
 from ...commands.at import AtCommand
+from ...commands.grammar import ResponseSchema, Field, integer, string, hexadecimal
+from ...records import AttachState, Operator, OperatorSelection, PdpContext, Registration
+from ...transcript import timestamp
+from ...urc import urc_prefix
 from .exceptions import NetworkMethodException
 
+# registered, home network or roaming
+REGISTERED = (1, 5)
+
 
 class CREG(AtCommand):
     COMMAND = 'AT+CREG'
+    __slots__ = ()
+    RESPONSE = ResponseSchema('CREG', '+CREG:', [
+        integer('n'), integer('stat'), hexadecimal('lac', optional=True), hexadecimal('ci', optional=True),
+        integer('act', optional=True), integer('cause_type', optional=True), integer('reject_cause', optional=True)])
+    # unsolicited report of the registration (n=2): the read answer without <n>
+    REPORT = ResponseSchema('CREGReport', '+CREG:', RESPONSE.fields[1:])
+
+    expected_values = (
+        MappingProxyType({
+            0: "network registration unsolicited result code disabled",
+            1: "network registration unsolicited result code format +CREG: <stat>",
+            2: "network registration unsolicited result code format +CREG: <stat>[,[<lac>],[<ci>],[<AcT>]]",
+            3: "network registration unsolicited result code format" +
+               " +CREG: <stat>[,[<lac>],[<ci>],[<AcT>][,<cause_type>,<reject_cause>]]"
+        }),
+        MappingProxyType({
+            0: "not registered, MT is not currently searching a new operator to register to",
+            1: "registered, home network",
+            2: "not registered, but MT is currently searching a new operator to register to",
+            3: "registration denied",
+            4: "unknown (e.g. out of GERAN/UTRAN/E-UTRAN coverage)",
+            5: "registered, roaming",
+            6: "registered for 'SMS only', home network (applicable only when <AcT> indicates E-UTRAN)",
+            7: "registered for 'SMS only', roaming (applicable only when <AcT> indicates E-UTRAN)",
+            8: "attached for emergency bearer services only",
+            9: "registered for 'CSFB not preferred', home network",
+            10: "registered for 'CSFB not preferred', roaming",
+        }),
+        MappingProxyType({
+            0: "GSM",
+            1: "GSM Compact",
+            2: "UTRAN",
+            3: "GSM w/EGPRS",
+            4: "UTRAN w/HSDPA",
+            5: "UTRAN w/HSUPA",
+            6: "UTRAN w/HSDPA and HSUPA",
+            7: "E-UTRAN",
+            8: "EC-GSM-IoT (A/Gb mode)",
+            9: "E-UTRAN (NB-S1 mode)",
+            10: "E-UTRA connected to a 5GCN",
+            11: "NR connected to a 5GCN",
+            12: "NG-RAN",
+            13: "E-UTRA-NR dual connectivity"
+        })
+    )
 
     def __init__(self, serial_target, timeout=120):
         super(CREG, self).__init__(serial_target, timeout)
-        self.expected_values = [
-            {
-                0: "network registration unsolicited result code disabled",
-                1: "network registration unsolicited result code format +CREG: <stat>",
-                2: "network registration unsolicited result code format +CREG: <stat>[,[<lac>],[<ci>],[<AcT>]]",
-                3: "network registration unsolicited result code format" +
-                   " +CREG: <stat>[,[<lac>],[<ci>],[<AcT>][,<cause_type>,<reject_cause>]]"
-            },
-            {
-                0: "not registered, MT is not currently searching a new operator to register to",
-                1: "registered, home network",
-                2: "not registered, but MT is currently searching a new operator to register to",
-                3: "registration denied",
-                4: "unknown (e.g. out of GERAN/UTRAN/E-UTRAN coverage)",
-                5: "registered, roaming",
-                6: "registered for 'SMS only', home network (applicable only when <AcT> indicates E-UTRAN)",
-                7: "registered for 'SMS only', roaming (applicable only when <AcT> indicates E-UTRAN)",
-                8: "attached for emergency bearer services only",
-                9: "registered for 'CSFB not preferred', home network",
-                10: "registered for 'CSFB not preferred', roaming",
-            },
-            {
-                0: "GSM",
-                1: "GSM Compact",
-                2: "UTRAN",
-                3: "GSM w/EGPRS",
-                4: "UTRAN w/HSDPA",
-                5: "UTRAN w/HSUPA",
-                6: "UTRAN w/HSDPA and HSUPA",
-                7: "E-UTRAN",
-                8: "EC-GSM-IoT (A/Gb mode)",
-                9: "E-UTRAN (NB-S1 mode)",
-                10: "E-UTRA connected to a 5GCN",
-                11: "NR connected to a 5GCN",
-                12: "NG-RAN",
-                13: "E-UTRA-NR dual connectivity"
-            }
-        ]
-
-    def parse_output(self, result):
-        for value in result:
-            if "+CREG: " in value:
-                indicators = value.split(': ')
-                n, stat = indicators[-1].split(',')
-                n, stat = int(n), int(stat)
-                if n in self.expected_values[0].keys() and stat in self.expected_values[1].keys():
-                    return n, self.expected_values[0][n], stat, self.expected_values[1][stat]
-        raise NetworkMethodException('network registration params not found, AT+CREG? result  : {}'.format(result))
+
+    def from_record(self, record):
+        if record is not None:
+            n, stat = record.n, record.stat
+            if n in self.expected_values[0].keys() and stat in self.expected_values[1].keys():
+                return Registration(n, stat, record.lac, record.ci, record.act)
+        raise NetworkMethodException('network registration params not found, {}? record : {}'.format(
+            self.COMMAND, record))
 
     def set(self, level=2):
-        state = self.serial_target.run(command=self.COMMAND + '={}'.format(level),
-                                       timeout=self.timeout,
-                                       exception=NetworkMethodException,
-                                       message='Error occurred while getting network registration infos, ')
-        output = self.parse_output(state)
-        if output[0] == level:
+        self.serial_target.run(command=self.COMMAND + '={}'.format(level),
+                               timeout=self.timeout,
+                               exception=NetworkMethodException,
+                               message='Error occurred while getting network registration infos, ')
+        output = self.read()
+        if output.n == level:
             return output
 
 
+class CEREG(CREG):
+    """
+    EPS registration, <lac> holds the tracking area code
+    """
+    COMMAND = 'AT+CEREG'
+    __slots__ = ()
+    RESPONSE = ResponseSchema('CEREG', '+CEREG:', [
+        integer('n'), integer('stat'), hexadecimal('lac', optional=True), hexadecimal('ci', optional=True),
+        integer('act', optional=True), integer('cause_type', optional=True), integer('reject_cause', optional=True),
+        string('active_time', optional=True), string('periodic_tau', optional=True)])
+    REPORT = ResponseSchema('CEREGReport', '+CEREG:', RESPONSE.fields[1:])
+
+
+class C5GREG(CREG):
+    """
+    5GS registration, <lac> holds the tracking area code
+    """
+    COMMAND = 'AT+C5GREG'
+    __slots__ = ()
+    RESPONSE = ResponseSchema('C5GREG', '+C5GREG:', [
+        integer('n'), integer('stat'), hexadecimal('lac', optional=True), hexadecimal('ci', optional=True),
+        integer('act', optional=True), integer('nssai_length', optional=True), string('nssai', optional=True),
+        integer('cause_type', optional=True), integer('reject_cause', optional=True)])
+    REPORT = ResponseSchema('C5GREGReport', '+C5GREG:', RESPONSE.fields[1:])
+
+
 class COPS(AtCommand):
     COMMAND = 'AT+COPS'
+    __slots__ = ()
+    RESPONSE = ResponseSchema('COPS', '+COPS:', [
+        integer('mode'), integer('format', optional=True), string('oper', optional=True),
+        integer('act', optional=True)])
+    # an operator of the AT+COPS=? list, the list of the supported modes and formats that follows has no quotes
+    OPERATOR = re.compile(rb'\((\d+),"([^"]*)","([^"]*)","([^"]*)"(?:,(\d+))?\)')
     AUTO = 0
     LTE = 7
     NR_LTE = 13
     NR = 11
 
+    expected_values = (
+        MappingProxyType({
+            0: "automatic",
+            1: "manual",
+            2: "deregister from network",
+            3: "set only",
+            4: "manual/automatic",
+        }),
+        MappingProxyType({
+            0: "long format alphanumeric",
+            1: "short format alphanumeric",
+            2: "numeric",
+        }),
+        MappingProxyType({
+            0: "GSM",
+            2: "UTRAN",
+            3: "GSM w/EGPRS",
+            4: "UTRAN w/HSDPA",
+            5: "UTRAN w/HSUPA",
+            6: "UTRAN w/HSUPA and HSUPA",
+            7: "E-UTRAN",
+            8: "EC-GSM-IoT",
+            9: "E-UTRAN",
+            10: "E-UTRA connected to a 5GCN",
+            11: "NR connected to a 5GCN",
+            12: "NG-RAN",
+            13: "E-UTRA-NR dual connectivity",
+
+        })
+    )
+
+    operator_status = MappingProxyType({
+        0: "unknown",
+        1: "available",
+        2: "current",
+        3: "forbidden",
+    })
+
     def __init__(self, serial_target, timeout=180):
         super(COPS, self).__init__(serial_target, timeout)
-        self.expected_values = [
-            {
-                0: "automatic",
-                1: "manual",
-                2: "deregister from network",
-                3: "set only",
-                4: "manual/automatic",
-            },
-            {
-                0: "long format alphanumeric",
-                1: "short format alphanumeric",
-                2: "numeric",
-            },
-            {
-                0: "GSM",
-                2: "UTRAN",
-                3: "GSM w/EGPRS",
-                4: "UTRAN w/HSDPA",
-                5: "UTRAN w/HSUPA",
-                6: "UTRAN w/HSUPA and HSUPA",
-                7: "E-UTRAN",
-                8: "EC-GSM-IoT",
-                9: "E-UTRAN",
-                10: "E-UTRA connected to a 5GCN",
-                11: "NR connected to a 5GCN",
-                12: "NG-RAN",
-                13: "E-UTRA-NR dual connectivity",
-
-            }
-        ]
+
+    def scan(self):
+        """
+        AT+COPS=? network scan, yielding the operators as they are parsed from the response, see stream
+        """
+        return self.stream(self.COMMAND + '=?', exception=NetworkMethodException,
+                           message='Error occurred while scanning networks')
+
+    def stream_records(self, line):
+        if not line.startswith(b'+COPS:') or b'(' not in line:
+            yield from super(COPS, self).stream_records(line)
+            return
+        # the list is a single line, operators are parsed one at a time from it rather than split all at once
+        for matched in self.OPERATOR.finditer(line):
+            stat, long, short, numeric, act = matched.groups()
+            yield Operator(int(stat), long.decode('ascii', 'replace'), short.decode('ascii', 'replace'),
+                           numeric.decode('ascii', 'replace'), int(act) if act else None)
 
     def set(self, rat=0, mcc=0, mnc=0):
         if rat not in self.expected_values[2].keys():
@@ -121,23 +193,26 @@ class COPS(AtCommand):
                                ))
         return self.read()
 
-    def parse_output(self, result):
-        for value in result:
-            if '+COPS:' in value:
-                return value[-1], self.expected_values[2][value[-1]]
+    def from_record(self, record):
+        if record is None or record.act is None:
+            raise NetworkMethodException('no access technology in the operator selection : {}'.format(record))
+        return OperatorSelection(record.mode, record.format, record.oper, record.act)
 
 
 class CGATT(AtCommand):
     COMMAND = "AT+CGATT"
+    __slots__ = ()
+    RESPONSE = ResponseSchema('CGATT', '+CGATT:', [integer('state')])
     ATTACH = 1
     DETACH = 0
 
+    expected_values = MappingProxyType({
+        0: "Detached",
+        1: "Attached",
+    })
+
     def __init__(self, serial_target, timeout=180):
         super(CGATT, self).__init__(serial_target, timeout)
-        self.expected_values = {
-            0: "Detached",
-            1: "Attached",
-        }
 
     def set(self, value=1):
         if value not in self.expected_values.keys():
@@ -150,10 +225,183 @@ class CGATT(AtCommand):
                                message='Error occurred while setting attach status to {}, '.format(value))
         return self.read()
 
-    def parse_output(self, result):
-        for value in result:
-            if '+CGATT:' in value:
-                self.level = value[-1]
-        if self.level in self.expected_values.keys():
-            return self.level, self.expected_values[self.level]
-        raise NetworkMethodException('Value out of scope of CGATT : {}'.format(self.level))
\ No newline at end of file
+    def from_record(self, record):
+        if record is None:
+            raise NetworkMethodException('no +CGATT line in the response')
+        if record.state in self.expected_values.keys():
+            return AttachState(record.state)
+        raise NetworkMethodException('Value out of scope of CGATT : {}'.format(record.state))
+
+
+def address(name):
+    """
+    PDP address, quoted or not, empty when not allocated
+    """
+    return Field(name, r'[^",]*', None, optional=True, quotes='"?')
+
+
+class CGDCONT(AtCommand):
+    """
+    PDP context definitions, one +CGDCONT line per defined context
+    """
+    COMMAND = 'AT+CGDCONT'
+    __slots__ = ()
+    RESPONSE = ResponseSchema('CGDCONT', '+CGDCONT:', [
+        integer('cid'), string('pdp_type'), string('apn'), address('address'),
+        # compression, allocation and the other options, not used
+        Field('options', r'.*', None, optional=True)], many=True)
+
+    def __init__(self, serial_target, timeout=20):
+        super(CGDCONT, self).__init__(serial_target, timeout)
+
+    @staticmethod
+    def definition(cid, pdp_type='IP', apn=''):
+        """
+        :return: the set command part defining a context, e.g. '+CGDCONT=1,"IP","internet"'
+        """
+        return '+CGDCONT={},"{}","{}"'.format(int(cid), pdp_type, apn)
+
+
+class CGACT(AtCommand):
+    """
+    PDP context activation, one +CGACT line per defined context
+    """
+    COMMAND = 'AT+CGACT'
+    __slots__ = ()
+    RESPONSE = ResponseSchema('CGACT', '+CGACT:', [integer('cid'), integer('state')], many=True)
+    ACTIVATE = 1
+    DEACTIVATE = 0
+
+    expected_values = MappingProxyType({
+        0: "deactivated",
+        1: "activated",
+    })
+
+    def __init__(self, serial_target, timeout=150):
+        super(CGACT, self).__init__(serial_target, timeout)
+
+    @classmethod
+    def change(cls, state, cids):
+        """
+        :return: the set command part changing the state of several contexts at once, e.g. '+CGACT=1,1,2'
+        """
+        if state not in cls.expected_values.keys():
+            raise ValueError('Value out of scope of CGACT command : passed value : {}'.format(state))
+        return '+CGACT={}'.format(','.join(str(int(value)) for value in (state,) + tuple(cids)))
+
+
+class CGPADDR(AtCommand):
+    """
+    addresses of the PDP contexts, one +CGPADDR line per defined context
+    """
+    COMMAND = 'AT+CGPADDR'
+    __slots__ = ()
+    READ_CHAR = ''
+    RESPONSE = ResponseSchema('CGPADDR', '+CGPADDR:', [
+        integer('cid'), address('address'), address('ipv6_address')], many=True)
+
+    def __init__(self, serial_target, timeout=20):
+        super(CGPADDR, self).__init__(serial_target, timeout)
+
+
+def pdp_contexts(definitions, states, addresses):
+    """
+    :param definitions: CGDCONT records
+    :param states: CGACT records
+    :param addresses: CGPADDR records
+    :return: PdpContext of every defined context, by cid
+    """
+    state = dict((record.cid, record.state) for record in states)
+    allocated = dict((record.cid, record) for record in addresses)
+    contexts = []
+    for record in sorted(definitions, key=lambda definition: definition.cid):
+        found = allocated.get(record.cid)
+        ipv4 = found.address if found is not None else record.address
+        contexts.append(PdpContext(record.cid, record.pdp_type, record.apn, state.get(record.cid, 0),
+                                   ipv4 if ipv4 not in (None, '0.0.0.0') else None,
+                                   found.ipv6_address if found is not None else None))
+    return contexts
+
+
+class RegistrationWaiter(object):
+    """
+    wait for the modem to reach a registration state, following the transitions reported by +CREG, +CEREG and
+    +C5GREG (n=2, with location and access technology) as they arrive instead of polling the state; the state
+    is still read when no report came for poll_interval seconds, for connectors without a background reader.
+    reporting stays enabled after the wait
+    :param commands: CREG, CEREG and/or C5GREG instances, the registrations followed
+    :param run: callable running a callable that uses the port, e.g. on the modem worker; called directly when None
+    """
+
+    def __init__(self, serial_target, commands, run=None, poll_interval=5.0):
+        self.serial_target = serial_target
+        self.commands = dict((command.response_prefix(), command) for command in commands)
+        self.run = run or (lambda func: func())
+        self.poll_interval = poll_interval
+
+    def wait(self, states=REGISTERED, deadline=180):
+        """
+        :param states: <stat> values waited for, on any of the registrations followed
+        :param deadline: seconds
+        :return: dict registered (bool), command and registration (Registration) that reached one of states,
+                 elapsed_ms the time it took, transitions: list of (elapsed_ms, command, Registration)
+        """
+        subscription = self.serial_target.urc.subscribe(list(self.commands))
+        started = timestamp()
+        waiter = _Wait(states, started)
+        try:
+            self.run(lambda: self._enable(waiter))
+            while not waiter.reached:
+                remaining = started + deadline - timestamp()
+                if remaining <= 0:
+                    break
+                events = subscription.get(timeout=min(remaining, self.poll_interval))
+                for at, line in events:
+                    command = self.commands[urc_prefix(line)]
+                    record = command.REPORT.match(line)
+                    if record is not None:
+                        waiter.observe(at, command.COMMAND,
+                                       Registration(2, record.stat, record.lac, record.ci, record.act))
+                if not events and timestamp() < started + deadline:
+                    self.run(lambda: self._read(waiter))
+        finally:
+            self.serial_target.urc.unsubscribe(subscription.id)
+        return waiter.result()
+
+    def _enable(self, waiter):
+        for command in self.commands.values():
+            registration = command.set(2)
+            if registration is None:
+                raise NetworkMethodException('{} did not enable registration reports'.format(command.COMMAND))
+            waiter.observe(timestamp(), command.COMMAND, registration)
+
+    def _read(self, waiter):
+        for command in self.commands.values():
+            waiter.observe(timestamp(), command.COMMAND, command.read())
+
+
+class _Wait(object):
+    """
+    registrations observed during a RegistrationWaiter.wait
+    """
+
+    def __init__(self, states, started):
+        self.states = frozenset(states)
+        self.started = started
+        self.current = {}
+        self.transitions = []
+        self.reached = None
+
+    def observe(self, at, command, registration):
+        if registration == self.current.get(command):
+            return
+        self.current[command] = registration
+        elapsed_ms = round((at - self.started) * 1000, 3)
+        self.transitions.append((elapsed_ms, command, registration))
+        if self.reached is None and registration.stat in self.states:
+            self.reached = (elapsed_ms, command, registration)
+
+    def result(self):
+        elapsed_ms, command, registration = self.reached or (None, None, None)
+        return {'registered': self.reached is not None, 'elapsed_ms': elapsed_ms, 'command': command,
+                'registration': registration, 'transitions': self.transitions}
@@ -23,4 +23,8 @@ class AtCommandNotSupported(Exception):
 
 
 class ATCommandException(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+class CommandQueueFull(Exception):
+    pass
@@ -0,0 +1,198 @@
+"""
+declarative grammar of AT command responses: a command declares the prefix and typed fields of its information
+lines, compiled once into regular expressions (str and bytes), and one generic parser turns the lines into records;
+a Response is parsed from its raw lines, without decoding them
+
+    CSQ.RESPONSE = ResponseSchema('CSQ', '+CSQ:', [integer('rssi'), integer('ber')])
+    CSQ.RESPONSE.parse(['AT+CSQ', '+CSQ: 20,99', 'OK'])  ->  CSQ(rssi=20, ber=99)
+"""
+import collections
+import functools
+import re
+
+from ..response import final_result
+
+_new = tuple.__new__
+
+
+def _decode(value):
+    return value.decode('ascii', 'replace')
+
+
+class Field(object):
+    """
+    a comma separated value of an information line
+    :param pattern: regular expression of the value, without groups
+    :param convert: callable turning the matched text (str or bytes) into the typed value, str when None
+    :param optional: the value may be empty or, with the following ones, missing
+    :param quotes: regular expression around the value, left out of it, e.g. '"' for a quoted string
+    """
+    __slots__ = ('name', 'pattern', 'convert', 'optional', 'quotes')
+
+    def __init__(self, name, pattern, convert=None, optional=False, quotes=''):
+        self.name = name
+        self.pattern = pattern
+        self.convert = convert
+        self.optional = optional
+        self.quotes = quotes
+
+
+def integer(name, optional=False):
+    return Field(name, r'\d+', int, optional)
+
+
+def string(name, optional=False):
+    """
+    double quoted value, given without its quotes
+    """
+    return Field(name, r'[^"]*', None, optional, quotes='"')
+
+
+def hexadecimal(name, optional=False):
+    """
+    hexadecimal value, quoted or not, e.g. <lac> and <ci>
+    """
+    return Field(name, r'[0-9A-Fa-f]+', functools.partial(int, base=16), optional, quotes='"?')
+
+
+def token(name, optional=False):
+    """
+    unquoted text up to the next comma, e.g. '+CPIN: SIM PIN'
+    """
+    return Field(name, r'[^,]*?', None, optional)
+
+
+def text(name):
+    """
+    rest of the line
+    """
+    return Field(name, r'.*?', None)
+
+
+class ResponseSchema(object):
+    """
+    information lines of a response: prefix followed by fields, or bare lines (prefix None) such as the AT+GSN
+    answer, which never match the command echo nor a final result code
+    :param name: name of the records produced
+    :param many: the response has one line per record, parse returns a list
+    """
+
+    def __init__(self, name, prefix, fields, many=False):
+        self.name = name
+        self.prefix = prefix
+        self.fields = tuple(fields)
+        self.many = many
+        self.record = collections.namedtuple(name, [field.name for field in self.fields])
+        # text fields stay as matched in str lines and are decoded from raw lines
+        self._build = self.builder([field.convert or str for field in self.fields])
+        self._build_raw = self.builder([field.convert or _decode for field in self.fields])
+        pattern = self.pattern()
+        self._match = re.compile(pattern).match
+        self._match_raw = re.compile(pattern.encode()).match
+        self._raw_prefix = prefix.encode() if prefix is not None else b''
+
+    def pattern(self):
+        parts = [r'(?!AT)' if self.prefix is None else re.escape(self.prefix) + r'\s*']
+        for index, field in enumerate(self.fields):
+            group = '{1}({0}){1}'.format(field.pattern, field.quotes)
+            # V.250 information text has no space around the commas
+            separator = ',' if index else ''
+            if field.optional:
+                parts.append('(?:{}(?:{})?)?'.format(separator, group))
+            else:
+                parts.append(separator + group)
+        parts.append(r'\s*$')
+        return ''.join(parts)
+
+    def builder(self, converters):
+        """
+        compile the function making a record out of the groups matched, as namedtuple compiles its __new__:
+        an empty or missing value gives None, the others their converter result
+        """
+        namespace = {'_new': _new, '_record': self.record}
+        values = []
+        for index, (field, convert) in enumerate(zip(self.fields, converters)):
+            namespace['_convert{}'.format(index)] = convert
+            value = '_convert{0}(groups[{0}])'.format(index)
+            if field.optional or re.fullmatch(field.pattern, ''):
+                value = '({} if groups[{}] else None)'.format(value, index)
+            values.append(value)
+        source = 'def build(groups):\n    return _new(_record, ({}))\n'.format(
+            ''.join(value + ', ' for value in values))
+        exec(source, namespace)
+        return namespace['build']
+
+    def match(self, line):
+        """
+        :param line: str or raw bytes line
+        :return: the record of line, None when line is not one of these information lines
+        """
+        if isinstance(line, bytes):
+            matched, build = self._match_raw(line), self._build_raw
+        else:
+            matched, build = self._match(line), self._build
+        if matched is None or (self.prefix is None and final_result(line) is not None):
+            return None
+        return build(matched.groups())
+
+    def parse(self, lines):
+        """
+        :param lines: Response or list of lines, echo and final result code included or not
+        :return: the first record found (None when there is none), or the list of records when many is set
+        """
+        lines, prefix = raw_lines(lines), self._raw_prefix
+        if lines and not isinstance(lines[0], bytes):
+            prefix = self.prefix or ''
+        if self.many:
+            return [record for record in map(self.match, lines) if record is not None]
+        for line in lines:
+            if line.startswith(prefix):
+                record = self.match(line)
+                if record is not None:
+                    return record
+        return None
+
+
+def raw_lines(lines):
+    """
+    :return: the raw lines of a Response, lines themselves otherwise
+    """
+    raw = getattr(lines, 'raw_lines', None)
+    return raw() if raw is not None else lines
+
+
+@functools.lru_cache(maxsize=64)
+def _prefix_indexes(schemas):
+    """
+    :return: dict prefix (str and bytes) -> indexes of the schemas with that prefix
+    """
+    by_prefix = {}
+    for index, schema in enumerate(schemas):
+        if schema.prefix is None:
+            raise ValueError('{} lines have no prefix to be told apart in a compound response'.format(schema.name))
+        by_prefix.setdefault(schema.prefix, []).append(index)
+        by_prefix.setdefault(schema.prefix.encode(), []).append(index)
+    return by_prefix
+
+
+def parse_batch(schemas, lines):
+    """
+    parse the response of a compound command line in one pass, dispatching every line on its prefix
+    :param schemas: ResponseSchema of every command of the line, all with a prefix
+    :return: list of parse results, in the order of schemas
+    """
+    by_prefix = _prefix_indexes(tuple(schemas))
+    results = [[] if schema.many else None for schema in schemas]
+    for line in raw_lines(lines):
+        indexes = by_prefix.get(line[:line.find(b':' if isinstance(line, bytes) else ':') + 1])
+        if indexes is None:
+            continue
+        for index in indexes:
+            schema = schemas[index]
+            if schema.many:
+                record = schema.match(line)
+                if record is not None:
+                    results[index].append(record)
+            elif results[index] is None:
+                results[index] = schema.match(line)
+    return results
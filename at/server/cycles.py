@@ -0,0 +1,165 @@
+"""
+attach/detach (AT+CGATT) and radio off/on (AT+CFUN) cycles run back to back on the server, each phase timed from
+the command sent to its OK and to the new state confirmed, by an unsolicited +CGEV report or by reading the
+state back, so hundreds of cycles are characterized without a Pyro round trip per cycle in the numbers
+"""
+import collections
+import logging
+import time
+
+from .commands.common.exceptions import ATCommandException
+from .transcript import timestamp
+from .worker import percentile
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# upper bounds in ms of the histogram buckets, the last one takes the rest
+BUCKETS = (10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+
+class Phase(collections.namedtuple('Phase', 'name command value urcs')):
+    """
+    a step of a cycle: command set to value, the new state confirmed by one of the urcs (line prefixes) when
+    the modem reports it, by reading command back otherwise
+    """
+    __slots__ = ()
+
+
+ATTACH = (Phase('attach', 'AT+CGATT', 1, ('+CGEV: ME PDN ACT', '+CGEV: NW PDN ACT')),
+          Phase('detach', 'AT+CGATT', 0, ('+CGEV: ME DETACH', '+CGEV: NW DETACH')))
+RADIO = (Phase('radio_off', 'AT+CFUN', 0, ()),
+         Phase('radio_on', 'AT+CFUN', 1, ()))
+KINDS = {'attach': ATTACH, 'cfun': RADIO, 'both': ATTACH + RADIO}
+
+
+def distribution(values):
+    """
+    :param values: latencies in ms
+    :return: dict count, min/mean/p50/p90/p99/max and histogram: list of (bucket upper bound in ms, count),
+             None as the bound of the values above the last bucket
+    """
+    result = {'count': len(values)}
+    if not values:
+        return result
+    result.update(min=round(min(values), 3), mean=round(sum(values) / len(values), 3), max=round(max(values), 3))
+    for q in (50, 90, 99):
+        result['p{}'.format(q)] = round(percentile(values, q), 3)
+    counts = [0] * (len(BUCKETS) + 1)
+    for value in values:
+        index = 0
+        while index < len(BUCKETS) and value > BUCKETS[index]:
+            index += 1
+        counts[index] += 1
+    result['histogram'] = [(bound, count) for bound, count in zip(BUCKETS + (None,), counts) if count]
+    return result
+
+
+class CycleBenchmark(object):
+    """
+    :param commands: dict command ('AT+CGATT', 'AT+CFUN') -> its AtCommand, read back to confirm a state
+    :param confirm_timeout: seconds a new state may take to be confirmed once the OK is received
+    :param poll_interval: seconds between read backs, a +CGEV report is waited for in between when a
+                          background reader dispatches the reports
+    """
+
+    def __init__(self, serial_target, commands, timeout=180, confirm_timeout=30, poll_interval=0.1):
+        self.serial_target = serial_target
+        self.commands = commands
+        self.timeout = timeout
+        self.confirm_timeout = confirm_timeout
+        self.poll_interval = poll_interval
+
+    def run(self, cycles, kind='attach'):
+        """
+        :param kind: 'attach' for attach/detach cycles, 'cfun' for radio off/on, 'both' for the four phases
+        :return: dict cycles, elapsed_s and phases: phase name -> ok_ms and confirmed_ms distributions (from
+                 the command sent), failures by reason and confirmed_by counts ('urc', 'read')
+        """
+        if kind not in KINDS:
+            raise ValueError('cycle kind should be one of {}, passed value is {}'.format(sorted(KINDS), kind))
+        phases = KINDS[kind]
+        results = dict((phase.name, {'ok': [], 'confirmed': [], 'failures': collections.Counter(),
+                                     'confirmed_by': collections.Counter()}) for phase in phases)
+        prefixes = set(urc.split(':')[0] + ':' for phase in phases for urc in phase.urcs)
+        subscription = self.serial_target.urc.subscribe(prefixes) if prefixes else None
+        if subscription is not None:
+            self._enable_reporting()
+        started = time.monotonic()
+        try:
+            for _ in range(cycles):
+                for phase in phases:
+                    self.run_phase(phase, subscription, results[phase.name])
+        finally:
+            if subscription is not None:
+                self.serial_target.urc.unsubscribe(subscription.id)
+        return {
+            'cycles': cycles,
+            'elapsed_s': round(time.monotonic() - started, 3),
+            'phases': dict((name, {
+                'ok_ms': distribution(result['ok']),
+                'confirmed_ms': distribution(result['confirmed']),
+                'failures': dict(result['failures']),
+                'confirmed_by': dict(result['confirmed_by']),
+            }) for name, result in results.items()),
+        }
+
+    def run_phase(self, phase, subscription, result):
+        if subscription is not None:
+            # reports of the previous phases
+            subscription.get(max_items=subscription.queue.maxsize)
+        sent = timestamp()
+        try:
+            self.serial_target.run(command='{}={}'.format(phase.command, phase.value), timeout=self.timeout,
+                                   exception=ATCommandException, message='cycle {} failed:'.format(phase.name))
+        except Exception as e:
+            logger.debug('{}'.format(e))
+            result['failures']['error'] += 1
+            return
+        result['ok'].append((timestamp() - sent) * 1000)
+        confirmed, by = self.confirm(phase, subscription)
+        if confirmed is None:
+            result['failures'][by] += 1
+            return
+        result['confirmed'].append((confirmed - sent) * 1000)
+        result['confirmed_by'][by] += 1
+
+    def _enable_reporting(self):
+        """
+        ask for +CGEV reports (AT+CGEREP=2,1), the states are read back when the modem refuses
+        """
+        try:
+            self.serial_target.run(command='AT+CGEREP=2,1', timeout=20, exception=ATCommandException,
+                                   message='Error occurred while enabling +CGEV reports')
+        except Exception as e:
+            logger.info('{}, states confirmed by reading them back'.format(e))
+
+    def confirm(self, phase, subscription):
+        """
+        wait for a report of the new state up to poll_interval, read the state back, and again until
+        confirm_timeout, whichever confirms it first
+        :return: (time the new state was confirmed, 'urc' or 'read'), (None, reason) when it was not
+        """
+        deadline = timestamp() + self.confirm_timeout
+        reports = phase.urcs and subscription is not None and getattr(self.serial_target, 'reading', False)
+        command = self.commands[phase.command]
+        while True:
+            if reports:
+                waited_until = min(timestamp() + self.poll_interval, deadline)
+                while True:
+                    for at, line in subscription.get(timeout=max(0, waited_until - timestamp())):
+                        if line.startswith(phase.urcs):
+                            return at, 'urc'
+                    if timestamp() >= waited_until:
+                        break
+            try:
+                state = command.read()
+            except Exception as e:
+                logger.debug('{} read back failed: {}'.format(phase.name, e))
+                return None, 'read_error'
+            if state[0] == phase.value:
+                return timestamp(), 'read'
+            if timestamp() >= deadline:
+                return None, 'confirm_timeout'
+            if not reports:
+                time.sleep(self.poll_interval)
@@ -0,0 +1,281 @@
+"""
+modem emulator answering AT commands on a Linux pseudo-terminal, for benchmarks and tests without hardware
+
+    python -m at.server.emulator [--profile profile.json]
+
+prints the pty path to give a Connector as com_id, e.g. Connector(com_id='/dev/pts/5').
+
+a profile is a dict (or JSON file) :
+    {
+        "echo": false,
+        "chaining": true,                         # false: compound lines (AT+CSQ;+CPAS) answered with an error
+        "latency": 0.01, "jitter": 0.002,         # default answer delay in seconds, and its uniform spread
+        "error_rate": 0.0, "error": "+CME ERROR: 100",
+        "commands": {                             # keyed by the command without its 'AT'
+            "+CSQ": ["+CSQ: 20,99"],              # short form: the information lines
+            "+CREG?": {"response": ["+CREG: {state},1"], "latency": 0.05, "error_rate": 0.1},
+            "+CESQ": {"sequence": [["+CESQ: 99,99,255,255,20,45"], ["+CESQ: 99,99,255,255,18,40"]]}
+        },                                        # sequence: answers given in turn, e.g. a varying signal
+        "state": {"+CREG": "0"},                  # values stored by set commands, '{state}' in answers
+        "urcs": [{"line": "+CREG: 1", "every": 5.0}, {"line": "RING", "at": 1.0}],
+        "on_set": {"+CGATT": [{"line": "+CGEV: ME PDN ACT 1", "delay": 0.1}]}
+    }
+"""
+import argparse
+import copy
+import heapq
+import json
+import logging
+import os
+import random
+import select
+import threading
+import time
+import tty
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+SUPPORTED_COMMANDS = [
+    'AT+CPAS', 'AT+CLAC', 'AT+CFUN', 'AT+CPIN', 'AT+CSQ', 'AT+GSN', 'AT+CIMI', 'AT+CGMM', 'AT+WS46', 'ATI',
+    'AT+CREG', 'AT+COPS', 'AT+CGATT', 'AT+CESQ', 'AT+CEREG', 'AT+C5GREG', 'AT+CGDCONT', 'AT+CGACT', 'AT+CGPADDR',
+    'AT+CGEREP',
+]
+
+DEFAULT_PROFILE = {
+    'echo': False,
+    'chaining': True,
+    'latency': 0.01,
+    'jitter': 0.0,
+    'error_rate': 0.0,
+    'error': '+CME ERROR: 100',
+    'commands': {
+        '+CLAC': SUPPORTED_COMMANDS,
+        '+CPIN?': ['+CPIN: READY'],
+        '+CPAS': ['+CPAS: 0'],
+        '+CSQ': ['+CSQ: 20,0'],
+        '+CESQ': ['+CESQ: 99,99,255,255,20,45'],
+        '+CFUN?': ['+CFUN: {state}'],
+        '+CGATT?': ['+CGATT: {state}'],
+        '+CREG?': ['+CREG: {state},1'],
+        '+CEREG?': ['+CEREG: {state},0'],
+        '+C5GREG?': ['+C5GREG: {state},0'],
+        '+COPS?': ['+COPS: 0,2,"00101",7'],
+        '+COPS=?': {'response': ['+COPS: (2,"Emulated Operator","EMU","00101",7),'
+                                 '(1,"Other Operator","OTHER","00102",7),'
+                                 '(3,"Forbidden Operator","FORBID","00103",2),,(0,1,2,3,4),(0,1,2)'],
+                    'latency': 0.05},
+        '+WS46?': ['+WS46: 28'],
+        '+CGDCONT?': ['+CGDCONT: 1,"IP","internet","0.0.0.0",0,0,0,0', '+CGDCONT: 2,"IPV4V6","ims","",0,0'],
+        '+CGACT?': ['+CGACT: 1,1', '+CGACT: 2,0'],
+        '+CGPADDR': ['+CGPADDR: 1,"10.0.0.2"', '+CGPADDR: 2'],
+        '+GSN': ['490154203237518'],
+        '+CIMI': ['001010123456789'],
+        '+CGMM': ['EMULATED-MODEM'],
+        '+IPR=?': ['+IPR: (0,9600,19200,38400,57600,115200),(230400,460800,921600)'],
+        'I': ['Manufacturer: at_commands', 'Model: EMULATED-MODEM', 'Revision: EMU.1.0', 'IMEI: 490154203237518'],
+    },
+    'state': {
+        '+CFUN': '1',
+        '+CGATT': '0',
+        '+CREG': '0',
+        '+CEREG': '0',
+        '+C5GREG': '0',
+        '+IPR': '115200',
+    },
+    'urcs': [],
+    'on_set': {},
+}
+
+
+def load_profile(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+class ModemEmulator(object):
+
+    def __init__(self, profile=None, seed=None):
+        self.profile = copy.deepcopy(DEFAULT_PROFILE)
+        for key, value in (profile or {}).items():
+            if key in ('commands', 'state', 'on_set'):
+                self.profile[key].update(value)
+            else:
+                self.profile[key] = value
+        self.state = dict(self.profile['state'])
+        self.echo = self.profile['echo']
+        self.received = []
+        self._random = random.Random(seed)
+        self._master = self._slave = None
+        self._thread = None
+        self._running = threading.Event()
+        self._timers = []
+        self._write_lock = threading.Lock()
+        self._turns = {}
+
+    @property
+    def port(self):
+        """
+        path of the pty to open as a serial port
+        """
+        return os.ttyname(self._slave)
+
+    def start(self):
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        now = time.monotonic()
+        for urc in self.profile['urcs']:
+            first = urc['at'] if 'at' in urc else urc['every']
+            heapq.heappush(self._timers, (now + first, urc['line'], urc.get('every')))
+        self._running.set()
+        self._thread = threading.Thread(target=self._serve, name='modem-emulator')
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info('modem emulator listening on {}'.format(self.port))
+        return self
+
+    def stop(self):
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def emit(self, line):
+        """
+        send an unsolicited line right away
+        """
+        self._write(['\r\n{}\r\n'.format(line)])
+
+    def _write(self, chunks):
+        with self._write_lock:
+            os.write(self._master, ''.join(chunks).encode())
+
+    def _serve(self):
+        pending = b''
+        while self._running.is_set():
+            timeout = 0.05
+            if self._timers:
+                timeout = max(0, min(timeout, self._timers[0][0] - time.monotonic()))
+            readable, _, _ = select.select([self._master], [], [], timeout)
+            self._fire_timers()
+            if not readable:
+                continue
+            try:
+                pending += os.read(self._master, 4096)
+            except OSError:
+                continue
+            while b'\r' in pending:
+                line, pending = pending.split(b'\r', 1)
+                pending = pending.lstrip(b'\n')
+                line = line.decode(errors='replace').strip()
+                if line:
+                    self._answer(line)
+
+    def _fire_timers(self):
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            _, line, every = heapq.heappop(self._timers)
+            self.emit(line)
+            if every:
+                heapq.heappush(self._timers, (now + every, line, every))
+
+    def _answer(self, line):
+        self.received.append(line)
+        chunks = ['{}\r\n'.format(line)] if self.echo else []
+        if line[:2].upper() != 'AT':
+            return
+        delay, lines, failed = 0, [], False
+        if ';' in line and not self.profile['chaining']:
+            self._write(chunks + ['\r\n{}\r\n'.format(self.profile['error'])])
+            return
+        for command in line[2:].split(';') if line[2:] else ['']:
+            latency, response = self._respond(command.strip())
+            delay += latency
+            if response is None:
+                failed = True
+                break
+            lines += response
+        time.sleep(delay)
+        if failed:
+            lines = [self.profile['error']]
+        else:
+            lines.append('OK')
+        chunks += ['\r\n{}\r\n'.format(value) for value in lines]
+        self._write(chunks)
+        if not failed:
+            self._after(line)
+
+    def _settings(self, command):
+        entry = self.profile['commands'].get(command)
+        if isinstance(entry, dict):
+            return entry
+        return {'response': entry} if entry is not None else None
+
+    def _respond(self, command):
+        """
+        :return: (latency, information lines) ; lines is None for an error
+        """
+        name, separator, value = command.partition('=')
+        settings = self._settings(command) or {}
+        latency = settings.get('latency', self.profile['latency'])
+        jitter = settings.get('jitter', self.profile['jitter'])
+        latency += self._random.uniform(0, jitter) if jitter else 0
+        if self._random.random() < settings.get('error_rate', self.profile['error_rate']):
+            return latency, None
+        if command.upper() == 'E0' or command.upper() == 'E1':
+            self.echo = command.upper() == 'E1'
+            return latency, []
+        if 'sequence' in settings:
+            turn = self._turns.get(command, 0)
+            self._turns[command] = turn + 1
+            settings = dict(settings, response=settings['sequence'][turn % len(settings['sequence'])])
+        if 'response' in settings:
+            state = self.state.get(name.rstrip('?'), '')
+            return latency, [response.format(state=state) for response in settings['response']]
+        if command == '':
+            return latency, []
+        if separator and value != '?':
+            self.state[name] = value
+            return latency, []
+        return latency, None
+
+    def _after(self, line):
+        for command in line[2:].split(';'):
+            name, separator, value = command.strip().partition('=')
+            if not separator or value == '?':
+                continue
+            for urc in self.profile['on_set'].get(name, []):
+                if 'when' in urc and urc['when'] != value:
+                    continue
+                heapq.heappush(self._timers, (time.monotonic() + urc.get('delay', 0),
+                                              urc['line'].format(value=value), None))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='answer AT commands on a pseudo-terminal')
+    parser.add_argument('--profile', help='JSON profile, see the module documentation')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    profile = load_profile(args.profile) if args.profile else None
+    with ModemEmulator(profile, seed=args.seed) as emulator:
+        print(emulator.port, flush=True)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
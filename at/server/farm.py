@@ -0,0 +1,88 @@
+"""
+one server process managing a farm of modems behind a single Pyro daemon and port
+"""
+import logging
+
+import Pyro4
+
+from .at_server import ATServer
+from .telemetry import TelemetryStore
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class ModemFarm(object):
+    """
+    every modem gets its own ATServer (connector + worker thread), registered as 'ATServer.<com_id>';
+    the farm object itself, registered as 'ATFarm', forwards calls through a modem id argument
+    """
+    PYRO_SERVER_NAME = 'ATFarm'
+
+    def __init__(self, hostname, com_ids, port=9093, persistent=True, telemetry_path=None):
+        """
+        :param telemetry_path: directory of the telemetry store shared by the modems, no telemetry when None
+        """
+        self._hostname = hostname
+        self._port = port
+        self.telemetry = TelemetryStore(telemetry_path) if telemetry_path else None
+        self.servers = {}
+        for com_id in com_ids:
+            self.servers[str(com_id)] = ATServer(hostname, com_id, persistent=persistent, port=port,
+                                                 telemetry=self.telemetry)
+        self.running = False
+
+    @staticmethod
+    def object_id(com_id):
+        return '{}.{}'.format(ATServer.PYRO_SEREVR_NAME, com_id)
+
+    @Pyro4.expose
+    def modems(self):
+        return sorted(self.servers)
+
+    @Pyro4.expose
+    def call(self, modem_id, method, *args, **kwargs):
+        """
+        run an exposed ATServer method on one modem
+        :param modem_id: com id of the modem
+        :param method: name of the ATServer method, e.g. 'get_signal_quality'
+        """
+        server = self.servers.get(str(modem_id))
+        if server is None:
+            raise KeyError('unknown modem {}'.format(modem_id))
+        func = getattr(server, method, None)
+        if func is None or not getattr(func, '_pyroExposed', False) or method == 'shutdown':
+            raise AttributeError('{} is not an exposed ATServer method'.format(method))
+        return func(*args, **kwargs)
+
+    def _isrunning(self):
+        return self.running and all(server.running for server in self.servers.values())
+
+    @Pyro4.expose
+    def shutdown(self):
+        self.running = False
+        self.daemon.shutdown()
+        logger.info("farm shutdown complete")
+
+    def start(self):
+        Pyro4.config.SOCK_REUSE = True
+        Pyro4.config.REQUIRE_EXPOSE = True
+        # every modem may hold a thread waiting on its worker, plus quick calls on the others
+        Pyro4.config.THREADPOOL_SIZE = max(Pyro4.config.THREADPOOL_SIZE, 4 * len(self.servers))
+        for server in self.servers.values():
+            server.open()
+        try:
+            with Pyro4.Daemon(host=self._hostname, port=self._port) as self.daemon:
+                self.daemon.register(self, objectId=self.PYRO_SERVER_NAME)
+                for com_id, server in self.servers.items():
+                    server.daemon = self.daemon
+                    server.running = True
+                    self.daemon.register(server, objectId=self.object_id(com_id))
+                self.running = True
+                logger.info('farm up and running with modems {}'.format(self.modems()))
+                self.daemon.requestLoop(loopCondition=self._isrunning)
+        finally:
+            for server in self.servers.values():
+                server.close()
+            if self.telemetry is not None:
+                self.telemetry.close()
@@ -0,0 +1,137 @@
+"""
+PDP contexts of a modem: definitions, activation states and addresses read in a single serial transaction
+(AT+CGDCONT?;+CGACT?;+CGPADDR) and kept in the connector cache until a +CGEV event or a command changing them
+drops them; several contexts defined, activated or deactivated with one command line
+"""
+import logging
+
+from .cache import PDP_QUERY
+from .commands.common.at_network_handler import CGACT, CGDCONT, CGPADDR, pdp_contexts
+from .commands.common.exceptions import NetworkMethodException
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# bound on the time contexts stay cached, for changes the modem does not report
+PDP_TTL = 300
+
+
+class PdpContexts(object):
+    """
+    :param batch: BatchExecutor of the modem
+    :param catalog: CommandCatalog of the modem
+    """
+
+    def __init__(self, batch, catalog, ttl=PDP_TTL):
+        self.batch = batch
+        self.catalog = catalog
+        self.ttl = ttl
+        self._reporting = False
+
+    @property
+    def connector(self):
+        return self.batch.connector
+
+    def read(self):
+        """
+        :return: PdpContext of every defined context, by cid; from the cache only when a background reader
+                 dispatches the +CGEV events invalidating it
+        """
+        cache = getattr(self.connector, 'cache', None)
+        if cache is None or not getattr(self.connector, 'reading', False):
+            return self._read()
+        self._enable_reporting()
+        contexts = cache.get(PDP_QUERY)
+        if contexts is None:
+            contexts = self._read()
+            cache.put(PDP_QUERY, contexts, self.ttl)
+        return list(contexts)
+
+    def _read(self):
+        commands = [self.catalog.get(CGDCONT), self.catalog.get(CGACT), self.catalog.get(CGPADDR)]
+        return pdp_contexts(*self.batch.run(commands, exception=NetworkMethodException,
+                                            message='Error occurred while reading PDP contexts'))
+
+    def _enable_reporting(self):
+        """
+        ask for +CGEV reports (AT+CGEREP=2,1), once
+        """
+        if self._reporting:
+            return
+        self._reporting = True
+        try:
+            self.connector.run(command='AT+CGEREP=2,1', timeout=20, exception=NetworkMethodException,
+                               message='Error occurred while enabling +CGEV reports')
+        except NetworkMethodException as e:
+            logger.info('{}, PDP contexts cached for {} sec at most'.format(e, self.ttl))
+
+    def address(self, cid=None):
+        """
+        :param cid: context, the first active one when None
+        :return: IPv4 address of the context (its IPv6 address when it has none), None when not allocated
+        """
+        for context in self.read():
+            if context.cid == cid or (cid is None and context.active):
+                return context.address or context.ipv6_address
+        return None
+
+    def define(self, contexts):
+        """
+        :param contexts: (cid, pdp_type, apn) of each context
+        :return: PdpContext of every defined context
+        """
+        self.run([CGDCONT.definition(*context) for context in contexts], self.catalog.get(CGDCONT).timeout,
+                 'Error occurred while defining PDP contexts')
+        return self.read()
+
+    def change(self, activate=(), deactivate=()):
+        """
+        activate and deactivate contexts in one command line, the deactivations first
+        :return: PdpContext of every defined context
+        """
+        parts = []
+        if deactivate:
+            parts.append(CGACT.change(CGACT.DEACTIVATE, deactivate))
+        if activate:
+            parts.append(CGACT.change(CGACT.ACTIVATE, activate))
+        self.run(parts, self.catalog.get(CGACT).timeout, 'Error occurred while changing PDP context states')
+        return self.read()
+
+    def run(self, parts, timeout, message):
+        """
+        run set command parts (e.g. '+CGACT=1,1,2') on as few command lines as the batch executor allows,
+        one part per line from the first compound line the modem rejects
+        """
+        lines, line = [], []
+        for part in parts:
+            length = 2 + sum(len(previous) + 1 for previous in line) + len(part)
+            if line and (self.batch.chaining is False or length > self.batch.max_line_length):
+                lines.append(line)
+                line = []
+            line.append(part)
+        if line:
+            lines.append(line)
+        for line in lines:
+            self._run_line(line, timeout, message)
+
+    def _run_line(self, parts, timeout, message):
+        command = 'AT' + ';'.join(parts)
+        try:
+            self.connector.run(command=command, timeout=timeout, exception=NetworkMethodException, message=message)
+        except NetworkMethodException as e:
+            if len(parts) == 1:
+                raise
+            logger.debug('compound line {} failed ({}), running its parts one by one'.format(command, e))
+            # the parts before the rejected one may have been applied, the contexts are read again
+            cache = getattr(self.connector, 'cache', None)
+            if cache is not None:
+                cache.invalidate([PDP_QUERY])
+            logger.debug('PDP contexts before the retry : {}'.format(self.read()))
+            for part in parts:
+                self.connector.run(command='AT' + part, timeout=timeout, exception=NetworkMethodException,
+                                   message=message)
+            # every part succeeded alone: the modem does not accept compound lines
+            self.batch.chaining = False
+            return
+        if len(parts) > 1:
+            self.batch.chaining = True
@@ -0,0 +1,143 @@
+"""
+typed results of the commands: slotted named tuples holding the codes answered by the modem, the descriptions
+of the codes are looked up where the results are displayed (at.client.descriptions), so they never cross the wire
+
+records are registered with serpent, the Pyro serializer: a record travels as the bare tuple of its values
+(no class name, no field names), typed back on the client from the method it answers:
+    SignalQuality(rssi=20, ber=0)  ->  (20, 0)  ->  typed('get_signal_quality', (20, 0))
+"""
+import collections
+
+import serpent
+
+
+class SimStatus(collections.namedtuple('SimStatus', 'code')):
+    """
+    +CPIN: <code>, 'READY' or the password the ME is waiting for
+    """
+    __slots__ = ()
+
+
+class ActivityStatus(collections.namedtuple('ActivityStatus', 'pas')):
+    __slots__ = ()
+
+
+class Functionality(collections.namedtuple('Functionality', 'fun')):
+    __slots__ = ()
+
+    @property
+    def full(self):
+        return self.fun == 1
+
+
+class SignalQuality(collections.namedtuple('SignalQuality', 'rssi ber')):
+    __slots__ = ()
+
+    @property
+    def dbm(self):
+        """
+        received signal strength in dBm, None when not known or not detectable
+        """
+        return None if self.rssi == 99 else -113 + self.rssi * 2
+
+
+class ExtendedSignalQuality(collections.namedtuple('ExtendedSignalQuality', 'rxlev ber rscp ecno rsrq rsrp')):
+    """
+    +CESQ: <rxlev>,<ber>,<rscp>,<ecno>,<rsrq>,<rsrp>, 99 or 255 for a quantity not known or not detectable
+    """
+    __slots__ = ()
+
+    @property
+    def rsrq_db(self):
+        return None if self.rsrq == 255 else self.rsrq / 2.0 - 20
+
+    @property
+    def rsrp_dbm(self):
+        return None if self.rsrp == 255 else self.rsrp - 141
+
+
+class Registration(collections.namedtuple('Registration', 'n stat lac ci act')):
+    """
+    +CREG: <n>,<stat>[,<lac>,<ci>[,<AcT>]], location and access technology None when not reported
+    """
+    __slots__ = ()
+
+
+class OperatorSelection(collections.namedtuple('OperatorSelection', 'mode format oper act')):
+    __slots__ = ()
+
+
+class Operator(collections.namedtuple('Operator', 'stat long short numeric act')):
+    """
+    an operator of the AT+COPS=? list: (<stat>,"<long>","<short>","<numeric>"[,<AcT>])
+    """
+    __slots__ = ()
+
+
+class AttachState(collections.namedtuple('AttachState', 'state')):
+    __slots__ = ()
+
+    @property
+    def attached(self):
+        return self.state == 1
+
+
+class SystemSelection(collections.namedtuple('SystemSelection', 'n')):
+    __slots__ = ()
+
+
+class PdpContext(collections.namedtuple('PdpContext', 'cid pdp_type apn state address ipv6_address')):
+    """
+    a PDP context: its definition (+CGDCONT), activation state (+CGACT) and addresses (+CGPADDR),
+    addresses None when not allocated
+    """
+    __slots__ = ()
+
+    @property
+    def active(self):
+        return self.state == 1
+
+
+RECORDS = (SimStatus, ActivityStatus, Functionality, SignalQuality, ExtendedSignalQuality, Registration,
+           OperatorSelection, Operator, AttachState, SystemSelection, PdpContext)
+
+# result record of the ATServer methods, by method name, as are the results of poll_status
+RESULTS = {
+    'read_pin_status': SimStatus,
+    'report_phone_activity_status': ActivityStatus,
+    'get_signal_quality': SignalQuality,
+    'get_extended_signal_quality': ExtendedSignalQuality,
+    'get_network_registration_params': Registration,
+    'set_rat_mode': OperatorSelection,
+    'attach': AttachState,
+    'detach': AttachState,
+    'get_ue': Functionality,
+    'release_ue': Functionality,
+}
+
+
+def write_serpent(record, serializer, out, level):
+    # values of a record are str, int or None, their repr is their serpent literal
+    out.append(repr(tuple(record)))
+
+
+def typed(method, value):
+    """
+    :param method: name of the ATServer method value is the result of
+    :return: value as the result record of method when it came as a plain tuple, value itself otherwise
+    """
+    record = RESULTS.get(method)
+    if record is not None and type(value) in (tuple, list) and len(value) == len(record._fields):
+        return record._make(value)
+    return value
+
+
+def register():
+    """
+    register the records with serpent, the Pyro serializer, done on import
+    """
+    for record in RECORDS:
+        serpent.register_class(record, write_serpent)
+
+
+register()
@@ -0,0 +1,131 @@
+"""
+incremental parsing of AT command responses as they come out of the serial port
+"""
+import functools
+
+OK = 'OK'
+ERROR = 'ERROR'
+
+# final result codes (3GPP TS 27.007 / ITU-T V.250) ending a solicited response
+FINAL_RESULT_CODES = {
+    'OK': OK,
+    'CONNECT': OK,
+    'ERROR': ERROR,
+    'NO CARRIER': ERROR,
+    'NO DIALTONE': ERROR,
+    'BUSY': ERROR,
+    'NO ANSWER': ERROR,
+    'ABORTED': ERROR,
+}
+FINAL_RESULT_PREFIXES = {
+    '+CME ERROR:': ERROR,
+    '+CMS ERROR:': ERROR,
+    'CONNECT ': OK,
+}
+_PREFIX_LENGTHS = sorted({len(prefix) for prefix in FINAL_RESULT_PREFIXES})
+# same tables keyed by bytes, so raw lines are classified without being decoded
+_CODES = dict(FINAL_RESULT_CODES)
+_CODES.update((key.encode(), value) for key, value in FINAL_RESULT_CODES.items())
+_PREFIXES = dict(FINAL_RESULT_PREFIXES)
+_PREFIXES.update((key.encode(), value) for key, value in FINAL_RESULT_PREFIXES.items())
+
+
+def final_result(line):
+    """
+    classify a response line in constant time
+    :param line: a line (str or raw bytes) stripped of its line terminator
+    :return: OK or ERROR when the line is a final result code, None otherwise
+    """
+    code = _CODES.get(line)
+    if code is not None:
+        return code
+    for length in _PREFIX_LENGTHS:
+        code = _PREFIXES.get(line[:length])
+        if code is not None:
+            return code
+    return None
+
+
+@functools.lru_cache(maxsize=256)
+def encode_command(command):
+    """
+    :return: (command bytes, command bytes with its line terminator), built once per distinct command
+    """
+    raw = command.encode()
+    return raw, raw + b'\r\n'
+
+
+class LineSplitter(object):
+    """
+    split a byte stream into raw lines, accumulating it in one reusable bytearray
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, chunk):
+        """
+        :param chunk: bytes read from the port
+        :return: list of the non empty lines (bytes, without terminator) completed by chunk
+        """
+        buffer = self._buffer
+        searched = len(buffer)
+        buffer += chunk
+        end = buffer.rfind(b'\n', searched)
+        if end == -1:
+            return []
+        with memoryview(buffer) as view:
+            block = view[:end].tobytes()
+        del buffer[:end + 1]
+        return list(filter(None, block.splitlines()))
+
+    def reset(self):
+        del self._buffer[:]
+
+
+class Response(object):
+    """
+    lines of a command response kept as received and decoded only when a parser reads them;
+    indexing and iteration give str like the former list output, slices give lists
+    """
+    __slots__ = ('_raw', '_decoded', 'append')
+
+    def __init__(self, raw_lines=()):
+        self._raw = list(raw_lines)
+        self._decoded = {}
+        self.append = self._raw.append
+
+    def raw(self, index):
+        return self._raw[index]
+
+    def raw_lines(self):
+        return self._raw
+
+    def __len__(self):
+        return len(self._raw)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._raw)))]
+        if index < 0:
+            index += len(self._raw)
+        value = self._decoded.get(index)
+        if value is None:
+            value = self._decoded[index] = self._raw[index].decode('ascii', errors='replace')
+        return value
+
+    def __iter__(self):
+        for index in range(len(self._raw)):
+            yield self[index]
+
+    def __contains__(self, value):
+        return any(line == value for line in self)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(list(self))
@@ -0,0 +1,204 @@
+"""
+signal quality sampled on the server at a fixed rate (AT+CSQ, with AT+CESQ on the same line when supported)
+into a preallocated ring buffer, so coverage and soak tests get thousands of samples, or their statistics,
+in a single call instead of a get_signal_quality call per sample
+
+samples are rows of COLUMNS holding the codes answered by the modem, NaN for a value not known or not
+detectable (or not measured: rsrq and rsrp without AT+CESQ); statistics convert them to dBm / dB.
+
+requires numpy, an optional dependency of the server
+"""
+import logging
+import threading
+import time
+
+import serpent
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .worker import LONG_RUNNING
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+COLUMNS = ('time', 'rssi', 'ber', 'rsrq', 'rsrp')
+NAN = float('nan')
+
+# column -> (name, scale, offset) of its value in dBm / dB: value = code * scale + offset
+UNITS = (
+    ('rssi', ('rssi_dbm', 2, -113)),
+    ('rsrq', ('rsrq_db', 0.5, -20)),
+    ('rsrp', ('rsrp_dbm', 1, -141)),
+)
+PERCENTILES = (5, 50, 95)
+
+
+def sample_row(signal, extended=None):
+    """
+    :param signal: SignalQuality record of AT+CSQ
+    :param extended: ExtendedSignalQuality record of AT+CESQ, None when the modem does not support it
+    :return: rssi, ber, rsrq, rsrp codes, NaN for the unknown ones
+    """
+    rsrq = rsrp = 255
+    if extended is not None:
+        rsrq, rsrp = extended.rsrq, extended.rsrp
+    return (NAN if signal.rssi == 99 else signal.rssi, NAN if signal.ber == 99 else signal.ber,
+            NAN if rsrq == 255 else rsrq, NAN if rsrp == 255 else rsrp)
+
+
+def require_numpy():
+    if numpy is None:
+        raise RuntimeError('signal samples require numpy, install it')
+
+
+class SampleRing(object):
+    """
+    the last capacity samples, in an array allocated once
+    """
+
+    def __init__(self, capacity):
+        require_numpy()
+        self.capacity = capacity
+        # samples appended since the creation, the next one goes to row count % capacity
+        self.count = 0
+        self._rows = numpy.full((capacity, len(COLUMNS)), numpy.nan)
+        self._lock = threading.Lock()
+
+    def append(self, row):
+        with self._lock:
+            self._rows[self.count % self.capacity] = row
+            self.count += 1
+
+    def last(self, n=None):
+        """
+        :param n: number of samples, all the samples held when None
+        :return: copy of the last n samples, oldest first
+        """
+        with self._lock:
+            held = min(self.count, self.capacity)
+            n = held if n is None else min(n, held)
+            end = self.count % self.capacity
+            if end - n >= 0:
+                return self._rows[end - n:end].copy()
+            return numpy.concatenate((self._rows[end - n:], self._rows[:end]))
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+
+def statistics(samples, percentiles=PERCENTILES):
+    """
+    :param samples: array of rows of COLUMNS
+    :return: dict with the count and time span of the samples, count/mean/min/max/percentiles of rssi_dbm,
+             rsrq_db and rsrp_dbm (None when never known), and the count of samples per ber code
+    """
+    require_numpy()
+    result = {'samples': len(samples), 'span_s': float(samples[-1, 0] - samples[0, 0]) if len(samples) else 0.0}
+    for column, (name, scale, offset) in UNITS:
+        values = samples[:, COLUMNS.index(column)]
+        values = values[~numpy.isnan(values)] * scale + offset
+        if not len(values):
+            result[name] = None
+            continue
+        summary = {'count': len(values), 'mean': round(float(values.mean()), 2),
+                   'min': float(values.min()), 'max': float(values.max())}
+        for q, value in zip(percentiles, numpy.percentile(values, percentiles)):
+            summary['p{}'.format(q)] = round(float(value), 2)
+        result[name] = summary
+    ber = samples[:, COLUMNS.index('ber')]
+    unknown = numpy.isnan(ber)
+    counts = numpy.bincount(ber[~unknown].astype(int), minlength=8)
+    result['ber'] = dict((code, int(count)) for code, count in enumerate(counts) if count)
+    result['ber_unknown'] = int(unknown.sum())
+    return result
+
+
+def export_samples(samples, columns=COLUMNS):
+    """
+    :param columns: names of the columns of samples
+    :return: samples as one block of bytes, with what is needed to rebuild the array (import_samples)
+    """
+    return {'columns': columns, 'dtype': samples.dtype.str, 'data': samples.tobytes()}
+
+
+def import_samples(exported):
+    """
+    :param exported: export_samples result, as received over Pyro (serpent sends bytes as base64)
+    :return: array of rows of the exported columns
+    """
+    require_numpy()
+    data = exported['data']
+    if not isinstance(data, bytes):
+        data = serpent.tobytes(data)
+    return numpy.frombuffer(data, dtype=exported['dtype']).reshape(-1, len(exported['columns']))
+
+
+class SignalSampler(object):
+    """
+    thread reading a sample every interval seconds through the modem worker, at long running priority so
+    the interactive calls of the clients go first
+    :param read: callable returning the rssi, ber, rsrq, rsrp codes of a sample (sample_row)
+    """
+
+    def __init__(self, worker, read, interval=0.1, capacity=36000):
+        if interval <= 0:
+            raise ValueError('interval should be positive, passed value is {}'.format(interval))
+        self.worker = worker
+        self.read = read
+        self.interval = interval
+        self.ring = SampleRing(capacity)
+        self.errors = 0
+        # ticks skipped because a sample took longer than interval
+        self.missed = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='signal-sampler-{}'.format(self.worker.name))
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def sample(self):
+        try:
+            row = self.worker.run(self.read, priority=LONG_RUNNING, caller='sampler', name='sample_signal')
+        except Exception as e:
+            self.errors += 1
+            logger.debug('signal sample failed: {}'.format(e))
+            return
+        self.ring.append((time.time(),) + tuple(row))
+
+    def statistics(self, last=None):
+        result = statistics(self.ring.last(last))
+        result.update(errors=self.errors, missed=self.missed, interval_s=self.interval)
+        return result
+
+    def export(self, last=None):
+        return export_samples(self.ring.last(last))
+
+    def _loop(self):
+        next_at = time.monotonic()
+        while not self._stop.is_set():
+            self.sample()
+            next_at += self.interval
+            late = time.monotonic() - next_at
+            if late > 0:
+                skipped = int(late // self.interval) + 1
+                self.missed += skipped
+                next_at += skipped * self.interval
+            self._stop.wait(next_at - time.monotonic())
@@ -0,0 +1,152 @@
+"""
+network scans (AT+COPS=?) run as background jobs on the modem worker: starting one returns a job id right away,
+the operators found are added to the job as they are parsed, and the last complete scan of the modem is kept
+in the connector cache, so the scans asked again during a test campaign are served without scanning
+"""
+import collections
+import itertools
+import logging
+import threading
+import time
+
+from .worker import LONG_RUNNING
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+SCAN_COMMAND = 'AT+COPS=?'
+SCAN_TTL = 600
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+_job_ids = itertools.count(1)
+
+
+class ScanJob(object):
+
+    def __init__(self, operators=None):
+        self.id = next(_job_ids)
+        # served from the cache, without scanning
+        self.cached = operators is not None
+        self.state = DONE if self.cached else QUEUED
+        self.operators = list(operators or ())
+        self.error = None
+        self.started_at = time.monotonic()
+        self.finished_at = self.started_at if self.cached else None
+        self.ticket = None
+
+    def describe(self, since=0):
+        """
+        :param since: number of operators already received, only the following ones are returned
+        :return: dict id, state, cached, error, elapsed_s, count of the operators found and the operators
+        """
+        # operators are only ever appended, a copy of the slice is enough while the scan goes on
+        operators = self.operators[since:]
+        return {
+            'id': self.id,
+            'state': self.state,
+            'cached': self.cached,
+            'error': self.error,
+            'elapsed_s': round((self.finished_at or time.monotonic()) - self.started_at, 3),
+            'count': since + len(operators),
+            'operators': operators,
+        }
+
+
+class NetworkScans(object):
+    """
+    scan jobs of a modem, a scan queued or running is shared by the callers asking for one
+    :param command: COPS of the modem
+    :param max_jobs: finished jobs kept to be read, the oldest are dropped
+    """
+
+    def __init__(self, worker, command, ttl=SCAN_TTL, max_jobs=50):
+        self.worker = worker
+        self.command = command
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._jobs = collections.OrderedDict()
+        self._current = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return getattr(self.command.serial_target, 'cache', None)
+
+    def start(self, refresh=False, caller=None):
+        """
+        :param refresh: scan even when a scan of the modem is cached
+        :return: id of the job
+        """
+        with self._lock:
+            if self._current is not None:
+                return self._current.id
+            cached = None if refresh or self.cache is None else self.cache.get(SCAN_COMMAND)
+            job = ScanJob(cached)
+            self._keep(job)
+            if cached is None:
+                if self.worker.running:
+                    try:
+                        job.ticket = self.worker.schedule(self._scan, (job,), priority=LONG_RUNNING, caller=caller,
+                                                          name='network_scan')
+                    except Exception as e:
+                        # queue full: the job is kept failed, the next start schedules a new one
+                        job.state, job.error, job.finished_at = FAILED, str(e), time.monotonic()
+                        raise
+                self._current = job
+        if cached is None and job.ticket is None:
+            # no worker thread, as worker.run does
+            self._scan(job)
+        return job.id
+
+    def _keep(self, job):
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+
+    def _scan(self, job):
+        job.state = RUNNING
+        job.started_at = time.monotonic()
+        try:
+            for operator in self.command.scan():
+                job.operators.append(operator)
+        except Exception as e:
+            job.state, job.error = FAILED, str(e)
+            logger.debug('network scan {} failed: {}'.format(job.id, e))
+        else:
+            if self.cache is not None:
+                self.cache.put(SCAN_COMMAND, list(job.operators), self.ttl)
+            job.state = DONE
+        finally:
+            job.finished_at = time.monotonic()
+            with self._lock:
+                if self._current is job:
+                    self._current = None
+
+    def get(self, job_id, since=0):
+        """
+        :return: ScanJob.describe of the job
+        :raise KeyError: unknown job, or dropped
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise KeyError('unknown network scan job {}'.format(job_id))
+        return job.describe(since)
+
+    def cancel(self, job_id):
+        """
+        cancel a scan still waiting for the port, a running scan is never interrupted
+        :return: True when the scan was cancelled
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.ticket is None or not self.worker.cancel(job.ticket.id):
+                return False
+            job.state, job.finished_at = CANCELLED, time.monotonic()
+            if self._current is job:
+                self._current = None
+        return True
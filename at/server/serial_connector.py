@@ -1,26 +1,270 @@
 import serial
-from datetime import datetime, timedelta
+import collections
+import contextlib
+import json
+import os
+import queue
+import threading
 import time
 import logging
+from .cache import ResultCache
+from .response import LineSplitter, Response, encode_command, final_result, ERROR
+from .timeouts import TimeoutPolicy
+from .transcript import Transcript
+from .urc import UrcDispatcher, RAW_URC_PREFIXES, URC_FIRST_BYTES, is_unsolicited, raw_urc_prefix, response_prefixes
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
 
+def answers(port, timeout):
+    """
+    :return: True when port answers a bare AT with OK within timeout seconds
+    """
+    port.reset_input_buffer()
+    port.write(b'AT\r\n')
+    port.flush()
+    wait_until = time.monotonic() + timeout
+    while time.monotonic() < wait_until:
+        if port.readline().strip() == b'OK':
+            return True
+    return False
+
+
+class SerialSession(object):
+    """
+    an open serial port kept alive between commands, with the lock serializing its users
+    """
+
+    def __init__(self, port):
+        self.port = port
+        self.lock = threading.RLock()
+        self.last_used = time.monotonic()
+        # set while a background reader owns the input side, which then reports drops itself
+        self.watched = False
+
+
+class SerialSessionPool(object):
+    """
+    keeps one open serial port per com_id, shared by every Connector (and so every AtCommand) on that port
+    """
+
+    def __init__(self, probe_interval=30, probe_timeout=1):
+        self._sessions = {}
+        # guards the dicts only, each com_id has its own lock held while its port is probed or opened
+        self._lock = threading.Lock()
+        self._port_locks = {}
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+
+    def _port_lock(self, com_id):
+        with self._lock:
+            return self._port_locks.setdefault(com_id, threading.Lock())
+
+    def acquire(self, com_id, opener):
+        """
+        return the open session of com_id, opening it with opener() when missing or unhealthy
+        :param com_id:
+        :param opener: callable returning a new serial.Serial
+        :return: SerialSession
+        """
+        with self._port_lock(com_id):
+            session = self._sessions.get(com_id)
+            if session is not None and not self.is_alive(session):
+                logger.info('serial session on COM port {} lost, reopening'.format(com_id))
+                self._close(com_id)
+                session = None
+            if session is None:
+                session = SerialSession(opener())
+                with self._lock:
+                    self._sessions[com_id] = session
+                logger.info('SERIAL SESSION OPENED ON COM PORT {}'.format(com_id))
+            return session
+
+    def is_alive(self, session):
+        """
+        probe the port with a bare AT when it has been idle longer than probe_interval
+        :param session:
+        :return: False when the device dropped or does not answer
+        """
+        if not session.port.is_open:
+            return False
+        if session.watched or time.monotonic() - session.last_used < self.probe_interval:
+            return True
+        if not session.lock.acquire(blocking=False):
+            # a command holds the port, it is not idle
+            return True
+        try:
+            if answers(session.port, self.probe_timeout):
+                session.last_used = time.monotonic()
+                return True
+        except (serial.SerialException, OSError) as e:
+            logger.debug('health probe failed on {} : {}'.format(session.port.port, e))
+        finally:
+            session.lock.release()
+        return False
+
+    def invalidate(self, com_id):
+        with self._port_lock(com_id):
+            self._close(com_id)
+
+    def release(self, com_id):
+        self.invalidate(com_id)
+
+    def close_all(self):
+        with self._lock:
+            com_ids = list(self._sessions)
+        for com_id in com_ids:
+            self.invalidate(com_id)
+
+    def _close(self, com_id):
+        with self._lock:
+            session = self._sessions.pop(com_id, None)
+        if session is None:
+            return
+        try:
+            session.port.close()
+        except (serial.SerialException, OSError) as e:
+            logger.debug('error while closing COM port {} : {}'.format(com_id, e))
+        logger.info('SERIAL SESSION CLOSED ON COM PORT {}'.format(com_id))
+
+
+sessions = SerialSessionPool()
+
+
+def port_name(com_id):
+    """
+    :param com_id: windows COM number, or a device path such as /dev/ttyUSB2
+    """
+    if str(com_id).startswith('/'):
+        return str(com_id)
+    return 'COM' + str(com_id)
+
+
+class PortSettings(object):
+    """
+    line settings negotiated per port (baud rate, flow control), remembered in a JSON file
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._settings = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self._settings = json.load(f)
+
+    def get(self, port):
+        return self._settings.get(port)
+
+    def put(self, port, baudrate, rtscts):
+        self._settings[port] = {'baudrate': baudrate, 'rtscts': rtscts}
+        if self.path:
+            with open(self.path, 'w') as f:
+                json.dump(self._settings, f, indent=2)
+
+    def forget(self, port):
+        if self._settings.pop(port, None) is not None and self.path:
+            with open(self.path, 'w') as f:
+                json.dump(self._settings, f, indent=2)
+
+
 class Connector(object):
+    READ_TIMEOUT = 0.1
+    BAUDRATE = 115200
+    PROBE_TIMEOUT = 1
 
-    def __init__(self, com_id):
-        self._history = []
+    def __init__(self, com_id, persistent=False, pool=None, history_size=1000, transcript_path=None,
+                 settings=None, timeouts=None):
+        self._history = Transcript(maxlen=history_size, path=transcript_path)
+        self._lines = LineSplitter()
+        self._received = collections.deque()
+        self._solicited = queue.Queue()
+        self._expected = None
+        self._reader = None
+        self._stop_reading = threading.Event()
+        self.urc = UrcDispatcher()
+        # called with (command, timing dict) after every execute, see timing()
+        self.on_timing = None
+        self._first_byte_at = self._last_byte_at = None
+        # (command, time its late answer is waited for until) of the last command cut by its deadline
+        self._abandoned = None
+        # set once the remembered line settings were probed, see open_port
+        self._probed = False
         self._ser = None
         self._com_id = com_id
+        self.persistent = persistent
+        self._pool = pool if pool is not None else sessions
+        self.settings = settings if settings is not None else PortSettings()
+        self.timeouts = timeouts if timeouts is not None else TimeoutPolicy()
+        self.cache = ResultCache()
+        self.urc.add_listener(self.cache.on_urc)
+
+    @property
+    def port_name(self):
+        return port_name(self._com_id)
+
+    def open_port(self, b=None, probe=False):
+        """
+        open the port with the line settings remembered for it, 115200 baud with XON/XOFF otherwise
+        :param probe: check the remembered settings with a bare AT, they are forgotten and the port reopened at
+                      115200 baud with XON/XOFF when the modem does not answer (reset to its default rate)
+        """
+        remembered = self.settings.get(self.port_name) or {}
+        port = self._serial(b or remembered.get('baudrate', self.BAUDRATE), remembered.get('rtscts', False))
+        if not probe or b is not None or not remembered:
+            return port
+        try:
+            if answers(port, self.PROBE_TIMEOUT):
+                return port
+        except (serial.SerialException, OSError) as e:
+            logger.debug('probe failed on {} : {}'.format(self.port_name, e))
+        port.close()
+        logger.info('{} does not answer at {} baud, back to {} baud with XON/XOFF'.format(
+            self.port_name, remembered.get('baudrate'), self.BAUDRATE))
+        self.settings.forget(self.port_name)
+        return self._serial(self.BAUDRATE, False)
 
-    def connect(self, b=115200):
+    def _serial(self, baudrate, rtscts):
+        return serial.Serial(
+            port=self.port_name, baudrate=baudrate, stopbits=serial.STOPBITS_ONE, parity=serial.PARITY_NONE,
+            timeout=self.READ_TIMEOUT, xonxoff=not rtscts, rtscts=rtscts)
+
+    def reconfigure(self, baudrate, rtscts):
+        """
+        change the line settings of the open port
+        """
+        self._ser.baudrate = baudrate
+        self._ser.rtscts = rtscts
+        self._ser.xonxoff = not rtscts
+        self._lines.reset()
+        self._received.clear()
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        """
+        hold the open port for a sequence of execute calls
+        """
+        if self.persistent:
+            session = self.open_session()
+            with session.lock:
+                self._ser = session.port
+                yield self._ser
+        else:
+            self.connect()
+            try:
+                yield self._ser
+            finally:
+                self.disconnect()
+
+    def connect(self, b=None):
         if self._ser:
             self.disconnect()
-        self._ser = serial.Serial(
-            port='COM' + str(self._com_id), baudrate=b, stopbits=serial.STOPBITS_ONE, parity=serial.PARITY_NONE,
-            timeout=2, xonxoff=1)
-        logger.info('CONNECTION ESTABLISHED TO COM PORT {}'.format(com_id))
+        # probed on the first connection only, not on every command of a non-persistent connector
+        self._ser = self.open_port(b, probe=not self._probed)
+        self._probed = True
+        self._lines.reset()
+        self._received.clear()
+        logger.info('CONNECTION ESTABLISHED TO COM PORT {}'.format(self._com_id))
         return self._ser
 
     def disconnect(self):
@@ -31,6 +275,92 @@ class Connector(object):
         logger.info('SERIAL DISCONNECTION COMPLETE')
         return self._ser
 
+    def open_session(self):
+        """
+        open (or join) the persistent session of this com port
+        :return: SerialSession
+        """
+        return self._pool.acquire(self._com_id, lambda: self.open_port(probe=True))
+
+    def close_session(self):
+        self.stop_reader()
+        self._pool.release(self._com_id)
+        self._ser = None
+
+    def start_reader(self):
+        """
+        keep reading the port in the background: responses go to the command in flight, URCs to self.urc
+        """
+        if self._reader is not None:
+            return
+        if not self.persistent:
+            raise ValueError('the background reader requires a persistent connector')
+        self._attach_reader()
+        self._stop_reading.clear()
+        self._reader = threading.Thread(target=self._read_loop, name='at-reader-{}'.format(self._com_id))
+        self._reader.daemon = True
+        self._reader.start()
+
+    @property
+    def reading(self):
+        """
+        True when the background reader dispatches the URCs as they arrive
+        """
+        return self._reader is not None
+
+    def stop_reader(self):
+        if self._reader is None:
+            return
+        self._stop_reading.set()
+        self._reader.join()
+        self._reader = None
+
+    def _attach_reader(self):
+        session = self.open_session()
+        session.watched = True
+        self._ser = session.port
+
+    def _read_loop(self):
+        while not self._stop_reading.is_set():
+            try:
+                lines = self.read()
+            except (serial.SerialException, OSError) as e:
+                logger.info('background reader lost COM port {} : {}'.format(self._com_id, e))
+                self._pool.invalidate(self._com_id)
+                if self._stop_reading.wait(1):
+                    return
+                try:
+                    self._attach_reader()
+                except (serial.SerialException, OSError):
+                    pass
+                continue
+            for line in lines:
+                self._route(line)
+
+    def _route(self, raw):
+        line = self._unsolicited(raw)
+        if line is not None:
+            self.urc.dispatch(line)
+        elif self._expected is not None:
+            self._solicited.put(raw)
+        else:
+            logger.debug('discarding unexpected line on COM port {} : {}'.format(self._com_id, raw))
+
+    def _unsolicited(self, raw):
+        """
+        :return: the decoded line when raw is an unsolicited result code, None otherwise (left undecoded)
+        """
+        if raw_urc_prefix(raw) not in RAW_URC_PREFIXES:
+            return None
+        line = raw.decode(errors='replace')
+        if is_unsolicited(line, self._expected or frozenset()):
+            return line
+        return None
+
+    @property
+    def history(self):
+        return self._history
+
     def isERROR(self, output):
         for line in output:
             if "ERROR" in line:
@@ -38,9 +368,19 @@ class Connector(object):
         return False
 
     def read(self):
-        lines = self._ser.readlines()
-        output = [x.rstrip('\r\n') for x in lines]
-        self._history += ["Read: " + value for value in output]
+        """
+        read the bytes already received (waiting at most READ_TIMEOUT for the first one)
+        :return: the raw lines (bytes) completed by those bytes
+        """
+        chunk = self._ser.read(self._ser.in_waiting or 1)
+        if not chunk:
+            return []
+        self._last_byte_at = time.perf_counter()
+        if self._first_byte_at is None:
+            self._first_byte_at = self._last_byte_at
+        output = self._lines.feed(chunk)
+        for raw in output:
+            self._history.received(raw)
         return output
 
     def send_command(self, command):
@@ -49,8 +389,14 @@ class Connector(object):
         :param command:
         :return:
         """
-        self._history.append("Send: " + command)
-        self._ser.write(command + '\r\n')
+        raw, wire = encode_command(command)
+        self._history.sent(raw)
+        self._expected = response_prefixes(command)
+        if self._reader is not None:
+            while not self._solicited.empty():
+                self._solicited.get_nowait()
+        self._first_byte_at = self._last_byte_at = None
+        self._ser.write(wire)
         self._ser.flush()
 
     def read_command(self, timeout):
@@ -59,44 +405,223 @@ class Connector(object):
         :param timeout:
         :return:
         """
-        output = []
-        wait_until = datetime.now() + timedelta(seconds=int(timeout))
-        while wait_until > datetime.now():
-            output += self.read()
-            if len(output) > 0:
-                ok = ['OK' in value for value in output]
-                if True in ok:
-                    return output
-                if self.isERROR(output):
-                    return {'error': output}
-            time.sleep(0.3)
+        output = Response()
+        for raw in self.read_lines(timeout):
+            output.append(raw)
+        if output and final_result(output.raw(-1)) is ERROR:
+            return {'error': output}
         return output
 
+    def read_lines(self, timeout):
+        """
+        yield the raw lines of the response as they are received, up to its final result code (included)
+        or until timeout expires
+        """
+        received = self._received
+        wait_until = time.monotonic() + timeout
+        while wait_until > time.monotonic():
+            if not received:
+                self._receive(wait_until)
+            while received:
+                raw = received.popleft()
+                if self._reader is None and raw[:1] in URC_FIRST_BYTES:
+                    line = self._unsolicited(raw)
+                    if line is not None:
+                        self.urc.dispatch(line)
+                        continue
+                yield raw
+                if final_result(raw) is not None:
+                    return
+
+    def _receive(self, wait_until):
+        """
+        move the next received lines to self._received, from the background reader or the port
+        """
+        if self._reader is None:
+            self._received.extend(self.read())
+            return
+        try:
+            self._received.append(self._solicited.get(timeout=max(0, wait_until - time.monotonic())))
+            while True:
+                self._received.append(self._solicited.get_nowait())
+        except queue.Empty:
+            pass
+
     def execute(self, command, timeout=0.2):
         """
         execute command on COM port
         :param command:
-        :param timeout:
+        :param timeout: longest time the command may take, shortened by the learned latency of the command
         :return: a list of command lines output
         """
+        if self._abandoned is not None:
+            self.resync()
+        deadline = self.timeouts.deadline(self.port_name, command, timeout)
+        started = time.perf_counter()
         self.send_command(command)
-        logger.debug('executing command {} on COM Port{} with a timeout of {} sec'.format(
-            command, self._com_id, timeout))
-        output = self.read_command(timeout=timeout + 3)
+        written = time.perf_counter()
+        logger.debug('executing command {} on COM Port{} with a deadline of {:.3f} sec'.format(
+            command, self._com_id, deadline))
+        try:
+            output = self.read_command(timeout=deadline)
+        finally:
+            self._expected = None
+        finished = time.perf_counter()
+        if not isinstance(output, dict) and (not output or self.cut_short(output)):
+            self.abandon(command, timeout - deadline)
+        self.learn(command, output, finished - started, deadline)
+        if self.on_timing is not None:
+            self.on_timing(command, self.timing(started, written, finished))
         logger.debug('{} output:: {}'.format(command, output))
         return output
 
+    def abandon(self, command, remaining):
+        """
+        remember a command cut by its deadline, its late answer is read out before the next command is sent
+        :param remaining: seconds the caller still allowed the command when its deadline expired
+        """
+        self._abandoned = (command, time.monotonic() + max(0, remaining))
+
+    def resync(self):
+        """
+        drop the late answer of the abandoned command so that it is not taken for the answer of the next one:
+        wait for its final result code until the time the caller allowed it, empty the buffers, then send a
+        bare AT and read up to its OK, and what follows it shortly (the abandoned answer may come first)
+        """
+        command, wait_until = self._abandoned
+        self._abandoned = None
+        # its information lines are solicited, not URCs, even when they arrive late
+        self._expected = response_prefixes(command)
+        try:
+            for _ in self.read_lines(max(0, wait_until - time.monotonic())):
+                pass
+            self._ser.reset_input_buffer()
+            if self._reader is None:
+                self._lines.reset()
+            self._received.clear()
+            self.send_command('AT')
+            codes = [final_result(raw) for raw in self.read_lines(self.PROBE_TIMEOUT)]
+            while codes and codes[-1] is not None:
+                codes = [final_result(raw) for raw in self.read_lines(self.READ_TIMEOUT * 2)]
+        finally:
+            self._expected = None
+        logger.info('COM port {} resynchronized after {} got no final result code'.format(self._com_id, command))
+
+    def learn(self, command, output, elapsed, deadline):
+        """
+        feed the timeout policy: answered commands with their latency, expired ones with their deadline,
+        error answers are not latency samples
+        """
+        if isinstance(output, dict):
+            return
+        if output and final_result(output.raw(-1)) is not None:
+            self.timeouts.record(self.port_name, command, elapsed)
+        else:
+            logger.info('{} got no final result code within {:.3f} sec on COM port {}'.format(
+                command, deadline, self._com_id))
+            self.timeouts.record(self.port_name, command, deadline)
+
+    def timing(self, started, written, finished):
+        """
+        split the duration of the last execute, in seconds:
+        serial_write: writing the command, time_to_first_byte: until the first answer byte,
+        response_transfer: first to last byte, final_result_detection: last byte to read_command return
+        """
+        first = self._first_byte_at or finished
+        last = self._last_byte_at or finished
+        return {
+            'serial_write': written - started,
+            'time_to_first_byte': max(0, first - written),
+            'response_transfer': max(0, last - max(first, written)),
+            'final_result_detection': max(0, finished - last),
+        }
+
+    def execute_in_session(self, command, timeout):
+        """
+        execute command on the persistent session, reopening the port once if the device dropped
+        :param command:
+        :param timeout:
+        :return: a list of command lines output
+        """
+        for attempt in range(2):
+            session = self.open_session()
+            with session.lock:
+                self._ser = session.port
+                try:
+                    output = self.execute(command=command, timeout=timeout)
+                    session.last_used = time.monotonic()
+                    return output
+                except (serial.SerialException, OSError) as e:
+                    if attempt:
+                        raise
+                    logger.info('COM port {} dropped while running {} : {}, reopening'.format(
+                        self._com_id, command, e))
+                    self._pool.invalidate(self._com_id)
+
+    def stream(self, command, timeout, exception, message):
+        """
+        run command, yielding the raw lines of its response (final result code excluded) as they are received
+        instead of collecting them, so memory stays the same whatever the size of the response.
+        the port is held until the generator is exhausted or closed; closed early, it still reads the rest of
+        the response, which would otherwise be taken for the answer of the next command
+        :raise exception: on an error result code, or no final result code within the deadline
+        """
+        with self.exclusive():
+            if self._abandoned is not None:
+                self.resync()
+            deadline = self.timeouts.deadline(self.port_name, command, timeout)
+            started = time.perf_counter()
+            self.send_command(command)
+            lines = self.read_lines(deadline)
+            last = code = None
+            try:
+                for last in lines:
+                    code = final_result(last)
+                    if code is None:
+                        yield last
+            finally:
+                for last in lines:
+                    code = final_result(last)
+                self._expected = None
+        if code is None:
+            logger.info('{} got no final result code within {:.3f} sec on COM port {}'.format(
+                command, deadline, self._com_id))
+            self.timeouts.record(self.port_name, command, deadline)
+            self.abandon(command, timeout - deadline)
+            raise exception(message + ' {} : no final result code within {:.3f} sec'.format(command, deadline))
+        if code is ERROR:
+            raise exception(message + ' {} output : {}'.format(command, last))
+        self.timeouts.record(self.port_name, command, time.perf_counter() - started)
+
+    @staticmethod
+    def cut_short(result):
+        """
+        True for a response cut by the deadline before its final result code
+        """
+        return final_result(result.raw(-1)) is None
+
     def error_occurred(self, result):
-        if 'error' in result or len(result) == 0:
+        if isinstance(result, dict) or len(result) == 0:
             return True
         return False
 
     def run(self, command, timeout, exception, message):
-        self.connect(self._com_id)
-        output = self.execute(command=command, timeout=timeout)
+        if self.persistent:
+            output = self.execute_in_session(command=command, timeout=timeout)
+        else:
+            self.connect()
+            try:
+                output = self.execute(command=command, timeout=timeout)
+            finally:
+                self.disconnect()
         if self.error_occurred(output):
             logger.debug(
                 message + ' {} output : {}'.format(command, output) + "exception encountered : {}".format(exception))
             raise exception(message + ' {} output : {}'.format(command, output))
-        self.disconnect()
+        if self.cut_short(output):
+            logger.debug('{} got no final result code within the deadline, partial output : {}'.format(
+                command, output))
+            raise exception(message + ' {} : no final result code within the deadline, partial output : {}'.format(
+                command, output))
+        self.cache.observe(command, output)
         return output
@@ -0,0 +1,250 @@
+"""
+append-only columnar store of the modem telemetry: every value of a result record is a row
+(time, modem, metric, value), e.g. (1700000000.1, '/dev/ttyUSB0', 'SignalQuality.rssi', 20).
+
+each column is a file of fixed width numbers, strings (modem and metric names, text values such as
+SimStatus.code) are dictionary encoded in strings.json. appends are buffered and written in batches,
+queries map the column files read-only and select a time range by binary search, as rows are appended
+in time order.
+
+queries require numpy, an optional dependency of the server
+"""
+import array
+import json
+import logging
+import math
+import mmap
+import os
+import threading
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .records import RECORDS
+from .sampler import export_samples
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# column name -> array typecode of its file, native byte order
+COLUMNS = (('time', 'd'), ('modem', 'H'), ('metric', 'H'), ('value', 'd'))
+NAN = float('nan')
+
+
+class TelemetryStore(object):
+    """
+    :param path: directory of the store, created when missing
+    :param batch_size: rows buffered before they are written
+    :param flush_interval: seconds after which buffered rows are written on the next append
+    """
+
+    def __init__(self, path, batch_size=4096, flush_interval=5.0, clock=time.time):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buffers = dict((name, array.array(typecode)) for name, typecode in COLUMNS)
+        self._maps = {}
+        self._flushed_at = time.monotonic()
+        self._last_time = 0.0
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self._strings = []
+        self._text_metrics = set()
+        if os.path.exists(self._strings_path):
+            with open(self._strings_path) as f:
+                saved = json.load(f)
+            self._strings = saved['strings']
+            self._text_metrics = set(saved['text_metrics'])
+        self._codes = dict((string, code) for code, string in enumerate(self._strings))
+        self.rows = self._repair()
+        if self.rows:
+            with open(self._column_path('time'), 'rb') as f:
+                f.seek(-array.array('d').itemsize, os.SEEK_END)
+                latest = array.array('d')
+                latest.fromfile(f, 1)
+            self._last_time = latest[0]
+
+    @property
+    def _strings_path(self):
+        return os.path.join(self.path, 'strings.json')
+
+    def _column_path(self, name):
+        return os.path.join(self.path, name + '.col')
+
+    def _repair(self):
+        """
+        cut the columns to the rows written in every one of them, after a crash in the middle of a flush
+        :return: number of rows stored
+        """
+        counts = []
+        for name, typecode in COLUMNS:
+            path = self._column_path(name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            counts.append(size // array.array(typecode).itemsize)
+        rows = min(counts)
+        for (name, typecode), count in zip(COLUMNS, counts):
+            if count != rows:
+                logger.warning('telemetry column {} cut from {} to {} rows'.format(name, count, rows))
+                with open(self._column_path(name), 'r+b') as f:
+                    f.truncate(rows * array.array(typecode).itemsize)
+        return rows
+
+    def _encode(self, string):
+        """
+        dictionary code of string, saved before any row using it is written
+        """
+        code = self._codes.get(string)
+        if code is None:
+            code = len(self._strings)
+            self._strings.append(string)
+            self._codes[string] = code
+            self._save_strings()
+        return code
+
+    def _save_strings(self):
+        temporary = self._strings_path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'strings': self._strings, 'text_metrics': sorted(self._text_metrics)}, f)
+        os.replace(temporary, self._strings_path)
+
+    def append(self, modem, metric, value, timestamp=None):
+        """
+        :param value: number, str (dictionary encoded) or None (stored as NaN)
+        :param timestamp: epoch seconds, now when None; rows are kept in time order, an earlier timestamp
+                          (e.g. the clock set back) is stored as the latest one
+        """
+        with self._lock:
+            self._append(modem, metric, value, timestamp)
+            self._flush_when_due()
+
+    def append_records(self, modem, records, timestamp=None):
+        """
+        append every field of the result records as a metric '<record>.<field>', other values are ignored
+        """
+        with self._lock:
+            for record in records:
+                if type(record) not in RECORDS:
+                    continue
+                name = type(record).__name__
+                for field, value in zip(record._fields, record):
+                    self._append(modem, '{}.{}'.format(name, field), value, timestamp)
+            self._flush_when_due()
+
+    def _append(self, modem, metric, value, timestamp):
+        if isinstance(value, str):
+            if metric not in self._text_metrics:
+                self._text_metrics.add(metric)
+                self._save_strings()
+            value = self._encode(value)
+        timestamp = max(self._clock() if timestamp is None else timestamp, self._last_time)
+        self._last_time = timestamp
+        self._buffers['time'].append(timestamp)
+        self._buffers['modem'].append(self._encode(modem))
+        self._buffers['metric'].append(self._encode(metric))
+        self._buffers['value'].append(NAN if value is None else value)
+
+    def _flush_when_due(self):
+        if len(self._buffers['time']) >= self.batch_size or \
+                time.monotonic() - self._flushed_at >= self.flush_interval:
+            self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        pending = len(self._buffers['time'])
+        if pending:
+            for name, _ in COLUMNS:
+                with open(self._column_path(name), 'ab') as f:
+                    self._buffers[name].tofile(f)
+                del self._buffers[name][:]
+            self.rows += pending
+        self._flushed_at = time.monotonic()
+
+    def close(self):
+        self.flush()
+
+    def _column(self, name):
+        """
+        column file mapped read-only, remapped when it grew
+        """
+        typecode = dict(COLUMNS)[name]
+        size = self.rows * array.array(typecode).itemsize
+        mapped = self._maps.get(name)
+        if mapped is None or mapped[0] != size:
+            if not size:
+                return numpy.zeros(0, dtype=typecode)
+            with open(self._column_path(name), 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            mapped = (size, numpy.frombuffer(buffer, dtype=typecode, count=self.rows))
+            self._maps[name] = mapped
+        return mapped[1]
+
+    def query(self, start=None, end=None, modem=None, metric=None, columns=None):
+        """
+        :param start: epoch seconds of the first row, end excluded; the whole store when None
+        :param modem: name of the modem, all the modems when None
+        :param metric: e.g. 'SignalQuality.rssi', all the metrics when None
+        :param columns: names of the columns returned, all of them when None
+        :return: dict column -> array of the rows selected (modem and metric as dictionary codes, see decode)
+        """
+        if numpy is None:
+            raise RuntimeError('telemetry queries require numpy, install it')
+        self.flush()
+        with self._lock:
+            mapped = dict((name, self._column(name)) for name, _ in COLUMNS)
+        times = mapped['time']
+        first = 0 if start is None else int(numpy.searchsorted(times, start, side='left'))
+        last = len(times) if end is None else int(numpy.searchsorted(times, end, side='left'))
+        mask = None
+        for name, string in (('modem', modem), ('metric', metric)):
+            if string is None:
+                continue
+            code = self._codes.get(string)
+            if code is None:
+                first = last
+                break
+            matches = mapped[name][first:last] == code
+            mask = matches if mask is None else mask & matches
+        selected = {}
+        for name in columns or [name for name, _ in COLUMNS]:
+            column = mapped[name][first:last]
+            selected[name] = column if mask is None or first == last else column[mask]
+        return selected
+
+    def series(self, metric, modem=None, start=None, end=None):
+        """
+        :return: times and values of metric, text values as their dictionary codes (see decode)
+        """
+        rows = self.query(start, end, modem, metric, columns=('time', 'value'))
+        return rows['time'], rows['value']
+
+    def export(self, metric, modem=None, start=None, end=None):
+        """
+        :return: times and values of metric as a single array (sampler.export_samples), with the strings
+                 of the codes of a text metric
+        """
+        times, values = self.series(metric, modem, start, end)
+        exported = export_samples(numpy.column_stack((times, values)), columns=('time', metric))
+        if self.is_text(metric):
+            codes = numpy.unique(values[~numpy.isnan(values)])
+            exported['strings'] = dict(zip(codes.astype(int).tolist(), self.decode(codes)))
+        return exported
+
+    def decode(self, codes):
+        """
+        :return: the strings of dictionary codes, None for NaN
+        """
+        return [None if math.isnan(code) else self._strings[int(code)] for code in codes]
+
+    def is_text(self, metric):
+        """
+        :return: True when the values of metric are strings, stored as dictionary codes
+        """
+        return metric in self._text_metrics
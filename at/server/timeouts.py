@@ -0,0 +1,147 @@
+"""
+command deadlines learned from the latency observed per modem and command
+
+the timeout given by a command (CPIN 180 s, CSQ 50 s...) is the maximum the specification or the vendor allows;
+once enough answers were seen, the deadline becomes p99 x factor of the observed latency, capped by that maximum,
+so a hung modem is detected in seconds. the histograms are kept in a JSON file across restarts.
+"""
+import json
+import logging
+import math
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# bucket i holds latencies in (BASE * GROWTH ** (i - 1), BASE * GROWTH ** i], about 19% wide
+BASE = 0.001
+GROWTH = 2 ** 0.25
+
+
+class LatencyHistogram(object):
+    """
+    log-spaced latency buckets, halved once max_count samples are reached so old behaviour fades out
+    """
+
+    def __init__(self, counts=None, max_count=10000):
+        self.counts = dict((int(bucket), count) for bucket, count in (counts or {}).items())
+        self.max_count = max_count
+        self.count = sum(self.counts.values())
+
+    @staticmethod
+    def bucket(seconds):
+        if seconds <= BASE:
+            return 0
+        return int(math.ceil(math.log(seconds / BASE, GROWTH)))
+
+    @staticmethod
+    def upper_bound(bucket):
+        return BASE * GROWTH ** bucket
+
+    def add(self, seconds):
+        bucket = self.bucket(seconds)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        if self.count >= self.max_count:
+            self.counts = dict((bucket, count // 2) for bucket, count in self.counts.items() if count > 1)
+            self.count = sum(self.counts.values())
+
+    def percentile(self, q):
+        """
+        :return: upper bound in seconds of the bucket holding the q-th percentile, 0 when empty
+        """
+        if not self.count:
+            return 0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return self.upper_bound(bucket)
+        return self.upper_bound(max(self.counts))
+
+    def to_dict(self):
+        return dict((str(bucket), count) for bucket, count in self.counts.items())
+
+
+class TimeoutPolicy(object):
+
+    def __init__(self, path=None, factor=3.0, minimum=1.0, min_samples=20, save_every=100):
+        """
+        :param path: JSON file the histograms are loaded from and saved to, kept in memory only when None
+        :param factor: deadline = p99 x factor
+        :param minimum: shortest deadline in seconds, covering scheduling and USB latency
+        :param min_samples: answers to observe before the maximum timeout is shortened
+        :param save_every: recorded answers between two saves
+        """
+        self.path = path
+        self.factor = factor
+        self.minimum = minimum
+        self.min_samples = min_samples
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._unsaved = 0
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for key, counts in json.load(f).items():
+                    self._histograms[key] = LatencyHistogram(counts)
+
+    @staticmethod
+    def key(modem, command):
+        return '{}|{}'.format(modem, command)
+
+    def histogram(self, modem, command):
+        return self._histograms.get(self.key(modem, command))
+
+    def deadline(self, modem, command, maximum):
+        """
+        :param maximum: longest time the command may take, per 3GPP or the modem vendor
+        :return: seconds to wait for the final result code
+        """
+        histogram = self.histogram(modem, command)
+        if histogram is None or histogram.count < self.min_samples:
+            return maximum
+        return min(maximum, max(self.minimum, histogram.percentile(99) * self.factor))
+
+    def record(self, modem, command, seconds):
+        """
+        record the time a command took to answer; a command cut by its deadline is recorded with that deadline,
+        so repeated expiries widen the next deadlines up to the maximum
+        """
+        with self._lock:
+            key = self.key(modem, command)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+            histogram.add(seconds)
+            self._unsaved += 1
+            save = self.path is not None and self._unsaved >= self.save_every
+        if save:
+            self.save()
+
+    def report(self, modem=None):
+        """
+        :return: dict 'modem|command' -> count, p50_ms, p99_ms
+        """
+        prefix = '{}|'.format(modem) if modem is not None else ''
+        with self._lock:
+            histograms = [(key, histogram) for key, histogram in self._histograms.items() if key.startswith(prefix)]
+        return dict((key, {
+            'count': histogram.count,
+            'p50_ms': round(histogram.percentile(50) * 1000, 3),
+            'p99_ms': round(histogram.percentile(99) * 1000, 3),
+        }) for key, histogram in histograms)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = dict((key, histogram.to_dict()) for key, histogram in self._histograms.items())
+            self._unsaved = 0
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(data, f)
+        os.replace(temporary, self.path)
+        logger.debug('saved {} latency histograms to {}'.format(len(data), self.path))
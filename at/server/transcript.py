@@ -0,0 +1,219 @@
+"""
+bounded record of the traffic exchanged with a COM port, optionally mirrored to an append-only binary file
+
+file layout : a 16 bytes header (magic, version, committed length) followed by frames of
+    <timestamp float64><direction uint8><length uint32><raw bytes>
+timestamps come from the monotonic clock, shifted once to the epoch so that files can be compared.
+a sidecar '<path>.idx' file stores (timestamp, offset) of every INDEX_EVERY-th frame.
+"""
+import argparse
+import bisect
+import collections
+import json
+import mmap
+import os
+import statistics
+import struct
+import threading
+import time
+
+from .response import final_result
+
+SEND = 0
+READ = 1
+DIRECTIONS = {SEND: 'Send', READ: 'Read'}
+
+MAGIC = b'ATTR'
+VERSION = 1
+HEADER = struct.Struct('<4sHxxQ')
+FRAME = struct.Struct('<dBI')
+INDEX_ENTRY = struct.Struct('<dQ')
+INDEX_EVERY = 64
+GROWTH = 1 << 20
+
+_EPOCH_SHIFT = time.time() - time.monotonic()
+
+
+def timestamp():
+    return time.monotonic() + _EPOCH_SHIFT
+
+
+class TranscriptFile(object):
+    """
+    append-only, memory-mapped transcript file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER.size
+        self._file = open(path, 'r+b' if exists else 'w+b')
+        if exists:
+            magic, version, self._used = HEADER.unpack(self._file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError('{} is not a transcript file'.format(path))
+        else:
+            self._used = HEADER.size
+            self._file.write(HEADER.pack(MAGIC, VERSION, self._used))
+        self._file.truncate(max(os.path.getsize(path), self._used + GROWTH))
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._index = open(path + '.idx', 'ab')
+        self._frames = 0
+
+    def append(self, ts, direction, data):
+        size = FRAME.size + len(data)
+        if self._used + size > len(self._map):
+            self._grow(size)
+        offset = self._used
+        FRAME.pack_into(self._map, offset, ts, direction, len(data))
+        self._map[offset + FRAME.size:offset + size] = data
+        self._used += size
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, self._used)
+        if self._frames % INDEX_EVERY == 0:
+            self._index.write(INDEX_ENTRY.pack(ts, offset))
+            self._index.flush()
+        self._frames += 1
+
+    def _grow(self, size):
+        self._map.close()
+        self._file.truncate(self._used + max(size, GROWTH))
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def close(self):
+        if self._map.closed:
+            return
+        self._map.flush()
+        self._map.close()
+        self._file.truncate(self._used)
+        self._file.close()
+        self._index.close()
+
+
+class Transcript(object):
+    """
+    ring of the last maxlen exchanged lines, replacing the unbounded Connector history list
+    """
+
+    def __init__(self, maxlen=1000, path=None):
+        self._ring = collections.deque(maxlen=maxlen)
+        self._file = TranscriptFile(path) if path else None
+        # the reader thread records the reports while a caller records its command
+        self._lock = threading.Lock()
+
+    def record(self, direction, data):
+        with self._lock:
+            ts = timestamp()
+            self._ring.append((ts, direction, data))
+            if self._file is not None:
+                self._file.append(ts, direction, data)
+
+    def sent(self, data):
+        self.record(SEND, data)
+
+    def received(self, data):
+        self.record(READ, data)
+
+    def __iter__(self):
+        return iter(self._ring)
+
+    def __len__(self):
+        return len(self._ring)
+
+    def lines(self):
+        return ['{}: {}'.format(DIRECTIONS[direction], data.decode(errors='replace'))
+                for _, direction, data in self._ring]
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+
+
+class TranscriptReader(object):
+    """
+    random access to a transcript file without loading it
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._used = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a transcript file'.format(path))
+        index = open(path + '.idx', 'rb').read() if os.path.exists(path + '.idx') else b''
+        entries = [INDEX_ENTRY.unpack_from(index, i) for i in range(0, len(index), INDEX_ENTRY.size)]
+        self._index_ts = [ts for ts, _ in entries]
+        self._index_offsets = [offset for _, offset in entries]
+
+    def _start_offset(self, start):
+        position = bisect.bisect_left(self._index_ts, start) - 1
+        if position < 0:
+            return HEADER.size
+        return self._index_offsets[position]
+
+    def frames(self, start=None, end=None):
+        """
+        :param start: first timestamp included, defaults to the beginning of the file
+        :param end: last timestamp included, defaults to the end of the file
+        :return: generator of (timestamp, direction, bytes)
+        """
+        offset = HEADER.size if start is None else self._start_offset(start)
+        while offset < self._used:
+            ts, direction, length = FRAME.unpack_from(self._map, offset)
+            offset += FRAME.size
+            if end is not None and ts > end:
+                return
+            if start is None or ts >= start:
+                yield ts, direction, self._map[offset:offset + length]
+            offset += length
+
+    def command_latencies(self, start=None, end=None):
+        """
+        pair every sent command with the final result code answering it
+        :return: generator of (timestamp, command, final result line, latency in seconds)
+        """
+        pending = None
+        for ts, direction, data in self.frames(start, end):
+            line = data.decode(errors='replace')
+            if direction == SEND:
+                pending = (ts, line)
+            elif pending is not None and final_result(line) is not None:
+                yield pending[0], pending[1], line, ts - pending[0]
+                pending = None
+
+    def close(self):
+        self._map.close()
+
+
+def latency_report(path, start=None, end=None):
+    """
+    :return: dict command -> count, median and max latency in ms
+    """
+    reader = TranscriptReader(path)
+    latencies = collections.defaultdict(list)
+    for _, command, _, latency in reader.command_latencies(start, end):
+        latencies[command].append(latency * 1000)
+    reader.close()
+    return {command: {'count': len(values),
+                      'p50_ms': round(statistics.median(values), 3),
+                      'max_ms': round(max(values), 3)}
+            for command, values in latencies.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='extract a time window or command latencies from a transcript')
+    parser.add_argument('path')
+    parser.add_argument('--start', type=float)
+    parser.add_argument('--end', type=float)
+    parser.add_argument('--latency', action='store_true', help='report per command latency')
+    args = parser.parse_args()
+    if args.latency:
+        print(json.dumps(latency_report(args.path, args.start, args.end), indent=2))
+        return
+    reader = TranscriptReader(args.path)
+    for ts, direction, data in reader.frames(args.start, args.end):
+        print('{:.6f} {}: {}'.format(ts, DIRECTIONS[direction], data.decode(errors='replace')))
+    reader.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+separation of unsolicited result codes (URC) from command responses, and their fan out to subscribers
+"""
+import itertools
+import logging
+import queue
+import threading
+
+from .transcript import timestamp
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+URC_PREFIXES = frozenset([
+    '+CREG:', '+CGREG:', '+CEREG:', '+C5GREG:', '+CGEV:', '+CPIN:', 'RING', '+CRING:', '+CMTI:', '+CMT:',
+    '+CDS:', '+CDSI:', '+CBM:', '+CUSD:', '+CIEV:', '+CTZV:', '+CTZE:', '+CLIP:', '+CCWA:', '+CSSI:', '+CSSU:',
+    '+CIREGU:', '+CMCCSI:',
+])
+
+RAW_URC_PREFIXES = frozenset(prefix.encode() for prefix in URC_PREFIXES)
+URC_FIRST_BYTES = frozenset(prefix.encode()[:1] for prefix in URC_PREFIXES)
+
+
+def urc_prefix(line):
+    """
+    :return: the '+NAME:' (or bare 'RING') prefix of a line
+    """
+    if line.startswith('+'):
+        return line[:line.find(':') + 1] or line
+    return line
+
+
+def raw_urc_prefix(raw):
+    """
+    urc_prefix of an undecoded line
+    """
+    if raw[:1] == b'+':
+        return raw[:raw.find(b':') + 1] or raw
+    return raw
+
+
+def response_prefixes(command):
+    """
+    information prefixes a command line is expected to answer with
+    'AT+CPIN?;+CREG?' -> {'+CPIN:', '+CREG:'}
+    """
+    prefixes = set()
+    for part in command[2:].split(';'):
+        if part.startswith('+'):
+            end = len(part)
+            for separator in '=?':
+                position = part.find(separator)
+                if position != -1:
+                    end = min(end, position)
+            prefixes.add(part[:end] + ':')
+    return frozenset(prefixes)
+
+
+REGISTRATION_PREFIXES = frozenset(['+CREG:', '+CGREG:', '+CEREG:', '+C5GREG:'])
+
+
+def is_registration_report(line):
+    """
+    a read answer starts with <n>,<stat> while the URC starts with <stat> followed by nothing or "<lac>"
+    """
+    fields = line[line.find(':') + 1:].split(',', 2)
+    return len(fields) < 2 or fields[1].strip().startswith('"')
+
+
+def is_unsolicited(line, expected=frozenset()):
+    """
+    :param line:
+    :param expected: prefixes of the command in flight, which stay solicited
+    """
+    prefix = urc_prefix(line)
+    if prefix not in URC_PREFIXES:
+        return False
+    if prefix not in expected:
+        return True
+    return prefix in REGISTRATION_PREFIXES and is_registration_report(line)
+
+
+class Subscription(object):
+
+    def __init__(self, subscription_id, prefixes=None, maxsize=1000):
+        self.id = subscription_id
+        self.prefixes = frozenset(prefixes) if prefixes else None
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def wants(self, prefix):
+        return self.prefixes is None or prefix in self.prefixes
+
+    def put(self, event):
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                # a slow subscriber loses its oldest events, never blocks the port reader
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=0, max_items=100):
+        """
+        :param timeout: seconds to wait for the first event, 0 returns immediately
+        :param max_items:
+        :return: list of (timestamp, line)
+        """
+        events = []
+        try:
+            events.append(self.queue.get(timeout=timeout) if timeout else self.queue.get_nowait())
+            while len(events) < max_items:
+                events.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return events
+
+
+class UrcDispatcher(object):
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._listeners = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self, prefixes=None, maxsize=1000):
+        """
+        :param prefixes: URC prefixes to receive (e.g. ['+CREG:', 'RING']), all when None
+        :param maxsize: events kept for the subscriber
+        :return: Subscription
+        """
+        with self._lock:
+            subscription = Subscription(next(self._ids), prefixes, maxsize)
+            self._subscriptions[subscription.id] = subscription
+        return subscription
+
+    def unsubscribe(self, subscription_id):
+        with self._lock:
+            return self._subscriptions.pop(subscription_id, None) is not None
+
+    def add_listener(self, callback):
+        """
+        :param callback: called with (prefix, line) for every URC, on the thread reading the port; must not block
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def get(self, subscription_id):
+        subscription = self._subscriptions.get(subscription_id)
+        if subscription is None:
+            raise KeyError('unknown URC subscription {}'.format(subscription_id))
+        return subscription
+
+    def dispatch(self, line):
+        logger.debug('URC : {}'.format(line))
+        prefix = urc_prefix(line)
+        event = (timestamp(), line)
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(prefix, line)
+        for subscription in subscriptions:
+            if subscription.wants(prefix):
+                subscription.put(event)
@@ -0,0 +1,246 @@
+"""
+one thread per modem running the calls made on that modem, so a slow command only delays its own port.
+
+queued calls are scheduled by priority class first (interactive reads before long running sets), then
+round-robin between the callers of a class, so a client queuing many calls does not starve the others.
+a call already running on the port is never interrupted: the modem answers one command at a time.
+"""
+import collections
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from .commands.common.exceptions import CommandQueueFull
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+INTERACTIVE = 0
+LONG_RUNNING = 1
+PRIORITIES = (INTERACTIVE, LONG_RUNNING)
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', LONG_RUNNING: 'long_running'}
+
+_ticket_ids = itertools.count(1)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+
+def summarize(values):
+    """
+    :return: dict p50/p95/max in ms of durations in seconds
+    """
+    summary = dict(('p{}'.format(q), round(percentile(values, q) * 1000, 3)) for q in (50, 95))
+    summary['max'] = round(max(values) * 1000, 3) if values else 0
+    return summary
+
+
+class Ticket(Future):
+    """
+    future of a queued call, with its scheduling details
+    """
+
+    def __init__(self, func, args, kwargs, priority, caller, name):
+        Future.__init__(self)
+        self.id = next(_ticket_ids)
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.caller = caller
+        self.name = name or getattr(func, '__name__', repr(func))
+        self.queued_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def queue_wait(self):
+        return (self.started_at or time.monotonic()) - self.queued_at
+
+    @property
+    def execution(self):
+        if self.started_at is None:
+            return 0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def describe(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'priority': PRIORITY_NAMES.get(self.priority, self.priority),
+            'caller': str(self.caller),
+            'waiting_s': round(self.queue_wait, 3),
+        }
+
+
+class ModemWorker(object):
+
+    def __init__(self, name, max_queued=32, max_queued_per_caller=8, stats_size=1000):
+        """
+        :param max_queued: calls waiting on the port above which new calls are refused
+        :param max_queued_per_caller: same limit for a single caller
+        :param stats_size: (queue wait, execution) samples kept per call name
+        """
+        self.name = name
+        self.max_queued = max_queued
+        self.max_queued_per_caller = max_queued_per_caller
+        self._condition = threading.Condition()
+        self._queues = dict((priority, collections.OrderedDict()) for priority in PRIORITIES)
+        self._queued = {}
+        self._stopping = False
+        self._thread = None
+        self._current = None
+        self._samples = collections.defaultdict(lambda: collections.deque(maxlen=stats_size))
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._loop, name='modem-worker-{}'.format(self.name))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        stop once the calls already queued have run
+        """
+        if not self.running:
+            return
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join()
+        self._thread = None
+
+    def schedule(self, func, args=(), kwargs=None, priority=INTERACTIVE, caller=None, name=None):
+        """
+        :param priority: INTERACTIVE or LONG_RUNNING
+        :param caller: identity of the client, callers of a priority class are served round-robin
+        :param name: name of the call in stats and queue listings, the function name by default
+        :return: Ticket, the concurrent.futures.Future of func(*args, **kwargs) run on the worker thread
+        """
+        if priority not in self._queues:
+            raise ValueError('unknown priority {}'.format(priority))
+        ticket = Ticket(func, args, kwargs or {}, priority, caller, name)
+        with self._condition:
+            if len(self._queued) >= self.max_queued:
+                raise CommandQueueFull('{} calls already queued on modem {}'.format(len(self._queued), self.name))
+            tickets = self._queues[priority].setdefault(caller, collections.deque())
+            if len(tickets) >= self.max_queued_per_caller:
+                raise CommandQueueFull('{} calls already queued by {} on modem {}'.format(
+                    len(tickets), caller, self.name))
+            tickets.append(ticket)
+            self._queued[ticket.id] = ticket
+            self._condition.notify()
+        return ticket
+
+    def submit(self, func, *args, **kwargs):
+        """
+        :return: concurrent.futures.Future of func(*args, **kwargs) run on the worker thread
+        """
+        return self.schedule(func, args, kwargs)
+
+    def run(self, func, args=(), kwargs=None, priority=INTERACTIVE, caller=None, name=None):
+        """
+        schedule func and wait for its result, or run it inline when the worker is not started or the
+        caller already is the worker thread
+        """
+        if not self.running or threading.current_thread() is self._thread:
+            return func(*args, **(kwargs or {}))
+        return self.schedule(func, args, kwargs, priority, caller, name).result()
+
+    def call(self, func, *args, **kwargs):
+        return self.run(func, args, kwargs)
+
+    def cancel(self, ticket_id):
+        """
+        cancel a call still waiting in the queue, its caller gets a CancelledError
+        :return: True when the call was removed, False when it already started or is unknown
+        """
+        with self._condition:
+            ticket = self._queued.pop(ticket_id, None)
+            if ticket is None:
+                return False
+            callers = self._queues[ticket.priority]
+            callers[ticket.caller].remove(ticket)
+            if not callers[ticket.caller]:
+                del callers[ticket.caller]
+        ticket.cancel()
+        logger.debug('cancelled {} queued by {} on modem {}'.format(ticket.name, ticket.caller, self.name))
+        return True
+
+    def queued(self):
+        """
+        :return: descriptions of the running call (first, when any) and of the queued ones, in queue order
+        """
+        with self._condition:
+            tickets = sorted(self._queued.values(), key=lambda ticket: (ticket.priority, ticket.id))
+            current = self._current
+        descriptions = [ticket.describe() for ticket in tickets]
+        if current is not None:
+            running = current.describe()
+            running['running_s'] = round(current.execution, 3)
+            descriptions.insert(0, running)
+        return descriptions
+
+    def stats(self):
+        """
+        :return: dict call name -> count, queue_wait_ms and execution_ms summaries
+        """
+        with self._condition:
+            samples = dict((name, list(values)) for name, values in self._samples.items())
+        stats = {}
+        for name, values in samples.items():
+            stats[name] = {
+                'count': len(values),
+                'queue_wait_ms': summarize([wait for wait, _ in values]),
+                'execution_ms': summarize([execution for _, execution in values]),
+            }
+        return stats
+
+    def _next(self):
+        for priority in PRIORITIES:
+            callers = self._queues[priority]
+            if not callers:
+                continue
+            caller, tickets = callers.popitem(last=False)
+            ticket = tickets.popleft()
+            if tickets:
+                # the caller goes back at the end of the round
+                callers[caller] = tickets
+            del self._queued[ticket.id]
+            return ticket
+        return None
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                ticket = self._next()
+                while ticket is None:
+                    if self._stopping:
+                        return
+                    self._condition.wait()
+                    ticket = self._next()
+                if not ticket.set_running_or_notify_cancel():
+                    continue
+                ticket.started_at = time.monotonic()
+                self._current = ticket
+            try:
+                ticket.set_result(ticket.func(*ticket.args, **ticket.kwargs))
+            except BaseException as e:
+                ticket.set_exception(e)
+            finally:
+                ticket.finished_at = time.monotonic()
+                with self._condition:
+                    self._current = None
+                    self._samples[ticket.name].append((ticket.queue_wait, ticket.execution))
@@ -0,0 +1,102 @@
+"""
+cost of a high rate polling load (AT+CPIN?, AT+CPAS, AT+CSQ, AT+CREG? per poll, answered by a canned connector):
+commands reused from a CommandCatalog against a fresh command per call rebuilding its tables, as the former
+constructors did
+
+    python -m benchmark.bench_catalog [--polls 20000]
+"""
+import argparse
+import time
+import tracemalloc
+
+from at.server.commands.catalog import CommandCatalog
+from at.server.commands.common.at_mobile_controller import CPAS, CPIN, CSQ
+from at.server.commands.common.at_network_handler import CREG
+from at.server.response import Response
+
+RESPONSES = {
+    'AT+CPIN?': [b'+CPIN: READY', b'OK'],
+    'AT+CPAS': [b'+CPAS: 0', b'OK'],
+    'AT+CSQ': [b'+CSQ: 20,0', b'OK'],
+    'AT+CREG?': [b'+CREG: 2,1,"00C3","0A1B2C3",7', b'OK'],
+}
+
+
+class CannedConnector(object):
+
+    def run(self, command, timeout, exception, message):
+        return Response(RESPONSES[command])
+
+
+class FreshCPIN(CPIN):
+    def __init__(self, serial_target, timeout):
+        super(FreshCPIN, self).__init__(serial_target, timeout)
+        self.expected_values = dict(CPIN.expected_values)
+
+
+class FreshCPAS(CPAS):
+    def __init__(self, serial_target, timeout):
+        super(FreshCPAS, self).__init__(serial_target, timeout)
+        self.expected_values = dict(CPAS.expected_values)
+
+
+class FreshCSQ(CSQ):
+    def __init__(self, serial_target, timeout):
+        super(FreshCSQ, self).__init__(serial_target, timeout)
+        self.bit_error_rates = dict(CSQ.bit_error_rates)
+
+
+class FreshCREG(CREG):
+    def __init__(self, serial_target, timeout):
+        super(FreshCREG, self).__init__(serial_target, timeout)
+        self.expected_values = [dict(table) for table in CREG.expected_values]
+
+
+def fresh_poll(connector):
+    return (FreshCPIN(connector, 180).read(), FreshCPAS(connector, 180).get(), FreshCSQ(connector, 50).get(),
+            FreshCREG(connector, 180).read())
+
+
+def catalog_poll(catalog):
+    return (catalog.get(CPIN, 180).read(), catalog.get(CPAS, 180).get(), catalog.get(CSQ, 50).get(),
+            catalog.get(CREG, 180).read())
+
+
+def measure(poll, polls):
+    poll()
+    started = time.perf_counter()
+    for _ in range(polls):
+        poll()
+    elapsed = (time.perf_counter() - started) / polls
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(100):
+        poll()
+    # memory still held after the polls, then the transient footprint of a single poll
+    retained = (tracemalloc.get_traced_memory()[0] - before) / 100.0
+    tracemalloc.reset_peak()
+    poll()
+    peak = tracemalloc.get_traced_memory()[1] - tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed * 1e6, peak, retained
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--polls', type=int, default=20000)
+    args = parser.parse_args()
+    connector = CannedConnector()
+    catalog = CommandCatalog(connector)
+    for name, poll in (('fresh commands', lambda: fresh_poll(connector)),
+                       ('catalog', lambda: catalog_poll(catalog))):
+        per_poll, peak, retained = measure(poll, args.polls)
+        print('{:<15} {:>7.2f} us/poll   {:>6} B peak per poll   {:>6.1f} B retained per poll'.format(
+            name, per_poll, peak, retained))
+    print('instance size: CPIN {} B with __slots__, {} B with a __dict__ and its tables'.format(
+        CPIN(connector, 1).__sizeof__(),
+        FreshCPIN(connector, 1).__sizeof__() + FreshCPIN(connector, 1).__dict__.__sizeof__()
+        + FreshCPIN(connector, 1).expected_values.__sizeof__()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+end-to-end latency of the exposed ATServer methods: a local ATServer on an emulated modem, called over Pyro
+
+    python -m benchmark.bench_e2e [--iterations 200] [--profile profile.json] [--output result.json]
+                                  [--compare previous.json]
+
+per method, p50/p95/p99 in ms of :
+    serial_write, time_to_first_byte, response_transfer, final_result_detection   (Connector.timing)
+    parse          server method time not spent in Connector.execute (parse_output and server overhead)
+    serialization  Pyro serializer dumps + loads of the result
+    network        what remains of the client round trip (sockets, Pyro protocol, dispatch)
+    total          client round trip
+"""
+import argparse
+import collections
+import functools
+import json
+import platform
+import threading
+import time
+
+import Pyro4
+import Pyro4.util
+
+from at.server.at_server import ATServer, AT_VERSION
+from at.server.emulator import ModemEmulator, load_profile
+from at.server.worker import percentile
+
+METHODS = ['get_signal_quality', 'read_pin_status', 'report_phone_activity_status',
+           'get_network_registration_params', 'get_product_informations', 'poll_status']
+PHASES = ['serial_write', 'time_to_first_byte', 'response_transfer', 'final_result_detection', 'parse',
+          'serialization', 'network', 'total']
+
+
+def summarize(values):
+    return dict(('p{}'.format(q), round(percentile(values, q) * 1000, 3)) for q in (50, 95, 99))
+
+
+class Recorder(object):
+    """
+    collects the Connector timings and server method durations of the call in progress
+    """
+
+    def __init__(self, server):
+        self.server_time = 0
+        self.serial = collections.defaultdict(float)
+        server.connector.on_timing = self.on_timing
+        for method in METHODS:
+            setattr(server, method, self.timed(getattr(server, method)))
+
+    def reset(self):
+        self.server_time = 0
+        self.serial.clear()
+
+    def on_timing(self, command, timing):
+        for phase, value in timing.items():
+            self.serial[phase] += value
+
+    def timed(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.server_time += time.perf_counter() - started
+        return wrapper
+
+
+def serialization_time(serializer, value):
+    started = time.perf_counter()
+    serializer.loads(serializer.dumps(value))
+    return time.perf_counter() - started
+
+
+def run(iterations, profile=None):
+    Pyro4.config.REQUIRE_EXPOSE = True
+    with ModemEmulator(profile) as emulator:
+        server = ATServer('127.0.0.1', emulator.port)
+        server.open()
+        server.get_ue()
+        recorder = Recorder(server)
+        daemon = Pyro4.Daemon(host='127.0.0.1', port=0)
+        uri = daemon.register(server, objectId=ATServer.PYRO_SEREVR_NAME)
+        server.daemon = daemon
+        server.running = True
+        loop = threading.Thread(target=daemon.requestLoop, kwargs={'loopCondition': lambda: server.running})
+        loop.daemon = True
+        loop.start()
+        serializer = Pyro4.util.get_serializer(Pyro4.config.SERIALIZER)
+        results = {}
+        try:
+            with Pyro4.Proxy(uri) as proxy:
+                proxy._pyroBind()
+                for method in METHODS:
+                    samples = collections.defaultdict(list)
+                    started = time.perf_counter()
+                    for _ in range(iterations):
+                        recorder.reset()
+                        call_started = time.perf_counter()
+                        value = getattr(proxy, method)()
+                        total = time.perf_counter() - call_started
+                        serial_time = sum(recorder.serial.values())
+                        serialized = serialization_time(serializer, value)
+                        for phase, duration in recorder.serial.items():
+                            samples[phase].append(duration)
+                        samples['parse'].append(max(0, recorder.server_time - serial_time))
+                        samples['serialization'].append(serialized)
+                        samples['network'].append(max(0, total - recorder.server_time - serialized))
+                        samples['total'].append(total)
+                    elapsed = time.perf_counter() - started
+                    results[method] = {
+                        'iterations': iterations,
+                        'throughput_per_s': round(iterations / elapsed, 2),
+                        'latency_ms': dict((phase, summarize(samples[phase])) for phase in PHASES),
+                    }
+        finally:
+            server.running = False
+            daemon.shutdown()
+            loop.join()
+            server.close()
+    return {
+        'at_version': AT_VERSION,
+        'python': platform.python_version(),
+        'serializer': Pyro4.config.SERIALIZER,
+        'profile': profile or 'default',
+        'methods': results,
+    }
+
+
+def compare(current, previous):
+    """
+    :return: dict method -> phase -> relative p50 / p99 change, positive when slower
+    """
+    changes = {}
+    for method, result in current['methods'].items():
+        before = previous.get('methods', {}).get(method)
+        if before is None:
+            continue
+        changes[method] = {}
+        for phase in PHASES:
+            now, then = result['latency_ms'][phase], before['latency_ms'][phase]
+            changes[method][phase] = dict(
+                (q, round((now[q] - then[q]) / then[q], 3) if then[q] else None) for q in ('p50', 'p99'))
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--profile', help='emulator JSON profile')
+    parser.add_argument('--output', help='write the result JSON to this file')
+    parser.add_argument('--compare', help='previous result JSON to compare against')
+    args = parser.parse_args()
+    result = run(args.iterations, load_profile(args.profile) if args.profile else None)
+    if args.compare:
+        with open(args.compare) as f:
+            result['comparison'] = compare(result, json.load(f))
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
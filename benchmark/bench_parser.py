@@ -0,0 +1,89 @@
+"""
+response parsing cost: the grammar parser (ResponseSchema, parse_batch) against the split based parsers it replaced,
+both given a fresh Response per call, as returned by Connector.run
+
+    python -m benchmark.bench_parser [--iterations 20000]
+"""
+import argparse
+import timeit
+
+from at.server.commands.grammar import parse_batch
+from at.server.commands.common.at_mobile_controller import CPAS, CPIN, CSQ
+from at.server.commands.common.at_network_handler import CREG
+from at.server.response import Response
+from at.server.urc import urc_prefix
+
+SINGLE = {
+    'AT+CSQ': [b'AT+CSQ', b'+CSQ: 20,0', b'OK'],
+    'AT+CREG?': [b'AT+CREG?', b'+CREG: 2,1,"00C3","0A1B2C3",7', b'OK'],
+}
+BATCH = [b'+CPIN: READY', b'+CPAS: 0', b'+CSQ: 20,0', b'+CREG: 2,1', b'OK']
+
+
+def legacy_csq(values):
+    # split parsing of CSQ.parse_rssi_and_ber before the grammar, values only
+    for value in values:
+        if '+CSQ:' in value:
+            rssi, ber = value.split(': ')[-1].split(',')
+            return int(rssi), int(ber)
+
+
+def legacy_creg(values):
+    # CREG.parse_output before the grammar, which failed on '+CREG: <n>,<stat>,<lac>,<ci>,<AcT>'
+    for value in values:
+        if '+CREG: ' in value:
+            fields = value.split(': ')[-1].split(',')
+            return int(fields[0]), int(fields[1])
+
+
+def legacy_single(command, values):
+    return legacy_csq(values) if command == 'AT+CSQ' else legacy_creg(values)
+
+
+def legacy_cpin(values):
+    for value in values:
+        if '+CPIN:' in value:
+            return value.split(': ')[-1]
+
+
+def legacy_cpas(values):
+    for value in values:
+        if '+CPAS:' in value:
+            return int(value.split(': ')[-1])
+
+
+def legacy_batch(output):
+    # BatchExecutor before the grammar: slice the lines per prefix, then every parser scans its slice
+    parsers = (('+CPIN:', legacy_cpin), ('+CPAS:', legacy_cpas), ('+CSQ:', legacy_csq), ('+CREG:', legacy_creg))
+    slices = dict((prefix, []) for prefix, _ in parsers)
+    for line in output[:-1]:
+        prefix = urc_prefix(line)
+        if prefix in slices:
+            slices[prefix].append(line)
+    return [parser(slices[prefix] + output[-1:]) for prefix, parser in parsers]
+
+
+def per_call(statement, iterations):
+    return min(timeit.repeat(statement, number=iterations, repeat=3)) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+    schemas = {'AT+CSQ': CSQ.RESPONSE, 'AT+CREG?': CREG.RESPONSE}
+    for command, output in SINGLE.items():
+        schema = schemas[command]
+        grammar = per_call(lambda: schema.parse(Response(output)), args.iterations)
+        legacy = per_call(lambda: legacy_single(command, Response(output)), args.iterations)
+        print('{:<10} grammar {:>6.2f} us   split {:>6.2f} us   x{:.2f}'.format(
+            command, grammar, legacy, legacy / grammar))
+    batch_schemas = [CPIN.RESPONSE, CPAS.RESPONSE, CSQ.RESPONSE, CREG.RESPONSE]
+    grammar = per_call(lambda: parse_batch(batch_schemas, Response(BATCH)), args.iterations)
+    legacy = per_call(lambda: legacy_batch(Response(BATCH)), args.iterations)
+    print('{:<10} grammar {:>6.2f} us   slice + split {:>6.2f} us   x{:.2f}'.format(
+        'batch(4)', grammar, legacy, legacy / grammar))
+
+
+if __name__ == '__main__':
+    main()
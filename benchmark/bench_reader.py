@@ -0,0 +1,62 @@
+"""
+latency of Connector.read_command against a simulated modem, compared with the former 0.3 s polling loop
+
+    python -m benchmark.bench_reader [--latency 0.02] [--iterations 20]
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from at.server.serial_connector import Connector
+from .simulated import SimulatedPort
+
+RESPONSES = {
+    'AT+CSQ': ['+CSQ: 20,0', 'OK'],
+    'AT+CPIN?': ['+CME ERROR: 10'],
+}
+
+
+def legacy_read_command(port, timeout):
+    # the polling reader Connector.read_command used before, with the 2 s port timeout it relied on
+    output = []
+    wait_until = datetime.now() + timedelta(seconds=int(timeout))
+    while wait_until > datetime.now():
+        output += [x.decode().rstrip('\r\n') for x in port.readlines()]
+        if len(output) > 0:
+            if True in ['OK' in value for value in output]:
+                return output
+            if True in ['ERROR' in value for value in output]:
+                return {'error': output}
+        time.sleep(0.3)
+    return output
+
+
+def measure(read, port, command, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        port.write((command + '\r\n').encode())
+        read()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {'p50_ms': round(statistics.median(samples), 2), 'max_ms': round(max(samples), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+    for command in RESPONSES:
+        port = SimulatedPort(RESPONSES, latency=args.latency, timeout=Connector.READ_TIMEOUT)
+        connector = Connector(com_id='SIM')
+        connector._ser = port
+        new = measure(lambda: connector.read_command(timeout=5), port, command, args.iterations)
+        port = SimulatedPort(RESPONSES, latency=args.latency, timeout=2)
+        old = measure(lambda: legacy_read_command(port, timeout=5), port, command, max(2, args.iterations // 10))
+        print('{:<10} modem latency {:>5.0f} ms   streaming p50 {:>8.2f} ms   polling p50 {:>8.2f} ms'.format(
+            command, args.latency * 1000, new['p50_ms'], old['p50_ms']))
+
+
+if __name__ == '__main__':
+    main()
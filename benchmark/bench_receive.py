@@ -0,0 +1,108 @@
+"""
+receive path cost on large responses (AT+CLAC, AT+COPS=?) : bytes-native Connector.read_command against
+the str based path it replaced (decode every line on arrival, history entries re-encoded)
+
+    python -m benchmark.bench_receive [--iterations 200] [--chunk 64]
+"""
+import argparse
+import time
+import tracemalloc
+
+from at.server.response import final_result, ERROR
+from at.server.serial_connector import Connector
+from at.server.transcript import Transcript
+
+
+def clac_response(commands=600):
+    lines = ['AT+C{:04d}'.format(i) for i in range(commands)] + ['OK']
+    return ''.join('\r\n{}\r\n'.format(line) for line in lines).encode()
+
+
+def cops_scan_response(operators=40):
+    records = ','.join('(1,"Operator {0}","OP{0}","001{0:02d}",7)'.format(i) for i in range(operators))
+    return '\r\n+COPS: {},,(0,1,2,3,4),(0,1,2)\r\n\r\nOK\r\n'.format(records).encode()
+
+
+class ChunkedPort(object):
+
+    def __init__(self, data, chunk):
+        self.chunks = [data[i:i + chunk] for i in range(0, len(data), chunk)]
+        self.position = 0
+
+    def rewind(self):
+        self.position = 0
+
+    @property
+    def in_waiting(self):
+        return len(self.chunks[self.position]) if self.position < len(self.chunks) else 0
+
+    def read(self, size=1):
+        if self.position >= len(self.chunks):
+            return b''
+        self.position += 1
+        return self.chunks[self.position - 1]
+
+
+class StrLineSplitter(object):
+    # the splitter used before the bytes-native path
+    def __init__(self):
+        self._pending = b''
+
+    def feed(self, chunk):
+        data = self._pending + chunk
+        lines = data.split(b'\n')
+        self._pending = lines.pop()
+        return [line for line in (raw.rstrip(b'\r').decode('ascii', errors='replace') for raw in lines) if line]
+
+
+def previous_read_command(port, history):
+    splitter = StrLineSplitter()
+    output = []
+    while True:
+        chunk = port.read(port.in_waiting or 1)
+        lines = splitter.feed(chunk)
+        for line in lines:
+            history.received(line.encode())
+        for line in lines:
+            output.append(line)
+            code = final_result(line)
+            if code is ERROR:
+                return {'error': output}
+            if code is not None:
+                return output
+
+
+def measure(read, port, iterations):
+    port.rewind()
+    read()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        port.rewind()
+        read()
+    elapsed = (time.perf_counter() - started) / iterations
+    port.rewind()
+    tracemalloc.start()
+    read()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed * 1e6, peak / 1024.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--chunk', type=int, default=64, help='bytes per port read, 64 for a USB full speed packet')
+    args = parser.parse_args()
+    for name, data in (('AT+CLAC', clac_response()), ('AT+COPS=?', cops_scan_response())):
+        port = ChunkedPort(data, args.chunk)
+        connector = Connector(com_id='BENCH')
+        connector._ser = port
+        new = measure(lambda: connector.read_command(timeout=5), port, args.iterations)
+        history = Transcript()
+        old = measure(lambda: previous_read_command(port, history), port, args.iterations)
+        print('{:<10} {:>6} bytes  bytes-native {:>8.1f} us {:>7.1f} KiB peak   str path {:>8.1f} us {:>7.1f} KiB peak'
+              .format(name, len(data), new[0], new[1], old[0], old[1]))
+
+
+if __name__ == '__main__':
+    main()
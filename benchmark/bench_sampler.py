@@ -0,0 +1,48 @@
+"""
+cost of fetching an hour of signal samples (10 per second): one signal_samples / signal_statistics call on a full
+SampleRing, against the serpent round trip of one get_signal_quality result per sample
+
+    python -m benchmark.bench_sampler [--samples 36000]
+"""
+import argparse
+import random
+import time
+
+from Pyro4.util import get_serializer
+
+from at.server.records import SignalQuality, typed
+from at.server.sampler import SignalSampler, import_samples, sample_row
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', type=int, default=36000)
+    args = parser.parse_args()
+    serializer = get_serializer('serpent')
+    sampler = SignalSampler(None, None, capacity=args.samples)
+    qualities = [SignalQuality(random.randint(5, 31), random.choice((0, 1, 2, 99))) for _ in range(args.samples)]
+    for second, quality in enumerate(qualities):
+        sampler.ring.append((second * 0.1,) + sample_row(quality))
+
+    started = time.perf_counter()
+    for quality in qualities:
+        data, compressed = serializer.serializeData(quality)
+        typed('get_signal_quality', serializer.deserializeData(data, compressed))
+    per_sample = time.perf_counter() - started
+    print('{} get_signal_quality results  {:>8.1f} ms serialization, plus {} Pyro round trips'.format(
+        args.samples, per_sample * 1000, args.samples))
+
+    started = time.perf_counter()
+    data, compressed = serializer.serializeData(sampler.export())
+    samples = import_samples(serializer.deserializeData(data, compressed))
+    bulk = time.perf_counter() - started
+    print('signal_samples                 {:>8.1f} ms for {} samples, {} B, 1 round trip'.format(
+        bulk * 1000, len(samples), len(data)))
+
+    started = time.perf_counter()
+    sampler.statistics()
+    print('signal_statistics              {:>8.1f} ms'.format((time.perf_counter() - started) * 1000))
+
+
+if __name__ == '__main__':
+    main()
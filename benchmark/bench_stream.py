@@ -0,0 +1,103 @@
+"""
+peak memory of a large multi-line response (AT+CLAC) and of a long AT+COPS=? list: parsed once received whole, as
+Connector.run returns it, against streamed (AtCommand.stream), from a port generating the response 4 KB at a time
+
+    python -m benchmark.bench_stream [--lines 100000] [--operators 20000]
+"""
+import argparse
+import time
+import tracemalloc
+
+from at.server.commands.common.at_mobile_controller import CLAC
+from at.server.commands.common.at_network_handler import COPS
+from at.server.serial_connector import Connector
+
+
+class GeneratedPort(object):
+    """
+    serial.Serial stand-in answering every command with the chunks of a generated response, never held whole
+    """
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.is_open = True
+        self.port = 'GENERATED'
+        self._chunks = iter(())
+        self._next = b''
+
+    def write(self, data):
+        self._chunks = self.answer(data.decode().strip())
+        self._next = next(self._chunks, b'')
+        return len(data)
+
+    def flush(self):
+        pass
+
+    @property
+    def in_waiting(self):
+        return len(self._next)
+
+    def read(self, size=1):
+        chunk, self._next = self._next, next(self._chunks, b'')
+        return chunk
+
+    def reset_input_buffer(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+def chunked(pieces, size=4096):
+    chunk = bytearray()
+    for piece in pieces:
+        chunk += piece
+        if len(chunk) >= size:
+            yield bytes(chunk)
+            chunk = bytearray()
+    yield bytes(chunk)
+
+
+def answer(lines, operators):
+    def generate(command):
+        if command == 'AT+CLAC':
+            pieces = ('\r\nAT+CMD{}\r\n'.format(index).encode() for index in range(lines))
+        else:
+            pieces = ('{}(1,"Operator {}","OP{}","{:05d}",7)'.format(
+                '\r\n+COPS: ' if index == 0 else ',', index, index, index).encode() for index in range(operators))
+        return chunked(pieces) if command in ('AT+CLAC', 'AT+COPS=?') else chunked([b'\r\nERROR\r\n'])
+    return lambda command: (piece for generated in (generate(command), [b'\r\nOK\r\n']) for piece in generated)
+
+
+def measure(name, consume):
+    tracemalloc.start()
+    started = time.perf_counter()
+    count = consume()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('{:<28} {:>8} records {:>9.1f} ms  peak {:>9.1f} KB'.format(name, count, elapsed * 1000, peak / 1024.0))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=100000)
+    parser.add_argument('--operators', type=int, default=20000)
+    args = parser.parse_args()
+    port = GeneratedPort(answer(args.lines, args.operators))
+    connector = Connector(com_id='GENERATED', history_size=100)
+    connector.open_port = lambda b=None: port
+    clac, cops = CLAC(connector, 60), COPS(connector, 60)
+
+    def buffered_operators():
+        output = connector.run('AT+COPS=?', 60, Exception, '')
+        return len([record for line in output.raw_lines() for record in cops.stream_records(line)])
+
+    measure('AT+CLAC buffered', lambda: len(clac.parse_output(connector.run('AT+CLAC', 60, Exception, ''))))
+    measure('AT+CLAC streamed', lambda: sum(1 for _ in clac.stream()))
+    measure('AT+COPS=? buffered', buffered_operators)
+    measure('AT+COPS=? streamed', lambda: sum(1 for _ in cops.scan()))
+
+
+if __name__ == '__main__':
+    main()
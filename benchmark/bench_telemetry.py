@@ -0,0 +1,56 @@
+"""
+telemetry store cost: append rate of result records, and range queries over millions of rows (a multi-day run
+of 4 modems sampling the signal quality at 1 Hz, with registration, attach and activity every 10 seconds)
+
+    python -m benchmark.bench_telemetry [--rows 4000000]
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+from at.server.records import ActivityStatus, AttachState, Registration, SignalQuality
+from at.server.telemetry import TelemetryStore
+
+MODEMS = ['/dev/ttyUSB{}'.format(index) for index in range(4)]
+
+
+def fill(store, rows):
+    second = 1700000000.0
+    while store.rows + 1000 < rows:
+        for modem in MODEMS:
+            records = [SignalQuality(20 + int(second) % 10, 0)]
+            if int(second) % 10 == 0:
+                records += [Registration(2, 1, 0xC3, 0xA1B2C3, 7), AttachState(1), ActivityStatus(0)]
+            store.append_records(modem, records, timestamp=second)
+        second += 1
+    store.flush()
+    return second
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=4000000)
+    args = parser.parse_args()
+    path = tempfile.mkdtemp()
+    try:
+        store = TelemetryStore(path)
+        started = time.perf_counter()
+        end = fill(store, args.rows)
+        elapsed = time.perf_counter() - started
+        print('append  {} rows in {:.1f} s, {:.2f} us per row'.format(store.rows, elapsed, elapsed / store.rows * 1e6))
+        store = TelemetryStore(path)
+        for label, kwargs in (('one hour, one modem', dict(modem=MODEMS[1], start=end - 3600 * 24, end=end - 3600 * 23)),
+                              ('one day, one modem', dict(modem=MODEMS[1], start=end - 86400)),
+                              ('whole store, all modems', dict())):
+            started = time.perf_counter()
+            times, values = store.series('SignalQuality.rssi', **kwargs)
+            mean = values.mean()
+            print('query   {:<25} {:>8} values in {:>7.2f} ms (mean {:.2f})'.format(
+                label, len(values), (time.perf_counter() - started) * 1000, mean))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Pyro payload of the poll_status results: the tuples and dicts with descriptions the commands returned before,
+against the result records, size and time per call of the serpent round trip (serialize, deserialize and, for the
+records, typing the values back on the client)
+
+    python -m benchmark.bench_wire [--iterations 20000]
+"""
+import argparse
+import timeit
+
+from Pyro4.util import get_serializer
+
+from at.server.commands.common.at_mobile_controller import CPAS, CPIN, CSQ
+from at.server.commands.common.at_network_handler import CREG
+from at.server.records import ActivityStatus, Registration, SignalQuality, SimStatus, typed
+
+LEGACY = {
+    'read_pin_status': ('READY', CPIN.expected_values['READY']),
+    'report_phone_activity_status': (0, CPAS.expected_values[0]),
+    'get_signal_quality': [
+        {'RSSI value': 20, 'RSSI in dBm': '({}) dBm'.format(-113 + 20 * 2), 'condition': CSQ.get_signal_condition(20)},
+        {'BER Value': 0, 'BER in percent': CSQ.bit_error_rates[0]}],
+    'get_network_registration_params': (2, CREG.expected_values[0][2], 1, CREG.expected_values[1][1]),
+}
+RECORDS = {
+    'read_pin_status': SimStatus('READY'),
+    'report_phone_activity_status': ActivityStatus(0),
+    'get_signal_quality': SignalQuality(20, 0),
+    'get_network_registration_params': Registration(2, 1, 0xC3, 0xA1B2C3, 7),
+}
+
+
+def per_call(statement, iterations):
+    return min(timeit.repeat(statement, number=iterations, repeat=3)) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+    serializer = get_serializer('serpent')
+
+    def round_trip(value):
+        data, compressed = serializer.serializeData(value)
+        return serializer.deserializeData(data, compressed)
+
+    def typed_round_trip(value):
+        return dict((method, typed(method, result)) for method, result in round_trip(value).items())
+
+    for name, payload, call in (('descriptions', LEGACY, round_trip), ('records', RECORDS, typed_round_trip)):
+        size = len(serializer.serializeData(payload)[0])
+        serialize = per_call(lambda: serializer.serializeData(payload), args.iterations)
+        elapsed = per_call(lambda: call(payload), args.iterations)
+        print('{:<13} {:>5} B   serialize {:>6.2f} us   round trip {:>6.2f} us'.format(name, size, serialize, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+in-process stand-in for a serial.Serial attached to a modem, answering after a fixed latency
+"""
+import threading
+import time
+
+
+class SimulatedPort(object):
+
+    def __init__(self, responses, latency=0.02, timeout=0.1):
+        """
+        :param responses: dict command -> list of response lines (final result code included)
+        :param latency: seconds between the command write and the response
+        :param timeout: read timeout, as serial.Serial(timeout=...)
+        """
+        self.responses = responses
+        self.latency = latency
+        self.timeout = timeout
+        self.is_open = True
+        self.port = 'SIM'
+        self._buffer = bytearray()
+        self._ready_at = 0
+        self._pending = b''
+        self._cond = threading.Condition()
+
+    def write(self, data):
+        command = data.decode().strip()
+        lines = self.responses.get(command, ['ERROR'])
+        with self._cond:
+            self._pending = ''.join('\r\n{}\r\n'.format(line) for line in lines).encode()
+            self._ready_at = time.monotonic() + self.latency
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _deliver(self):
+        if self._pending and time.monotonic() >= self._ready_at:
+            self._buffer += self._pending
+            self._pending = b''
+
+    @property
+    def in_waiting(self):
+        with self._cond:
+            self._deliver()
+            return len(self._buffer)
+
+    def read(self, size=1):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                self._deliver()
+                if len(self._buffer) >= size or time.monotonic() >= deadline:
+                    data = bytes(self._buffer[:size])
+                    del self._buffer[:size]
+                    return data
+            time.sleep(0.0005)
+
+    def readline(self):
+        line = b''
+        while not line.endswith(b'\n'):
+            char = self.read(1)
+            if not char:
+                break
+            line += char
+        return line
+
+    def readlines(self):
+        """
+        like serial.Serial.readlines: return only once a readline timed out
+        """
+        lines = []
+        while True:
+            line = self.readline()
+            if not line:
+                return lines
+            lines.append(line)
+
+    def close(self):
+        self.is_open = False
@@ -0,0 +1,19 @@
+from .. import mock, unittest, patch
+from at.client.descriptions import NOT_EXPECTED, describe
+from at.server.records import AttachState, Registration, SignalQuality, SimStatus
+
+
+class TestDescriptions(unittest.TestCase):
+
+    def test_codes_described(self):
+        self.assertEqual(describe(SimStatus('READY')), {'code': 'ME is not pending for any password'})
+        self.assertEqual(describe(AttachState(0)), {'state': 'Detached'})
+        self.assertEqual(describe(Registration(0, 1, None, None, None)),
+                         {'n': 'network registration unsolicited result code disabled',
+                          'stat': 'registered, home network'})
+
+    def test_signal_quality(self):
+        self.assertEqual(describe(SignalQuality(12, 0)), {'rssi': 'OK (-89 dBm)', 'ber': 'less than 0.2%'})
+        self.assertEqual(describe(SignalQuality(99, 99)),
+                         {'rssi': 'Unknown or undetectable', 'ber': 'not known or not detectable'})
+        self.assertEqual(describe(SignalQuality(12, 42))['ber'], NOT_EXPECTED)
@@ -0,0 +1,77 @@
+import asyncio
+import os
+import tty
+
+from .. import unittest
+from at.server.async_connector import AsyncConnector
+from at.server.commands.common.at_mobile_controller import CSQ
+from at.server.commands.common.exceptions import ATCommandException
+
+RESPONSES = {
+    b'AT+CSQ': b'\r\n+CREG: 5\r\n\r\n+CSQ: 20,99\r\n\r\nOK\r\n',
+    b'AT+CPIN?': b'\r\n+CME ERROR: 10\r\n',
+}
+
+
+class PtyModem(object):
+    """
+    answers commands written on the slave side of a pseudo terminal
+    """
+
+    def __init__(self, loop):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        self.path = os.ttyname(self.slave)
+        self._pending = b''
+        loop.add_reader(self.master, self._answer)
+        self._loop = loop
+
+    def _answer(self):
+        self._pending += os.read(self.master, 1024)
+        while b'\r\n' in self._pending:
+            command, self._pending = self._pending.split(b'\r\n', 1)
+            os.write(self.master, RESPONSES.get(command, b'\r\nERROR\r\n'))
+
+    def close(self):
+        self._loop.remove_reader(self.master)
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class TestAsyncConnector(unittest.TestCase):
+
+    def test_many_ports_from_one_loop(self):
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            modems = [PtyModem(loop) for _ in range(8)]
+            connectors = [AsyncConnector(com_id=modem.path) for modem in modems]
+            subscription = connectors[0].urc.subscribe(['+CREG:'])
+            results = await asyncio.gather(*[CSQ(connector, 1).query_async() for connector in connectors])
+            with self.assertRaises(ATCommandException):
+                await connectors[1].run('AT+CPIN?', 1, ATCommandException, '')
+            for connector in connectors:
+                await connector.close()
+            for modem in modems:
+                modem.close()
+            return results, subscription.get()
+
+        results, urcs = asyncio.run(scenario())
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result.rssi == 20 for result in results))
+        self.assertEqual([line for _, line in urcs], ['+CREG: 5'])
+
+    def test_reconnect_keeps_the_lock_callers_wait_on(self):
+        async def scenario():
+            modem = PtyModem(asyncio.get_running_loop())
+            connector = AsyncConnector(com_id=modem.path)
+            lock = connector._lock
+            await connector.run('AT+CSQ', 1, ATCommandException, '')
+            await connector.connect()
+            results = await asyncio.gather(*[CSQ(connector, 1).query_async() for _ in range(3)])
+            await connector.close()
+            modem.close()
+            return lock is connector._lock, results
+
+        same_lock, results = asyncio.run(scenario())
+        self.assertTrue(same_lock)
+        self.assertEqual([result.rssi for result in results], [20] * 3)
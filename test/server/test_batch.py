@@ -0,0 +1,70 @@
+from .. import mock, unittest
+from at.server.batch import BatchExecutor
+from at.server.commands.common.at_mobile_controller import CPIN, CPAS, CSQ, GSN
+from at.server.commands.common.at_network_handler import CREG
+from at.server.commands.common.exceptions import ATCommandException
+
+
+class FakeConnector(object):
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.commands = []
+
+    def run(self, command, timeout, exception, message):
+        self.commands.append(command)
+        output = self.responses.get(command)
+        if output is None:
+            raise exception(message + ' ' + command)
+        return output
+
+
+RESPONSES = {
+    'AT+CPIN?': ['+CPIN: READY', 'OK'],
+    'AT+CPAS': ['+CPAS: 0', 'OK'],
+    'AT+CSQ': ['+CSQ: 20,99', 'OK'],
+    'AT+CREG?': ['+CREG: 2,1', 'OK'],
+    'AT+GSN': ['AT+GSN', '490154203237518', 'OK'],
+}
+
+
+class TestBatchExecutor(unittest.TestCase):
+
+    def commands(self, connector):
+        return [CPIN(connector, 10), CPAS(connector, 10), GSN(connector, 10), CSQ(connector, 10),
+                CREG(connector, 10)]
+
+    def test_compound_line_is_sliced_per_command(self):
+        responses = dict(RESPONSES)
+        responses['AT+CPIN?;+CPAS;+CSQ;+CREG?'] = ['+CPIN: READY', '+CPAS: 0', '+CSQ: 20,99', '+CREG: 2,1', 'OK']
+        connector = FakeConnector(responses)
+        executor = BatchExecutor(connector)
+        commands = [CPIN(connector, 10), CPAS(connector, 10), CSQ(connector, 10), CREG(connector, 10)]
+        results = executor.run(commands)
+        self.assertEqual(connector.commands, ['AT+CPIN?;+CPAS;+CSQ;+CREG?'])
+        self.assertEqual(results[0][0], 'READY')
+        self.assertEqual(results[1][0], 0)
+        self.assertEqual(results[2].rssi, 20)
+        self.assertEqual(results[3][0], 2)
+        self.assertTrue(executor.chaining)
+
+    def test_non_chainable_command_splits_the_line(self):
+        executor = BatchExecutor(FakeConnector({}))
+        groups = executor.group(self.commands(None))
+        self.assertEqual([len(group) for group in groups], [2, 1, 2])
+
+    def test_falls_back_to_sequential_execution(self):
+        connector = FakeConnector(RESPONSES)
+        executor = BatchExecutor(connector)
+        results = executor.run(self.commands(connector))
+        self.assertEqual(results[2], 490154203237518)
+        self.assertIs(executor.chaining, False)
+        connector.commands = []
+        executor.run(self.commands(connector))
+        self.assertEqual(connector.commands, ['AT+CPIN?', 'AT+CPAS', 'AT+GSN', 'AT+CSQ', 'AT+CREG?'])
+
+    def test_failing_command_raises(self):
+        responses = dict(RESPONSES)
+        del responses['AT+CPAS']
+        executor = BatchExecutor(FakeConnector(responses))
+        self.assertRaises(ATCommandException, executor.run, self.commands(executor.connector))
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+
+from .. import mock, unittest, patch
+from at.server.baudrate import BaudRateNegotiator
+from at.server.commands.common.at_mobile_controller import IPR
+from at.server import serial_connector
+from at.server.emulator import ModemEmulator
+from at.server.serial_connector import Connector, PortSettings
+
+
+class TestBaudRateNegotiation(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'ports.json')
+
+    def test_parse_supported(self):
+        self.assertEqual(IPR.parse_supported(['+IPR: (0,9600,115200),(230400,921600)', 'OK']),
+                         [9600, 115200, 230400, 921600])
+        self.assertEqual(IPR.parse_supported(['+IPR: (300-921600),()', 'OK']), [300, 921600])
+
+    def test_switches_to_fastest_rate_and_remembers_it(self):
+        with ModemEmulator() as emulator:
+            connector = Connector(com_id=emulator.port, settings=PortSettings(self.path))
+            self.assertEqual(BaudRateNegotiator(connector, settle=0).negotiate(), 921600)
+            self.assertEqual(emulator.state['+IPR'], '921600')
+            remembered = PortSettings(self.path).get(emulator.port)
+            self.assertEqual(remembered, {'baudrate': 921600, 'rtscts': True})
+            port = connector.open_port()
+            self.assertEqual((port.baudrate, port.rtscts, port.xonxoff), (921600, True, False))
+            port.close()
+
+    def test_respects_max_baudrate(self):
+        with ModemEmulator() as emulator:
+            connector = Connector(com_id=emulator.port, settings=PortSettings(self.path))
+            self.assertEqual(BaudRateNegotiator(connector, max_baudrate=460800, settle=0).negotiate(), 460800)
+
+    def test_stays_when_rates_are_not_listed(self):
+        with ModemEmulator({'commands': {'+IPR=?': {'error_rate': 1.0}}}) as emulator:
+            connector = Connector(com_id=emulator.port, settings=PortSettings(self.path))
+            self.assertEqual(BaudRateNegotiator(connector, settle=0).negotiate(), 115200)
+            self.assertIsNone(connector.settings.get(emulator.port))
+
+    def test_ping_leaves_no_expected_answer(self):
+        with ModemEmulator() as emulator:
+            connector = Connector(com_id=emulator.port, settings=PortSettings(self.path))
+            with connector.exclusive():
+                self.assertTrue(BaudRateNegotiator(connector).ping(2))
+                self.assertIsNone(connector._expected)
+            self.assertEqual(emulator.received.count('AT'), 2)
+
+    def test_remembered_rate_forgotten_when_the_modem_does_not_answer(self):
+        PortSettings(self.path).put('/dev/ttyUSB2', 921600, True)
+        connector = Connector(com_id='/dev/ttyUSB2', settings=PortSettings(self.path))
+        silent, fresh = mock.Mock(), mock.Mock()
+        silent.readline.return_value = b''
+        with patch.object(serial_connector.serial, 'Serial', side_effect=[silent, fresh]) as opened, \
+                patch.object(Connector, 'PROBE_TIMEOUT', 0.05):
+            self.assertIs(connector.open_port(probe=True), fresh)
+        silent.write.assert_called_once_with(b'AT\r\n')
+        self.assertTrue(silent.close.called)
+        self.assertEqual([(c[1]['baudrate'], c[1]['rtscts'], c[1]['xonxoff']) for c in opened.call_args_list],
+                         [(921600, True, False), (115200, False, True)])
+        self.assertIsNone(PortSettings(self.path).get('/dev/ttyUSB2'))
+
+    def test_remembered_rate_not_probed_on_every_open(self):
+        PortSettings(self.path).put('/dev/ttyUSB2', 921600, True)
+        connector = Connector(com_id='/dev/ttyUSB2', settings=PortSettings(self.path))
+        with patch.object(serial_connector.serial, 'Serial') as opened:
+            connector.open_port()
+        self.assertFalse(opened.return_value.write.called)
+        self.assertEqual(opened.call_args[1]['baudrate'], 921600)
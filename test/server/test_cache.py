@@ -0,0 +1,80 @@
+from .. import mock, unittest, patch
+from at.server.cache import ResultCache
+from at.server.commands.common.at_mobile_controller import CIMI, CSQ, GSN
+from at.server.commands.common.exceptions import ATCommandException
+from at.server.emulator import ModemEmulator
+from at.server.serial_connector import Connector, SerialSessionPool
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = ResultCache(clock=self.clock)
+
+    def test_entries_expire_after_their_ttl(self):
+        run = mock.Mock(return_value=['490154203237518', 'OK'])
+        self.cache.get_or_run('AT+GSN', 10, run)
+        self.cache.get_or_run('AT+GSN', 10, run)
+        self.assertEqual(run.call_count, 1)
+        self.clock.now = 11
+        self.cache.get_or_run('AT+GSN', 10, run)
+        self.assertEqual(run.call_count, 2)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_outputs_cut_short_not_cached(self):
+        run = mock.Mock(return_value=['ATI', 'Manufacturer: x'])
+        self.cache.get_or_run('ATI', 10, run)
+        self.cache.get_or_run('ATI', 10, run)
+        self.assertEqual(run.call_count, 2)
+        self.assertIsNone(self.cache.get('ATI'))
+
+    def test_functionality_change_drops_sim_dependent_answers(self):
+        self.cache.put('AT+GSN', ['1'], 10)
+        self.cache.put('AT+CIMI', ['2'], 10)
+        self.cache.observe('AT+CFUN=0', ['OK'])
+        self.assertIsNone(self.cache.get('AT+CIMI'))
+        self.assertIsNotNone(self.cache.get('AT+GSN'))
+        self.cache.observe('AT+CFUN=1,1', ['OK'])
+        self.assertIsNone(self.cache.get('AT+GSN'))
+
+    def test_sim_state_change_drops_sim_dependent_answers(self):
+        self.cache.put('AT+CIMI', ['2'], 10)
+        self.cache.observe('AT+CPIN?;+CSQ', ['+CPIN: READY', '+CSQ: 20,0', 'OK'])
+        self.assertIsNotNone(self.cache.get('AT+CIMI'))
+        self.cache.on_urc('+CPIN:', '+CPIN: NOT READY')
+        self.assertIsNone(self.cache.get('AT+CIMI'))
+        self.assertEqual(self.cache.stats()['invalidations'], 1)
+
+
+class TestCachedCommands(unittest.TestCase):
+
+    def test_identity_commands_answered_from_cache(self):
+        with ModemEmulator() as emulator:
+            connector = Connector(com_id=emulator.port, persistent=True, pool=SerialSessionPool())
+            self.addCleanup(connector.close_session)
+            connector.start_reader()
+            self.assertEqual(GSN(connector, 2).get(), 490154203237518)
+            self.assertEqual(GSN(connector, 2).get(), 490154203237518)
+            self.assertEqual(CIMI(connector, 2).get(), ['001010123456789'])
+            CSQ(connector, 2).get()
+            CSQ(connector, 2).get()
+            self.assertEqual(emulator.received.count('AT+GSN'), 1)
+            self.assertEqual(emulator.received.count('AT+CSQ'), 2)
+            connector.run('AT+CFUN=1', 2, ATCommandException, '')
+            CIMI(connector, 2).get()
+            self.assertEqual(emulator.received.count('AT+CIMI'), 2)
+            subscription = connector.urc.subscribe()
+            emulator.emit('+CPIN: NOT READY')
+            subscription.get(timeout=1)
+            self.assertIsNone(connector.cache.get('AT+CIMI'))
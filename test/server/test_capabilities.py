@@ -0,0 +1,45 @@
+import os
+import tempfile
+
+from .. import mock, unittest, patch
+from at.server.at_server import ATServer
+from at.server.capabilities import CapabilityIndex, capability_set, firmware_key, normalize
+from at.server.emulator import ModemEmulator
+
+
+class TestCapabilityIndex(unittest.TestCase):
+
+    def test_normalized_commands(self):
+        self.assertEqual(normalize('+cpas'), 'AT+CPAS')
+        self.assertEqual(capability_set(['AT+CPAS', '+CSQ', 'I', '']), frozenset(['AT+CPAS', 'AT+CSQ', 'ATI']))
+
+    def test_firmware_key(self):
+        self.assertEqual(firmware_key(490154203237518, ['Model: X', 'Revision: EMU.1.0']), '490154203237518|EMU.1.0')
+        self.assertEqual(firmware_key(1, ['Quectel', 'EC25']), '1|Quectel EC25')
+
+    def test_persisted(self):
+        path = os.path.join(tempfile.mkdtemp(), 'capabilities.json')
+        self.assertTrue(CapabilityIndex(path).put('1|A', ['+CSQ']))
+        index = CapabilityIndex(path)
+        self.assertEqual(index.get('1|A'), frozenset(['AT+CSQ']))
+        self.assertFalse(index.put('1|A', ['AT+CSQ']))
+        self.assertIsNone(index.get('1|B'))
+
+
+class TestServerCapabilities(unittest.TestCase):
+
+    def test_startup_skips_clac_for_a_known_firmware(self):
+        path = os.path.join(tempfile.mkdtemp(), 'capabilities.json')
+        with ModemEmulator() as emulator:
+            server = ATServer('localhost', emulator.port, persistent=False, capabilities_path=path)
+            self.assertIn('AT+CSQ', server.supported_commands)
+            self.assertEqual(emulator.received.count('AT+CLAC'), 1)
+        with ModemEmulator() as emulator:
+            server = ATServer('localhost', emulator.port, persistent=False, capabilities_path=path)
+            self.assertIsInstance(server.supported_commands, frozenset)
+            self.assertIn('AT+CSQ', server.supported_commands)
+            self.assertNotIn('AT+CLAC', emulator.received)
+            server.open()
+            server.worker.stop()
+            self.assertEqual(emulator.received.count('AT+CLAC'), 1)
+            server.close()
@@ -0,0 +1,45 @@
+from .. import mock, unittest, patch
+from at.server.at_server import ATServer
+from at.server.commands.catalog import CommandCatalog
+from at.server.commands.common.at_mobile_controller import CPIN, CSQ
+from at.server.commands.common.at_network_handler import COPS, CREG
+from at.server.emulator import ModemEmulator
+
+
+class TestCommandCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.connector = mock.Mock()
+        self.catalog = CommandCatalog(self.connector)
+
+    def test_instances_reused(self):
+        command = self.catalog.get(CSQ, 50)
+        self.assertIs(self.catalog.get(CSQ, 50), command)
+        self.assertIs(command.serial_target, self.connector)
+        self.assertEqual(command.timeout, 50)
+        self.assertIsNot(self.catalog.get(CSQ, 10), command)
+        self.assertEqual(len(self.catalog), 2)
+
+    def test_commands_have_no_instance_dict(self):
+        for command in (CPIN, CSQ, CREG, COPS):
+            self.assertFalse(hasattr(self.catalog.get(command, 1), '__dict__'))
+
+    def test_lookup_tables_shared_and_read_only(self):
+        self.assertIs(self.catalog.get(CPIN, 1).expected_values, CPIN.expected_values)
+        with self.assertRaises(TypeError):
+            CSQ.bit_error_rates[0] = 'changed'
+        with self.assertRaises(TypeError):
+            CREG.expected_values[1][0] = 'changed'
+
+
+class TestServerCatalog(unittest.TestCase):
+
+    def test_rat_mode_sent_as_access_technology(self):
+        with ModemEmulator() as emulator:
+            server = ATServer('localhost', emulator.port, persistent=False)
+            server.enabled = True
+            server.set_rat_mode('lte')
+            self.assertIn('AT+COPS=4,2,"00",7', emulator.received)
+            self.assertEqual(server.exceptions, [])
+            server.set_rat_mode('gsm')
+            self.assertIsInstance(server.exceptions[-1]['AT+COPS'], ValueError)
@@ -0,0 +1,62 @@
+from .. import mock, unittest
+from at.server.commands.common.at_mobile_controller import CFUN
+from at.server.commands.common.at_network_handler import CGATT
+from at.server.cycles import CycleBenchmark, distribution
+from at.server.emulator import ModemEmulator
+from at.server.serial_connector import Connector, SerialSessionPool
+
+REPORTING = {'on_set': {'+CGATT': [{'line': '+CGEV: ME PDN ACT 1', 'when': '1', 'delay': 0.02},
+                                   {'line': '+CGEV: ME DETACH', 'when': '0', 'delay': 0.02}]}}
+
+
+class TestDistribution(unittest.TestCase):
+
+    def test_percentiles_and_histogram(self):
+        result = distribution([5, 15, 15, 400, 70000])
+        self.assertEqual((result['count'], result['min'], result['p50'], result['max']), (5, 5, 15, 70000))
+        self.assertEqual(result['histogram'], [(10, 1), (20, 2), (500, 1), (None, 1)])
+        self.assertEqual(distribution([]), {'count': 0})
+
+
+class TestCycleBenchmark(unittest.TestCase):
+
+    def benchmark(self, emulator, reader=False, poll_interval=0.01):
+        connector = Connector(com_id=emulator.port, persistent=True, pool=SerialSessionPool())
+        self.addCleanup(connector.close_session)
+        if reader:
+            connector.start_reader()
+        commands = {CGATT.COMMAND: CGATT(connector, 2), CFUN.COMMAND: CFUN(connector, 2)}
+        return CycleBenchmark(connector, commands, timeout=2, confirm_timeout=1, poll_interval=poll_interval)
+
+    def test_attach_confirmed_by_reports(self):
+        with ModemEmulator(REPORTING) as emulator:
+            result = self.benchmark(emulator, reader=True, poll_interval=0.5).run(3, 'attach')
+        for name in ('attach', 'detach'):
+            phase = result['phases'][name]
+            self.assertEqual(phase['confirmed_by'], {'urc': 3})
+            self.assertEqual(phase['failures'], {})
+            self.assertGreaterEqual(phase['confirmed_ms']['min'], 10)
+            self.assertLess(phase['confirmed_ms']['max'], 500)
+        self.assertEqual(emulator.received.count('AT+CGATT=1'), 3)
+        self.assertIn('AT+CGEREP=2,1', emulator.received)
+
+    def test_attach_read_back_while_reports_are_waited_for(self):
+        with ModemEmulator() as emulator:
+            result = self.benchmark(emulator, reader=True, poll_interval=0.05).run(2, 'attach')
+        for name in ('attach', 'detach'):
+            phase = result['phases'][name]
+            self.assertEqual(phase['confirmed_by'], {'read': 2})
+            self.assertLess(phase['confirmed_ms']['max'], 500)
+
+    def test_radio_confirmed_by_read_back(self):
+        with ModemEmulator() as emulator:
+            result = self.benchmark(emulator).run(2, 'cfun')
+        self.assertEqual(result['phases']['radio_off']['confirmed_by'], {'read': 2})
+        self.assertEqual(result['phases']['radio_on']['ok_ms']['count'], 2)
+        self.assertEqual(emulator.received.count('AT+CFUN?'), 4)
+
+    def test_failures_counted(self):
+        with ModemEmulator({'error_rate': 1.0}) as emulator:
+            result = self.benchmark(emulator).run(2, 'attach')
+        self.assertEqual(result['phases']['attach']['failures'], {'error': 2})
+        self.assertRaises(ValueError, CycleBenchmark(mock.Mock(), {}).run, 1, 'reboot')
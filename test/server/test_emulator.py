@@ -0,0 +1,53 @@
+import time
+
+from .. import unittest
+from at.server.at_server import ATServer
+from at.server.commands.common.at_mobile_controller import CPIN, CSQ
+from at.server.commands.common.exceptions import ATCommandException
+from at.server.emulator import ModemEmulator
+from at.server.serial_connector import Connector, SerialSessionPool
+
+
+class TestModemEmulator(unittest.TestCase):
+
+    def connector(self, emulator):
+        connector = Connector(com_id=emulator.port, persistent=True, pool=SerialSessionPool())
+        self.addCleanup(connector.close_session)
+        return connector
+
+    def test_answers_commands_with_profile_latency(self):
+        profile = {'commands': {'+CSQ': {'response': ['+CSQ: 12,3'], 'latency': 0.1}}}
+        with ModemEmulator(profile) as emulator:
+            connector = self.connector(emulator)
+            start = time.monotonic()
+            self.assertEqual(CSQ(connector, 2).get().rssi, 12)
+            self.assertGreaterEqual(time.monotonic() - start, 0.1)
+            self.assertEqual(connector.run('AT+CPIN?;+CSQ', 2, ATCommandException, ''),
+                             ['+CPIN: READY', '+CSQ: 12,3', 'OK'])
+
+    def test_error_injection(self):
+        with ModemEmulator({'error_rate': 1.0}) as emulator:
+            self.assertRaises(ATCommandException, CPIN(self.connector(emulator), 2).read)
+
+    def test_set_commands_update_state_and_emit_urcs(self):
+        profile = {'urcs': [{'line': 'RING', 'at': 0.3}],
+                   'on_set': {'+CGATT': [{'line': '+CGEV: ME DETACH', 'when': '0'}]}}
+        with ModemEmulator(profile) as emulator:
+            connector = self.connector(emulator)
+            connector.start_reader()
+            subscription = connector.urc.subscribe()
+            connector.run('AT+CGATT=0', 2, ATCommandException, '')
+            self.assertEqual(connector.run('AT+CGATT?', 2, ATCommandException, ''), ['+CGATT: 0', 'OK'])
+            events = subscription.get(timeout=1) + subscription.get(timeout=1)
+            self.assertEqual(sorted(line for _, line in events), ['+CGEV: ME DETACH', 'RING'])
+
+    def test_server_against_emulator(self):
+        with ModemEmulator() as emulator:
+            server = ATServer('localhost', emulator.port)
+            server.open()
+            self.addCleanup(server.close)
+            self.assertIn('AT+CSQ', server.supported_commands)
+            server.get_ue()
+            self.assertEqual(server.read_pin_status()[0], 'READY')
+            self.assertEqual(server.poll_status()['report_phone_activity_status'][0], 0)
+            self.assertEqual(server.exceptions, [])
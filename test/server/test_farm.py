@@ -0,0 +1,135 @@
+import threading
+import time
+
+from .. import mock, unittest, patch
+from at.server.at_server import ATServer, AT_VERSION
+from at.server.farm import ModemFarm
+from concurrent.futures import CancelledError
+from at.server.commands.common.exceptions import CommandQueueFull
+from at.server.worker import ModemWorker, INTERACTIVE, LONG_RUNNING
+
+
+class TestModemWorker(unittest.TestCase):
+
+    def test_slow_modem_does_not_block_another(self):
+        slow, fast = ModemWorker('slow'), ModemWorker('fast')
+        slow.start()
+        fast.start()
+        release = threading.Event()
+        pending = slow.submit(release.wait, 5)
+        self.assertEqual(fast.call(lambda: 'done'), 'done')
+        self.assertFalse(pending.done())
+        release.set()
+        self.assertTrue(pending.result(timeout=5))
+        slow.stop()
+        fast.stop()
+
+    def test_calls_run_inline_when_not_started(self):
+        self.assertEqual(ModemWorker('idle').call(threading.current_thread), threading.current_thread())
+
+    def test_exceptions_reach_the_caller(self):
+        worker = ModemWorker('failing')
+        worker.start()
+        self.assertRaises(ZeroDivisionError, worker.call, lambda: 1 / 0)
+        worker.stop()
+
+
+class TestScheduling(unittest.TestCase):
+
+    def setUp(self):
+        self.worker = ModemWorker('scheduled', max_queued=6, max_queued_per_caller=3)
+        self.worker.start()
+        self.addCleanup(self.worker.stop)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.order = []
+        # hold the worker so the following calls queue up
+        started = threading.Event()
+        self.blocker = self.worker.schedule(lambda: started.set() or self.release.wait(5), caller='blocker',
+                                            name='blocker')
+        started.wait(5)
+
+    def queue(self, label, priority, caller):
+        return self.worker.schedule(self.order.append, (label,), priority=priority, caller=caller, name=label)
+
+    def test_interactive_calls_overtake_long_running_ones(self):
+        self.queue('cops', LONG_RUNNING, 'a')
+        last = self.queue('csq', INTERACTIVE, 'b')
+        self.release.set()
+        self.worker.stop()
+        self.assertTrue(last.done())
+        self.assertEqual(self.order, ['csq', 'cops'])
+
+    def test_callers_are_served_round_robin(self):
+        for label in ('a1', 'a2', 'a3'):
+            self.queue(label, INTERACTIVE, 'a')
+        self.queue('b1', INTERACTIVE, 'b')
+        self.queue('c1', INTERACTIVE, 'c')
+        self.release.set()
+        self.worker.stop()
+        self.assertEqual(self.order, ['a1', 'b1', 'c1', 'a2', 'a3'])
+
+    def test_queue_depth_limits(self):
+        for label in ('a1', 'a2', 'a3'):
+            self.queue(label, INTERACTIVE, 'a')
+        self.assertRaises(CommandQueueFull, self.queue, 'a4', INTERACTIVE, 'a')
+        for label in ('b1', 'b2', 'b3'):
+            self.queue(label, LONG_RUNNING, 'b')
+        self.assertRaises(CommandQueueFull, self.queue, 'c1', INTERACTIVE, 'c')
+
+    def test_cancel_queued_call(self):
+        cancelled = self.queue('cops', LONG_RUNNING, 'a')
+        self.queue('csq', INTERACTIVE, 'a')
+        self.assertEqual([entry['name'] for entry in self.worker.queued()], ['blocker', 'csq', 'cops'])
+        self.assertTrue(self.worker.cancel(cancelled.id))
+        self.assertFalse(self.worker.cancel(cancelled.id))
+        self.assertFalse(self.worker.cancel(self.blocker.id))
+        self.release.set()
+        self.worker.stop()
+        self.assertRaises(CancelledError, cancelled.result)
+        self.assertEqual(self.order, ['csq'])
+
+    def test_queue_wait_reported_apart_from_execution(self):
+        self.queue('csq', INTERACTIVE, 'a')
+        time.sleep(0.05)
+        self.release.set()
+        self.worker.stop()
+        stats = self.worker.stats()
+        self.assertEqual(stats['csq']['count'], 1)
+        self.assertGreaterEqual(stats['csq']['queue_wait_ms']['max'], 50)
+        self.assertLess(stats['csq']['execution_ms']['max'], 50)
+        self.assertGreaterEqual(stats['blocker']['execution_ms']['max'], 50)
+
+
+class TestServerScheduling(unittest.TestCase):
+
+    def setUp(self):
+        with patch.object(ATServer, 'get_supported_commands', return_value=frozenset(['AT+CSQ'])):
+            self.server = ATServer('localhost', 3, persistent=False)
+        self.server.enabled = True
+
+    def test_refused_and_cancelled_calls_reach_the_caller(self):
+        for error in (CommandQueueFull('queue full'), CancelledError()):
+            with patch.object(self.server.worker, 'run', side_effect=error):
+                self.assertRaises(type(error), self.server.get_signal_quality)
+        self.assertEqual(self.server.exceptions, [])
+
+
+class TestModemFarm(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.object(ATServer, 'get_supported_commands', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.farm = ModemFarm('localhost', [3, 4], persistent=False)
+
+    def test_one_server_per_modem(self):
+        self.assertEqual(self.farm.modems(), ['3', '4'])
+        self.assertIsNot(self.farm.servers['3'].connector, self.farm.servers['4'].connector)
+        self.assertEqual(ModemFarm.object_id(3), 'ATServer.3')
+
+    def test_call_routes_to_exposed_methods_only(self):
+        self.assertEqual(self.farm.call(3, 'at_version'), AT_VERSION)
+        self.assertRaises(KeyError, self.farm.call, 5, 'at_version')
+        self.assertRaises(AttributeError, self.farm.call, 3, 'close')
+        self.assertRaises(AttributeError, self.farm.call, 3, 'shutdown')
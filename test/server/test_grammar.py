@@ -0,0 +1,76 @@
+from .. import mock, unittest
+from at.server.commands.grammar import ResponseSchema, Field, integer, string, hexadecimal, token, parse_batch
+from at.server.commands.common.at_mobile_controller import CFUN, CGMM, CIMI, CPIN, CSQ, GSN, WS46, ATI
+from at.server.commands.common.at_network_handler import CREG, COPS, CGATT
+from at.server.commands.common.exceptions import MobileTerminalMethodException, NetworkMethodException
+
+CREG_SCHEMA = ResponseSchema('CREG', '+CREG:', [
+    integer('n'), integer('stat'), hexadecimal('lac', optional=True), hexadecimal('ci', optional=True),
+    integer('act', optional=True)])
+
+
+class TestResponseSchema(unittest.TestCase):
+
+    def test_typed_fields(self):
+        schema = ResponseSchema('COPS', '+COPS:', [integer('mode'), integer('format', optional=True),
+                                                   string('oper', optional=True), integer('act', optional=True)])
+        record = schema.parse(['AT+COPS?', '+COPS: 0,2,"00101",7', 'OK'])
+        self.assertEqual(record, (0, 2, '00101', 7))
+        self.assertEqual(record.act, 7)
+        self.assertEqual(schema.parse(['+COPS: 2', 'OK']), (2, None, None, None))
+
+    def test_optional_fields_may_be_empty_or_missing(self):
+        self.assertEqual(CREG_SCHEMA.match('+CREG: 2,1,"00C3","0A1B2C3",7'), (2, 1, 0xC3, 0xA1B2C3, 7))
+        self.assertEqual(CREG_SCHEMA.match('+CREG: 2,1,,,7'), (2, 1, None, None, 7))
+        self.assertEqual(CREG_SCHEMA.match('+CREG: 0,1'), (0, 1, None, None, None))
+        self.assertIsNone(CREG_SCHEMA.match('+CREG: garbage'))
+        self.assertIsNone(CREG_SCHEMA.parse(['OK']))
+
+    def test_bare_lines_skip_echo_and_final_result(self):
+        schema = ResponseSchema('ATI', None, [Field('line', r'.*?')], many=True)
+        self.assertEqual([record.line for record in schema.parse(['ATI', 'Model: X', 'Revision: 1', 'OK'])],
+                         ['Model: X', 'Revision: 1'])
+
+    def test_token(self):
+        schema = ResponseSchema('CPIN', '+CPIN:', [token('code')])
+        self.assertEqual(schema.match('+CPIN: SIM PIN').code, 'SIM PIN')
+
+    def test_batch_in_one_pass(self):
+        cpas = ResponseSchema('CPAS', '+CPAS:', [integer('pas')])
+        csq = ResponseSchema('CSQ', '+CSQ:', [integer('rssi'), integer('ber')])
+        records = parse_batch([cpas, csq, CREG_SCHEMA], ['+CSQ: 20,99', '+CPAS: 0', 'OK'])
+        self.assertEqual(records, [(0,), (20, 99), None])
+        self.assertRaises(ValueError, parse_batch, [ResponseSchema('GSN', None, [integer('sn')])], [])
+
+
+class TestCommandParsers(unittest.TestCase):
+
+    def test_echo_is_optional(self):
+        self.assertEqual(GSN(None, 1).parse_output(['490154203237518', 'OK']), 490154203237518)
+        self.assertEqual(GSN(None, 1).parse_output(['AT+GSN', '490154203237518', 'OK']), 490154203237518)
+        self.assertEqual(CIMI(None, 1).parse_output(['001010123456789', 'OK']), ['001010123456789'])
+        self.assertEqual(CGMM(None, 1).parse_query(['AT+CGMM', 'EMULATED-MODEM', 'OK']), 'EMULATED-MODEM')
+        self.assertEqual(ATI(None, 1).parse_output(['Model: X', 'OK']), ['Model: X'])
+
+    def test_typed_values_match_the_expected_values(self):
+        self.assertEqual(CFUN(None, 1).parse_output(['+CFUN: 1', 'OK'])[0], 1)
+        self.assertEqual(CGATT(None, 1).parse_output(['+CGATT: 0', 'OK']), (0,))
+        self.assertEqual(COPS(None, 1).parse_output(['+COPS: 0,2,"00101",13', 'OK']).act, 13)
+        self.assertEqual(WS46(None, 1).parse_output(['+WS46: 28', 'OK'])[0], 28)
+        self.assertEqual(CPIN(None, 1).parse_output(['+CPIN: SIM PIN', 'OK'])[0], 'SIM PIN')
+
+    def test_missing_state_line_raises(self):
+        cpin = CPIN(None, 1)
+        self.assertEqual(cpin.parse_output(['+CPIN: SIM PIN', 'OK'])[0], 'SIM PIN')
+        self.assertRaises(MobileTerminalMethodException, cpin.parse_output, ['OK'])
+        self.assertRaises(MobileTerminalMethodException, CFUN(None, 1).parse_output, ['OK'])
+        self.assertRaises(NetworkMethodException, CGATT(None, 1).parse_output, ['OK'])
+
+    def test_registration_with_location(self):
+        self.assertEqual(CREG(None, 1).parse_output(['+CREG: 2,5,"00C3","0A1B2C3",7', 'OK']),
+                         (2, 5, 0xC3, 0xA1B2C3, 7))
+
+    def test_signal_condition(self):
+        self.assertEqual(CSQ.get_signal_condition(25), 'Excellent')
+        self.assertEqual(CSQ.get_signal_condition(99), 'Unknown or undetectable')
+        self.assertEqual(CSQ(None, 1).parse_output(['+CSQ: 25,0', 'OK']).dbm, -63)
@@ -0,0 +1,111 @@
+import time
+
+from .. import mock, unittest
+from at.server.at_server import ATServer
+from at.server.batch import BatchExecutor
+from at.server.cache import PDP_QUERY, ResultCache
+from at.server.commands.catalog import CommandCatalog
+from at.server.commands.common.at_network_handler import CGACT, CGDCONT, CGPADDR, pdp_contexts
+from at.server.emulator import ModemEmulator
+from at.server.pdp import PdpContexts
+from at.server.records import PdpContext
+
+CONTEXTS = [PdpContext(1, 'IP', 'internet', 1, '10.0.0.2', None), PdpContext(2, 'IPV4V6', 'ims', 0, None, None)]
+
+
+class TestPdpCommands(unittest.TestCase):
+
+    def test_responses_merged_by_cid(self):
+        definitions = CGDCONT.RESPONSE.parse(['+CGDCONT: 2,"IPV6","ims","",0,0',
+                                              '+CGDCONT: 1,"IP","internet","0.0.0.0",0,0,0,0,0,0', 'OK'])
+        states = CGACT.RESPONSE.parse(['+CGACT: 1,1', '+CGACT: 2,1', 'OK'])
+        addresses = CGPADDR.RESPONSE.parse(['+CGPADDR: 1,"10.0.0.2"', '+CGPADDR: 2,,"FE80::1"', 'OK'])
+        self.assertEqual(pdp_contexts(definitions, states, addresses), [
+            PdpContext(1, 'IP', 'internet', 1, '10.0.0.2', None), PdpContext(2, 'IPV6', 'ims', 1, None, 'FE80::1')])
+
+    def test_set_parts(self):
+        self.assertEqual(CGACT.change(1, [1, 2, 3]), '+CGACT=1,1,2,3')
+        self.assertEqual(CGDCONT.definition(1, 'IP', 'internet'), '+CGDCONT=1,"IP","internet"')
+        self.assertRaises(ValueError, CGACT.change, 2, [1])
+
+    def test_query_is_one_compound_line(self):
+        catalog = CommandCatalog(mock.Mock())
+        self.assertEqual(BatchExecutor.compound_line(
+            [catalog.get(CGDCONT), catalog.get(CGACT), catalog.get(CGPADDR)]), PDP_QUERY)
+
+
+class TestPdpCache(unittest.TestCase):
+
+    def test_dropped_on_cgev_and_changes(self):
+        cache = ResultCache()
+        for command in ('AT+CGACT=1,2', 'AT+CGATT=0', 'AT+CGDCONT=3,"IP","apn"'):
+            cache.put(PDP_QUERY, CONTEXTS, 60)
+            cache.observe(command, [])
+            self.assertIsNone(cache.get(PDP_QUERY))
+        cache.put(PDP_QUERY, CONTEXTS, 60)
+        cache.observe('AT+CGACT?', [])
+        self.assertIsNotNone(cache.get(PDP_QUERY))
+        cache.on_urc('+CGEV:', '+CGEV: NW PDN DEACT 1')
+        self.assertIsNone(cache.get(PDP_QUERY))
+
+
+class TestServerPdp(unittest.TestCase):
+
+    def server(self, emulator):
+        server = ATServer('localhost', emulator.port)
+        server.open()
+        self.addCleanup(server.close)
+        server.enabled = True
+        return server
+
+    def test_contexts_read_in_one_transaction_and_cached(self):
+        with ModemEmulator() as emulator:
+            server = self.server(emulator)
+            self.assertEqual(server.get_pdp_contexts(), CONTEXTS)
+            self.assertEqual(server.get_pdp_address(), '10.0.0.2')
+            self.assertIsNone(server.get_pdp_address(2))
+            self.assertEqual(server.exceptions, [])
+            self.assertEqual(emulator.received.count(PDP_QUERY), 1)
+            self.assertIn('AT+CGEREP=2,1', emulator.received)
+            emulator.emit('+CGEV: NW PDN DEACT 1')
+            for _ in range(100):
+                if server.connector.cache.get(PDP_QUERY) is None:
+                    break
+                time.sleep(0.01)
+            server.get_pdp_contexts()
+            self.assertEqual(emulator.received.count(PDP_QUERY), 2)
+
+    def test_several_contexts_changed_in_one_line(self):
+        with ModemEmulator() as emulator:
+            server = self.server(emulator)
+            server.get_pdp_contexts()
+            self.assertEqual(server.set_pdp_context_states(activate=[2, 3], deactivate=[1]), CONTEXTS)
+            self.assertIn('AT+CGACT=0,1;+CGACT=1,2,3', emulator.received)
+            server.define_pdp_contexts([(2, 'IPV6', 'ims'), (3, 'IP', 'mms')])
+            self.assertIn('AT+CGDCONT=2,"IPV6","ims";+CGDCONT=3,"IP","mms"', emulator.received)
+            self.assertEqual(emulator.received.count(PDP_QUERY), 3)
+            self.assertEqual(server.exceptions, [])
+
+    def test_parts_run_one_per_line_when_compound_lines_are_rejected(self):
+        with ModemEmulator({'chaining': False}) as emulator:
+            server = self.server(emulator)
+            server.batch.chaining = None
+            server.set_pdp_context_states(activate=[2, 3], deactivate=[1])
+            self.assertEqual(server.exceptions, [])
+            self.assertIs(server.batch.chaining, False)
+            self.assertIn('AT+CGACT=0,1;+CGACT=1,2,3', emulator.received)
+            self.assertEqual(emulator.state['+CGACT'], '1,2,3')
+            self.assertLess(emulator.received.index('AT+CGACT=0,1'), emulator.received.index('AT+CGACT=1,2,3'))
+            server.define_pdp_contexts([(2, 'IPV6', 'ims'), (3, 'IP', 'mms')])
+            self.assertEqual(server.exceptions, [])
+            self.assertNotIn('AT+CGDCONT=2,"IPV6","ims";+CGDCONT=3,"IP","mms"', emulator.received)
+            self.assertIn('AT+CGDCONT=3,"IP","mms"', emulator.received)
+
+    def test_not_cached_without_reader(self):
+        batch = mock.Mock(connector=mock.Mock(reading=False))
+        batch.run.return_value = [[], [], []]
+        contexts = PdpContexts(batch, CommandCatalog(batch.connector))
+        contexts.read()
+        contexts.read()
+        self.assertEqual(batch.run.call_count, 2)
+        self.assertFalse(batch.connector.cache.get_or_run.called)
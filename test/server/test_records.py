@@ -0,0 +1,35 @@
+from .. import mock, unittest, patch
+from Pyro4.util import get_serializer
+from at.server.records import AttachState, Functionality, Registration, SignalQuality, SimStatus, typed
+
+
+class TestRecords(unittest.TestCase):
+
+    def setUp(self):
+        self.serializer = get_serializer('serpent')
+
+    def round_trip(self, value):
+        data, compressed = self.serializer.serializeData(value)
+        return self.serializer.deserializeData(data, compressed)
+
+    def test_records_cross_the_wire_as_bare_values(self):
+        data = self.serializer.serializeData({'get_signal_quality': SignalQuality(20, 0)})[0]
+        self.assertNotIn(b'rssi', data)
+        self.assertIn(b'(20, 0)', data)
+
+    def test_typed_back_from_the_method(self):
+        results = self.round_trip({'get_signal_quality': SignalQuality(20, 0),
+                                   'get_network_registration_params': Registration(2, 5, 0xC3, None, 7)})
+        records = dict((method, typed(method, value)) for method, value in results.items())
+        self.assertIsInstance(records['get_signal_quality'], SignalQuality)
+        self.assertEqual(records['get_network_registration_params'], Registration(2, 5, 0xC3, None, 7))
+        self.assertEqual(typed('read_pin_status', ''), '')
+        self.assertEqual(typed('get_product_informations', ['Model: X']), ['Model: X'])
+
+    def test_records_are_slotted(self):
+        self.assertFalse(hasattr(SignalQuality(20, 0), '__dict__'))
+        self.assertEqual(SignalQuality(25, 0).dbm, -63)
+        self.assertIsNone(SignalQuality(99, 99).dbm)
+        self.assertTrue(AttachState(1).attached)
+        self.assertFalse(Functionality(0).full)
+        self.assertEqual(SimStatus('READY').code, 'READY')
@@ -0,0 +1,68 @@
+from .. import mock, unittest
+from at.server.at_server import ATServer
+from at.server.commands.common.at_network_handler import C5GREG, CEREG, CREG, RegistrationWaiter
+from at.server.commands.common.exceptions import NetworkMethodException
+from at.server.emulator import ModemEmulator
+from at.server.records import Registration
+from at.server.serial_connector import Connector, SerialSessionPool
+
+ATTACHING = {'on_set': {'+CEREG': [
+    {'line': '+CEREG: 2,"00C3","0A1B2C3",7', 'delay': 0.05, 'when': '2'},
+    {'line': '+CEREG: 1,"00C3","0A1B2C3",7', 'delay': 0.2, 'when': '2'},
+]}}
+
+
+class TestReports(unittest.TestCase):
+
+    def test_report_parsed_without_n(self):
+        self.assertEqual(tuple(CEREG.REPORT.match('+CEREG: 1,"00C3","0A1B2C3",7'))[:4], (1, 0xC3, 0xA1B2C3, 7))
+        self.assertEqual(CREG.REPORT.match('+CREG: 5').stat, 5)
+        self.assertEqual(C5GREG.REPORT.match(b'+C5GREG: 1,"000001","123456789",11,4,"01.000001"').ci,
+                         0x123456789)
+
+    def test_read_answer_parsed(self):
+        self.assertEqual(CEREG(mock.Mock(), 1).parse_output(['+CEREG: 2,1,"00C3","0A1B2C3",7', 'OK']),
+                         Registration(2, 1, 0xC3, 0xA1B2C3, 7))
+
+    def test_missing_record_names_the_command(self):
+        with self.assertRaisesRegex(NetworkMethodException, r'AT\+CEREG\? record'):
+            CEREG(mock.Mock(), 1).parse_output(['OK'])
+
+
+class TestRegistrationWaiter(unittest.TestCase):
+
+    def connector(self, emulator):
+        connector = Connector(com_id=emulator.port, persistent=True, pool=SerialSessionPool())
+        self.addCleanup(connector.close_session)
+        connector.start_reader()
+        return connector
+
+    def test_transitions_followed_from_reports(self):
+        with ModemEmulator(ATTACHING) as emulator:
+            connector = self.connector(emulator)
+            result = RegistrationWaiter(connector, [CEREG(connector, 2)]).wait(deadline=5)
+        self.assertTrue(result['registered'])
+        self.assertEqual(result['command'], 'AT+CEREG')
+        self.assertEqual(result['registration'], Registration(2, 1, 0xC3, 0xA1B2C3, 7))
+        self.assertEqual([registration.stat for _, _, registration in result['transitions']], [0, 2, 1])
+        self.assertGreaterEqual(result['elapsed_ms'], 200)
+        self.assertLess(result['elapsed_ms'], 1000)
+
+    def test_state_read_without_reports(self):
+        with ModemEmulator({'commands': {'+CREG?': ['+CREG: {state},2']}}) as emulator:
+            connector = Connector(com_id=emulator.port, persistent=True, pool=SerialSessionPool())
+            self.addCleanup(connector.close_session)
+            waiter = RegistrationWaiter(connector, [CREG(connector, 2)], poll_interval=0.05)
+            self.assertFalse(waiter.wait(deadline=0.2)['registered'])
+            self.assertIn('AT+CREG?', emulator.received)
+
+    def test_server_waits_on_supported_registrations(self):
+        with ModemEmulator(ATTACHING) as emulator:
+            server = ATServer('localhost', emulator.port)
+            server.open()
+            self.addCleanup(server.close)
+            server.enabled = True
+            result = server.wait_for_registration(deadline=5)
+            self.assertEqual(server.exceptions, [])
+            self.assertTrue(result['registered'])
+            self.assertIn('AT+C5GREG=2', emulator.received)
@@ -0,0 +1,40 @@
+from .. import unittest
+from at.server.response import LineSplitter, Response, final_result, OK, ERROR
+
+
+class TestFinalResult(unittest.TestCase):
+
+    def test_final_result_codes(self):
+        self.assertIs(final_result('OK'), OK)
+        self.assertIs(final_result('CONNECT 115200'), OK)
+        self.assertIs(final_result('ERROR'), ERROR)
+        self.assertIs(final_result('NO CARRIER'), ERROR)
+        self.assertIs(final_result('+CME ERROR: 10'), ERROR)
+        self.assertIs(final_result('+CMS ERROR: 500'), ERROR)
+        self.assertIs(final_result(b'OK'), OK)
+        self.assertIs(final_result(b'+CME ERROR: 10'), ERROR)
+
+    def test_information_lines_are_not_final(self):
+        for line in ('+CSQ: 20,0', 'OKAY', '+COPS: 0,0,"ERROR net",7', 'AT+CSQ'):
+            self.assertIsNone(final_result(line))
+
+
+class TestLineSplitter(unittest.TestCase):
+
+    def test_lines_split_across_chunks(self):
+        splitter = LineSplitter()
+        self.assertEqual(splitter.feed(b'\r\n+CSQ: 2'), [])
+        self.assertEqual(splitter.feed(b'0,0\r\n\r\nO'), [b'+CSQ: 20,0'])
+        self.assertEqual(splitter.feed(b'K\r\n+CREG: 1\n'), [b'OK', b'+CREG: 1'])
+
+
+class TestResponse(unittest.TestCase):
+
+    def test_lines_are_decoded_on_access(self):
+        response = Response([b'+CSQ: 20,0', b'OK'])
+        self.assertEqual(response._decoded, {})
+        self.assertEqual(response[-1], 'OK')
+        self.assertEqual(response._decoded, {1: 'OK'})
+        self.assertEqual(response, ['+CSQ: 20,0', 'OK'])
+        self.assertEqual(response[:1], ['+CSQ: 20,0'])
+        self.assertIn('OK', response)
@@ -0,0 +1,97 @@
+import math
+import time
+
+from .. import mock, unittest, patch
+from Pyro4.util import get_serializer
+from at.server.at_server import ATServer
+from at.server.emulator import ModemEmulator
+from at.server.records import ExtendedSignalQuality, SignalQuality
+from at.server.sampler import SampleRing, SignalSampler, import_samples, sample_row, statistics
+from at.server.worker import ModemWorker
+
+
+class TestSampleRing(unittest.TestCase):
+
+    def test_wraps_around(self):
+        ring = SampleRing(4)
+        for value in range(6):
+            ring.append((value, value, 0, 0, 0))
+        self.assertEqual(len(ring), 4)
+        self.assertEqual(list(ring.last()[:, 0]), [2, 3, 4, 5])
+        self.assertEqual(list(ring.last(2)[:, 0]), [4, 5])
+        self.assertEqual(list(ring.last(10)[:, 0]), [2, 3, 4, 5])
+
+    def test_unknown_values_are_nan(self):
+        row = sample_row(SignalQuality(99, 3), ExtendedSignalQuality(99, 99, 255, 255, 20, 255))
+        self.assertTrue(math.isnan(row[0]))
+        self.assertEqual(row[1:3], (3, 20))
+        self.assertTrue(math.isnan(row[3]))
+        self.assertTrue(math.isnan(sample_row(SignalQuality(20, 0))[2]))
+
+
+class TestStatistics(unittest.TestCase):
+
+    def test_converted_and_summarized(self):
+        ring = SampleRing(10)
+        for second, (rssi, ber) in enumerate([(10, 0), (20, 0), (30, 2), (99, 99)]):
+            ring.append((second,) + sample_row(SignalQuality(rssi, ber)))
+        result = statistics(ring.last())
+        self.assertEqual(result['samples'], 4)
+        self.assertEqual(result['span_s'], 3)
+        self.assertEqual(result['rssi_dbm']['count'], 3)
+        self.assertEqual(result['rssi_dbm']['mean'], -73)
+        self.assertEqual((result['rssi_dbm']['min'], result['rssi_dbm']['max']), (-93, -53))
+        self.assertEqual(result['rssi_dbm']['p50'], -73)
+        self.assertIsNone(result['rsrp_dbm'])
+        self.assertEqual(result['ber'], {0: 2, 2: 1})
+        self.assertEqual(result['ber_unknown'], 1)
+
+    def test_export_crosses_the_wire(self):
+        sampler = SignalSampler(mock.Mock(), None, capacity=10)
+        sampler.ring.append((1.5, 20, 0, 20, 45))
+        serializer = get_serializer('serpent')
+        data, compressed = serializer.serializeData(sampler.export())
+        samples = import_samples(serializer.deserializeData(data, compressed))
+        self.assertEqual(samples.shape, (1, 5))
+        self.assertEqual(list(samples[0]), [1.5, 20, 0, 20, 45])
+
+
+class TestSignalSampler(unittest.TestCase):
+
+    def test_samples_at_the_rate_through_the_worker(self):
+        worker = ModemWorker('sampler-test')
+        worker.start()
+        self.addCleanup(worker.stop)
+        read = mock.Mock(return_value=(20, 0, 20, 45))
+        sampler = SignalSampler(worker, read, interval=0.01, capacity=1000).start()
+        time.sleep(0.2)
+        sampler.stop()
+        self.assertGreater(len(sampler.ring), 5)
+        self.assertIn('sample_signal', worker.stats())
+        self.assertEqual(sampler.statistics()['rsrp_dbm']['mean'], -96)
+
+    def test_failed_samples_are_counted(self):
+        sampler = SignalSampler(ModemWorker('sampler-test'), mock.Mock(side_effect=OSError('port closed')))
+        sampler.sample()
+        self.assertEqual((sampler.errors, len(sampler.ring)), (1, 0))
+        self.assertRaises(ValueError, SignalSampler, None, None, 0)
+
+
+class TestServerSampling(unittest.TestCase):
+
+    def test_csq_and_cesq_sampled_in_one_line(self):
+        profile = {'commands': {'+CESQ': {'sequence': [['+CESQ: 99,99,255,255,20,45'],
+                                                       ['+CESQ: 99,99,255,255,10,35']]}}}
+        with ModemEmulator(profile) as emulator:
+            server = ATServer('localhost', emulator.port, persistent=False)
+            server.enabled = True
+            self.assertRaises(ValueError, server.signal_statistics)
+            self.assertTrue(server.start_sampling(interval=0.02))
+            time.sleep(0.3)
+            server.stop_sampling()
+            result = server.signal_statistics()
+            self.assertGreater(result['samples'], 2)
+            self.assertEqual(result['rsrp_dbm']['min'], -106)
+            self.assertEqual(result['rsrp_dbm']['max'], -96)
+            self.assertIn('AT+CSQ;+CESQ', emulator.received)
+            self.assertIsInstance(server.get_extended_signal_quality(), ExtendedSignalQuality)
@@ -0,0 +1,86 @@
+import time
+
+from .. import mock, unittest
+from at.server.at_server import ATServer
+from at.server.commands.common.exceptions import CommandQueueFull
+from at.server.emulator import ModemEmulator
+from at.server.records import Operator
+from at.server.scan import DONE, FAILED, QUEUED, RUNNING, NetworkScans
+
+SLOW_SCAN = {'commands': {'+COPS=?': {'response': ['+COPS: (2,"Emulated Operator","EMU","00101",7)'],
+                                      'latency': 0.3}}}
+
+
+def wait_for(server, job_id):
+    for _ in range(200):
+        scan = server.network_scan(job_id)
+        if scan['state'] == DONE:
+            return scan
+        time.sleep(0.01)
+    raise AssertionError('scan {} never done'.format(job_id))
+
+
+class TestNetworkScans(unittest.TestCase):
+
+    def setUp(self):
+        self.command = mock.Mock()
+        self.command.serial_target.cache = None
+        self.worker = mock.Mock(running=False)
+        self.scans = NetworkScans(self.worker, self.command)
+
+    def test_operators_added_as_parsed(self):
+        self.worker.running = True
+        seen = []
+
+        def scan():
+            yield Operator(2, 'A', 'A', '00101', 7)
+            seen.append(self.scans.get(job_id))
+            yield Operator(1, 'B', 'B', '00102', 7)
+        self.command.scan.side_effect = scan
+        job_id = self.scans.start()
+        self.assertEqual(self.scans.get(job_id)['state'], QUEUED)
+        self.assertEqual(self.scans.start(), job_id)
+        func, args = self.worker.schedule.call_args[0][:2]
+        func(*args)
+        self.assertEqual([(view['state'], view['count']) for view in seen], [(RUNNING, 1)])
+        self.assertEqual(self.scans.get(job_id, since=1)['operators'], [Operator(1, 'B', 'B', '00102', 7)])
+        self.assertEqual(self.scans.get(job_id)['state'], DONE)
+
+    def test_failure_reported(self):
+        self.command.scan.side_effect = ValueError('no answer')
+        scan = self.scans.get(self.scans.start())
+        self.assertEqual((scan['state'], scan['error']), (FAILED, 'no answer'))
+
+    def test_full_queue_does_not_block_the_next_scans(self):
+        self.worker.running = True
+        self.worker.schedule.side_effect = [CommandQueueFull('queue full'), mock.Mock()]
+        self.assertRaises(CommandQueueFull, self.scans.start)
+        job_id = self.scans.start()
+        self.assertEqual(self.scans.get(job_id)['state'], QUEUED)
+        self.assertEqual(self.worker.schedule.call_count, 2)
+
+    def test_unknown_job(self):
+        self.assertRaises(KeyError, self.scans.get, 42)
+
+
+class TestServerScans(unittest.TestCase):
+
+    def test_scan_runs_in_background_and_is_cached(self):
+        with ModemEmulator(SLOW_SCAN) as emulator:
+            server = ATServer('localhost', emulator.port)
+            server.open()
+            self.addCleanup(server.close)
+            server.enabled = True
+            started = time.monotonic()
+            job_id = server.start_network_scan()
+            self.assertLess(time.monotonic() - started, 0.2)
+            self.assertEqual(server.start_network_scan(), job_id)
+            scan = wait_for(server, job_id)
+            self.assertFalse(scan['cached'])
+            self.assertEqual(scan['operators'], [Operator(2, 'Emulated Operator', 'EMU', '00101', 7)])
+            cached = server.network_scan(server.start_network_scan())
+            self.assertTrue(cached['cached'])
+            self.assertEqual(cached['operators'], scan['operators'])
+            self.assertEqual(emulator.received.count('AT+COPS=?'), 1)
+            wait_for(server, server.start_network_scan(refresh=True))
+            self.assertEqual(emulator.received.count('AT+COPS=?'), 2)
@@ -0,0 +1,111 @@
+import threading
+import time
+
+from .. import mock, unittest, patch
+from at.server.emulator import ModemEmulator
+from at.server.serial_connector import Connector, SerialSessionPool
+
+
+def fake_port(*args, **kwargs):
+    port = mock.MagicMock()
+    port.is_open = True
+    port.in_waiting = 16
+    port.read.return_value = b'+CSQ: 20,0\r\nOK\r\n'
+    return port
+
+
+class TestSerialSessionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = SerialSessionPool(probe_interval=30)
+
+    def test_acquire_opens_once_per_com_id(self):
+        opener = mock.MagicMock(side_effect=fake_port)
+        first = self.pool.acquire(3, opener)
+        second = self.pool.acquire(3, opener)
+        self.assertIs(first, second)
+        self.assertEqual(opener.call_count, 1)
+
+    def test_acquire_reopens_closed_port(self):
+        opener = mock.MagicMock(side_effect=fake_port)
+        first = self.pool.acquire(3, opener)
+        first.port.is_open = False
+        second = self.pool.acquire(3, opener)
+        self.assertIsNot(first, second)
+        self.assertEqual(opener.call_count, 2)
+
+    def test_idle_session_is_probed(self):
+        opener = mock.MagicMock(side_effect=fake_port)
+        session = self.pool.acquire(3, opener)
+        session.last_used -= 60
+        session.port.readline.return_value = b'OK\r\n'
+        self.assertIs(self.pool.acquire(3, opener), session)
+        session.port.write.assert_called_with(b'AT\r\n')
+
+
+    def test_slow_probe_does_not_block_other_ports(self):
+        opener = mock.MagicMock(side_effect=fake_port)
+        session = self.pool.acquire(3, opener)
+        session.last_used -= 60
+        probing, answer = threading.Event(), threading.Event()
+        session.port.readline.side_effect = lambda: probing.set() or answer.wait(5) and b'OK\r\n'
+        prober = threading.Thread(target=self.pool.acquire, args=(3, opener))
+        prober.start()
+        self.addCleanup(prober.join)
+        self.addCleanup(answer.set)
+        self.assertTrue(probing.wait(5))
+        started = time.monotonic()
+        self.assertIsNot(self.pool.acquire(4, opener), session)
+        self.assertLess(time.monotonic() - started, 1)
+
+
+class TestConnector(unittest.TestCase):
+
+    def test_persistent_run_keeps_port_open(self):
+        pool = SerialSessionPool()
+        connector = Connector(com_id=3, persistent=True, pool=pool)
+        with patch.object(Connector, 'open_port', side_effect=fake_port) as opener:
+            for _ in range(3):
+                output = connector.run('AT+CSQ', 1, Exception, '')
+        self.assertEqual(output, ['+CSQ: 20,0', 'OK'])
+        self.assertEqual(opener.call_count, 1)
+        self.assertFalse(connector._ser.close.called)
+
+    def test_non_persistent_run_closes_port(self):
+        connector = Connector(com_id=3)
+        with patch.object(Connector, 'open_port', side_effect=fake_port) as opener:
+            connector.run('AT+CSQ', 1, Exception, '')
+            connector.run('AT+CSQ', 1, Exception, '')
+        self.assertEqual(opener.call_count, 2)
+        self.assertEqual([c[1]['probe'] for c in opener.call_args_list], [True, False])
+        self.assertIsNone(connector._ser)
+
+    def test_response_without_final_result_code_raises(self):
+        def stalled_port(*args, **kwargs):
+            port = fake_port()
+            chunks = iter([b'ATI\r\nManufacturer: x\r\n'])
+            port.read.side_effect = lambda size: next(chunks, b'')
+            return port
+        connector = Connector(com_id=3)
+        with patch.object(Connector, 'open_port', side_effect=stalled_port):
+            with self.assertRaises(ValueError):
+                connector.run('ATI', 0.3, ValueError, '')
+        self.assertIsNone(connector.cache.get('ATI'))
+
+    def test_late_answer_not_taken_for_the_next_ones(self):
+        slow = {'commands': {'+CSQ': {'response': ['+CSQ: 20,0'], 'latency': 0.3}}}
+        for reader in (False, True):
+            with ModemEmulator(slow) as emulator:
+                connector = Connector(com_id=emulator.port, persistent=True, pool=SerialSessionPool())
+                self.addCleanup(connector.close_session)
+                # learned deadline shorter than the answer
+                connector.timeouts = mock.Mock(
+                    deadline=lambda modem, command, maximum: 0.1 if command == 'AT+CSQ' else maximum)
+                if reader:
+                    connector.start_reader()
+                connector.cache.put('AT+CIMI', ['001010123456789', 'OK'], 60)
+                self.assertRaises(ValueError, connector.run, 'AT+CSQ', 2, ValueError, '')
+                self.assertEqual(connector.run('AT+CPAS', 2, ValueError, ''), ['+CPAS: 0', 'OK'])
+                self.assertEqual(connector.run('AT+CPIN?', 2, ValueError, ''), ['+CPIN: READY', 'OK'])
+                self.assertIsNotNone(connector.cache.get('AT+CIMI'))
+                connector.close_session()
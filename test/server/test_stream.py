@@ -0,0 +1,48 @@
+from .. import unittest
+from at.server.commands.common.at_mobile_controller import ATI, CLAC, CSQ
+from at.server.commands.common.at_network_handler import COPS
+from at.server.commands.common.exceptions import ATCommandException, NetworkMethodException
+from at.server.emulator import ModemEmulator, SUPPORTED_COMMANDS
+from at.server.records import Operator
+from at.server.serial_connector import Connector, SerialSessionPool
+
+
+class TestStream(unittest.TestCase):
+
+    def connector(self, emulator, persistent=True):
+        connector = Connector(com_id=emulator.port, persistent=persistent, pool=SerialSessionPool())
+        self.addCleanup(connector.close_session)
+        return connector
+
+    def test_lines_streamed_without_final_result_code(self):
+        with ModemEmulator() as emulator:
+            lines = list(self.connector(emulator).stream('AT+CLAC', 2, ATCommandException, ''))
+        self.assertEqual(lines, [command.encode() for command in SUPPORTED_COMMANDS])
+
+    def test_records_streamed(self):
+        with ModemEmulator({'echo': True}) as emulator:
+            connector = self.connector(emulator, persistent=False)
+            # as CLAC.parse_output, the command itself is left out with the echo
+            self.assertEqual(list(CLAC(connector).stream()),
+                             [command for command in SUPPORTED_COMMANDS if command != 'AT+CLAC'])
+            self.assertEqual([record.line for record in ATI(connector).stream()][0], 'Manufacturer: at_commands')
+            self.assertEqual([tuple(record) for record in CSQ(connector, 2).stream()], [(20, 0)])
+
+    def test_network_scan(self):
+        with ModemEmulator() as emulator:
+            operators = COPS(self.connector(emulator), 2).scan()
+            self.assertEqual(next(operators), Operator(2, 'Emulated Operator', 'EMU', '00101', 7))
+            self.assertEqual([operator.numeric for operator in operators], ['00102', '00103'])
+
+    def test_closed_early_reads_the_rest_of_the_response(self):
+        with ModemEmulator() as emulator:
+            connector = self.connector(emulator)
+            commands = CLAC(connector).stream()
+            self.assertEqual(next(commands), SUPPORTED_COMMANDS[0])
+            commands.close()
+            self.assertEqual(connector.run('AT+CSQ', 2, ATCommandException, ''), ['+CSQ: 20,0', 'OK'])
+
+    def test_error_raised(self):
+        with ModemEmulator({'error_rate': 1.0}) as emulator:
+            with self.assertRaises(NetworkMethodException):
+                list(COPS(self.connector(emulator), 2).scan())
@@ -0,0 +1,79 @@
+import math
+import os
+import tempfile
+
+from .. import mock, unittest, patch
+from at.server.at_server import ATServer
+from at.server.emulator import ModemEmulator
+from at.server.records import AttachState, Registration, SignalQuality, SimStatus
+from at.server.sampler import import_samples
+from at.server.telemetry import TelemetryStore
+
+
+class TestTelemetryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = TelemetryStore(self.path, batch_size=100)
+
+    def test_records_stored_per_field(self):
+        self.store.append_records('modem-1', [SignalQuality(20, 0), Registration(2, 1, None, None, 7), None],
+                                  timestamp=10)
+        self.store.append_records('modem-2', [SignalQuality(12, 99)], timestamp=11)
+        self.assertEqual(self.store.rows, 0)
+        times, values = self.store.series('SignalQuality.rssi')
+        self.assertEqual(self.store.rows, 9)
+        self.assertEqual((list(times), list(values)), ([10, 11], [20, 12]))
+        self.assertTrue(math.isnan(self.store.series('Registration.lac')[1][0]))
+        self.assertEqual(list(self.store.series('SignalQuality.ber', modem='modem-2')[1]), [99])
+        self.assertEqual(len(self.store.series('SignalQuality.ber', modem='modem-3')[1]), 0)
+
+    def test_time_range(self):
+        for second in range(10):
+            self.store.append('modem-1', 'AttachState.state', second % 2, timestamp=second)
+        times, _ = self.store.series('AttachState.state', start=3, end=6)
+        self.assertEqual(list(times), [3, 4, 5])
+        # a clock set back does not break the time order
+        self.store.append('modem-1', 'AttachState.state', 1, timestamp=5)
+        self.assertEqual(self.store.series('AttachState.state', start=9)[0].tolist(), [9, 9])
+
+    def test_text_values_dictionary_encoded(self):
+        self.store.append_records('modem-1', [SimStatus('READY'), SimStatus('SIM PIN'), SimStatus('READY')])
+        _, codes = self.store.series('SimStatus.code')
+        self.assertTrue(self.store.is_text('SimStatus.code'))
+        self.assertEqual(self.store.decode(codes), ['READY', 'SIM PIN', 'READY'])
+
+    def test_reopened_and_repaired(self):
+        self.store.append_records('modem-1', [AttachState(1), AttachState(0)], timestamp=1)
+        self.store.close()
+        with open(os.path.join(self.path, 'value.col'), 'ab') as f:
+            f.write(b'\0' * 3)
+        store = TelemetryStore(self.path)
+        self.assertEqual(store.rows, 2)
+        self.assertEqual(store.series('AttachState.state')[1].tolist(), [1, 0])
+        store.append('modem-1', 'AttachState.state', 1, timestamp=0)
+        self.assertEqual(store.series('AttachState.state')[0].tolist(), [1, 1, 1])
+
+    def test_batched_writes(self):
+        store = TelemetryStore(self.path, batch_size=4, flush_interval=3600)
+        for value in range(3):
+            store.append('modem-1', 'SignalQuality.rssi', value)
+        self.assertEqual(store.rows, 0)
+        store.append('modem-1', 'SignalQuality.rssi', 3)
+        self.assertEqual(store.rows, 4)
+
+
+class TestServerTelemetry(unittest.TestCase):
+
+    def test_results_recorded(self):
+        store = TelemetryStore(tempfile.mkdtemp())
+        with ModemEmulator() as emulator:
+            server = ATServer('localhost', emulator.port, persistent=False, telemetry=store)
+            server.enabled = True
+            server.get_signal_quality()
+            server.poll_status()
+            server.attach()
+            series = server.telemetry_series('SignalQuality.rssi')
+            self.assertEqual(import_samples(series)[:, 1].tolist(), [20, 20])
+            self.assertEqual(list(server.telemetry_series('SimStatus.code')['strings'].values()), ['READY'])
+            self.assertEqual(store.series('AttachState.state')[1].tolist(), [1])
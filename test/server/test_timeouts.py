@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+
+from .. import mock, unittest, patch
+from at.server.response import Response
+from at.server.serial_connector import Connector
+from at.server.timeouts import LatencyHistogram, TimeoutPolicy
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_percentiles_within_a_bucket(self):
+        histogram = LatencyHistogram()
+        for _ in range(99):
+            histogram.add(0.05)
+        histogram.add(2.0)
+        self.assertAlmostEqual(histogram.percentile(50), 0.05, delta=0.01)
+        self.assertAlmostEqual(histogram.percentile(99), 0.05, delta=0.01)
+        self.assertAlmostEqual(histogram.percentile(100), 2.0, delta=0.4)
+
+    def test_old_samples_fade_out(self):
+        histogram = LatencyHistogram(max_count=10)
+        for _ in range(9):
+            histogram.add(1.0)
+        histogram.add(0.01)
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(list(histogram.counts), [LatencyHistogram.bucket(1.0)])
+
+
+class TestTimeoutPolicy(unittest.TestCase):
+
+    def test_maximum_until_enough_samples(self):
+        policy = TimeoutPolicy(min_samples=5)
+        for _ in range(4):
+            policy.record('COM3', 'AT+CPIN?', 0.05)
+        self.assertEqual(policy.deadline('COM3', 'AT+CPIN?', 180), 180)
+        policy.record('COM3', 'AT+CPIN?', 0.05)
+        self.assertEqual(policy.deadline('COM3', 'AT+CPIN?', 180), 1.0)
+        self.assertEqual(policy.deadline('COM4', 'AT+CPIN?', 180), 180)
+
+    def test_deadline_is_p99_times_factor_capped_by_maximum(self):
+        policy = TimeoutPolicy(min_samples=1, factor=3)
+        policy.record('COM3', 'AT+COPS=0', 10)
+        self.assertAlmostEqual(policy.deadline('COM3', 'AT+COPS=0', 180), 30, delta=6)
+        self.assertEqual(policy.deadline('COM3', 'AT+COPS=0', 20), 20)
+
+    def test_persists_across_restarts(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'timeouts.json')
+        policy = TimeoutPolicy(path, min_samples=1, save_every=2)
+        policy.record('COM3', 'AT+CSQ', 0.02)
+        self.assertFalse(os.path.exists(path))
+        policy.record('COM3', 'AT+CSQ', 0.02)
+        with open(path) as f:
+            self.assertIn('COM3|AT+CSQ', json.load(f))
+        restarted = TimeoutPolicy(path, min_samples=1)
+        self.assertEqual(restarted.deadline('COM3', 'AT+CSQ', 50), 1.0)
+        self.assertEqual(restarted.report('COM3')['COM3|AT+CSQ']['count'], 2)
+
+
+class TestConnectorDeadlines(unittest.TestCase):
+
+    def setUp(self):
+        self.connector = Connector(com_id=3, timeouts=TimeoutPolicy(min_samples=1))
+        self.connector._ser = mock.MagicMock()
+
+    def test_learned_deadline_used_and_answers_recorded(self):
+        self.connector.timeouts.record('COM3', 'AT+CSQ', 0.01)
+        with patch.object(Connector, 'read_command', return_value=Response([b'+CSQ: 20,0', b'OK'])) as read:
+            self.connector.execute('AT+CSQ', timeout=50)
+        read.assert_called_once_with(timeout=1.0)
+        self.assertEqual(self.connector.timeouts.histogram('COM3', 'AT+CSQ').count, 2)
+
+    def test_expired_command_recorded_with_its_deadline(self):
+        with patch.object(Connector, 'read_command', return_value=Response([b'+CSQ: 20,0'])):
+            self.connector.execute('AT+CSQ', timeout=5)
+        self.assertGreaterEqual(self.connector.timeouts.histogram('COM3', 'AT+CSQ').percentile(100), 5)
+
+    def test_error_answers_not_recorded(self):
+        with patch.object(Connector, 'read_command', return_value={'error': Response([b'ERROR'])}):
+            self.connector.execute('AT+CSQ', timeout=5)
+        self.assertIsNone(self.connector.timeouts.histogram('COM3', 'AT+CSQ'))
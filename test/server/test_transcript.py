@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from .. import unittest, patch
+from at.server import transcript
+from at.server.transcript import Transcript, TranscriptReader, SEND, READ, latency_report
+
+
+class TestTranscript(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'com3.transcript')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_ring_is_bounded(self):
+        history = Transcript(maxlen=3)
+        for i in range(10):
+            history.sent('AT+CSQ{}'.format(i).encode())
+        self.assertEqual(len(history), 3)
+        self.assertEqual(history.lines()[0], 'Send: AT+CSQ7')
+
+    def test_window_and_latency_from_file(self):
+        clock = iter(range(1000, 2000))
+        with patch.object(transcript, 'timestamp', side_effect=lambda: float(next(clock))):
+            history = Transcript(maxlen=2, path=self.path)
+            for _ in range(100):
+                history.sent(b'AT+CSQ')
+                history.received(b'+CSQ: 20,0')
+                history.received(b'OK')
+            history.close()
+        reader = TranscriptReader(self.path)
+        frames = list(reader.frames(start=1150, end=1152))
+        self.assertEqual([(ts, direction, bytes(data)) for ts, direction, data in frames],
+                         [(1150.0, SEND, b'AT+CSQ'), (1151.0, READ, b'+CSQ: 20,0'), (1152.0, READ, b'OK')])
+        reader.close()
+        report = latency_report(self.path)
+        self.assertEqual(report['AT+CSQ']['count'], 100)
+        self.assertEqual(report['AT+CSQ']['p50_ms'], 2000)
+
+    def test_concurrent_records_all_written(self):
+        history = Transcript(path=self.path)
+
+        def record(data):
+            for _ in range(500):
+                history.received(data)
+        threads = [threading.Thread(target=record, args=('+CGEV: {}'.format(i).encode(),)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        history.close()
+        reader = TranscriptReader(self.path)
+        frames = [bytes(data) for _, _, data in reader.frames()]
+        reader.close()
+        self.assertEqual(len(frames), 2000)
+        self.assertEqual(set(frames), set('+CGEV: {}'.format(i).encode() for i in range(4)))
+
+    def test_reopened_file_is_appended(self):
+        for _ in range(2):
+            history = Transcript(path=self.path)
+            history.sent(b'AT')
+            history.received(b'OK')
+            history.close()
+        reader = TranscriptReader(self.path)
+        self.assertEqual(len(list(reader.frames())), 4)
+        reader.close()
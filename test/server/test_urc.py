@@ -0,0 +1,85 @@
+import queue
+
+from .. import mock, unittest, patch
+from at.server.serial_connector import Connector, SerialSessionPool
+from at.server.urc import UrcDispatcher, is_unsolicited, response_prefixes
+
+
+class ChunkPort(object):
+    """
+    serial port stand-in returning queued chunks, and the response of every written command
+    """
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.chunks = queue.Queue()
+        self.is_open = True
+        self.in_waiting = 0
+
+    def write(self, data):
+        self.chunks.put(self.responses[data.decode().strip()])
+
+    def flush(self):
+        pass
+
+    def read(self, size=1):
+        try:
+            return self.chunks.get(timeout=0.01)
+        except queue.Empty:
+            return b''
+
+    def close(self):
+        self.is_open = False
+
+
+class TestUrcHelpers(unittest.TestCase):
+
+    def test_response_prefixes(self):
+        self.assertEqual(response_prefixes('AT+CPIN?;+CREG?;+COPS=3,2'), {'+CPIN:', '+CREG:', '+COPS:'})
+        self.assertEqual(response_prefixes('ATI'), frozenset())
+
+    def test_is_unsolicited(self):
+        self.assertTrue(is_unsolicited('+CREG: 5'))
+        self.assertFalse(is_unsolicited('+CREG: 2,5', {'+CREG:'}))
+        self.assertFalse(is_unsolicited('+CREG: 2,1,"00C3","A13F",7', {'+CREG:'}))
+        self.assertTrue(is_unsolicited('+CREG: 5', {'+CREG:'}))
+        self.assertTrue(is_unsolicited('+CREG: 1,"00C3","A13F",7', {'+CREG:'}))
+        self.assertFalse(is_unsolicited('+CSQ: 20,0'))
+
+    def test_dispatch_filters_and_drops_oldest(self):
+        dispatcher = UrcDispatcher()
+        creg = dispatcher.subscribe(['+CREG:'], maxsize=2)
+        everything = dispatcher.subscribe()
+        for line in ('+CREG: 1', 'RING', '+CREG: 2', '+CREG: 5'):
+            dispatcher.dispatch(line)
+        self.assertEqual([line for _, line in creg.get()], ['+CREG: 2', '+CREG: 5'])
+        self.assertEqual(len(everything.get()), 4)
+        self.assertTrue(dispatcher.unsubscribe(creg.id))
+        self.assertRaises(KeyError, dispatcher.get, creg.id)
+
+
+class TestConnectorDemultiplexing(unittest.TestCase):
+
+    RESPONSES = {'AT+CREG?': b'\r\n+CREG: 5\r\n+CREG: 2,1\r\n\r\nOK\r\n'}
+
+    def test_urc_removed_from_response(self):
+        port = ChunkPort(self.RESPONSES)
+        connector = Connector(com_id=3)
+        subscription = connector.urc.subscribe(['+CREG:'])
+        with patch.object(Connector, 'open_port', return_value=port):
+            output = connector.run('AT+CREG?', 1, Exception, '')
+        self.assertEqual(output, ['+CREG: 2,1', 'OK'])
+        self.assertEqual([line for _, line in subscription.get()], ['+CREG: 5'])
+
+    def test_background_reader(self):
+        port = ChunkPort(self.RESPONSES)
+        connector = Connector(com_id=3, persistent=True, pool=SerialSessionPool())
+        subscription = connector.urc.subscribe()
+        with patch.object(Connector, 'open_port', return_value=port):
+            connector.start_reader()
+            port.chunks.put(b'\r\nRING\r\n')
+            self.assertEqual(subscription.get(timeout=1)[0][1], 'RING')
+            self.assertEqual(connector.run('AT+CREG?', 1, Exception, ''), ['+CREG: 2,1', 'OK'])
+            self.assertEqual(subscription.get(timeout=1)[0][1], '+CREG: 5')
+            connector.close_session()
+        self.assertFalse(port.is_open)